@@ -0,0 +1,9 @@
+-- 0013_mdc_lookup_index.sql
+-- "latest cache row" lookups (strategy-engine / admin-cli smoke-test):
+--   WHERE symbol=? AND interval_minutes=? AND feature_version=? ORDER BY open_time_ms DESC LIMIT 1
+-- PK is (symbol, interval_minutes, open_time_ms, feature_version), so feature_version cannot be used
+-- before the ORDER BY column; this index makes the lookup a single index seek.
+-- DESC is honoured on MariaDB >= 10.8 and ignored (backward index scan) on older versions.
+
+CREATE INDEX IF NOT EXISTS idx_mdc_sym_iv_fv_ot
+  ON market_data_cache(symbol, interval_minutes, feature_version, open_time_ms DESC);
@@ -0,0 +1,9 @@
+-- 0014_mdc_close_time_ms.sql
+-- market_data_cache has no close_time_ms column (market_data does); readers derived it as
+-- open_time_ms + interval_minutes * 60000 and probed the schema at runtime.
+-- A VIRTUAL generated column gives every reader the same value without storing it
+-- (archive job copies explicit columns, so market_data_cache_history is unaffected).
+
+ALTER TABLE market_data_cache
+  ADD COLUMN IF NOT EXISTS close_time_ms BIGINT
+    GENERATED ALWAYS AS (open_time_ms + interval_minutes * 60000) VIRTUAL;
@@ -21,6 +21,7 @@ from shared.logging import get_logger, new_trace_id
 from shared.domain.time import HK
 from shared.telemetry import Telegram, log_action
 from shared.domain.control_commands import write_control_command
+from shared.domain.system_config import write_system_config
 from shared.domain.heartbeat import upsert_service_status
 from shared.domain.instance import get_instance_id
 from shared.domain.events import append_error_event
@@ -399,32 +400,6 @@ def metrics() -> PlainTextResponse:
     return PlainTextResponse(content=data.decode("utf-8"), media_type=CONTENT_TYPE_LATEST)
 
 
-def write_system_config(
-    db: MariaDB,
-    *,
-    actor: str,
-    key: str,
-    value: str,
-    trace_id: str,
-    reason_code: str,
-    reason: str,
-) -> None:
-    old = db.fetch_one("SELECT `value` FROM system_config WHERE `key`=%s", (key,))
-    old_val = old["value"] if old else None
-
-    db.execute(
-        "INSERT INTO system_config(`key`,`value`) VALUES (%s,%s) ON DUPLICATE KEY UPDATE `value`=VALUES(`value`)",
-        (key, value),
-    )
-    db.execute(
-        """
-        INSERT INTO config_audit(actor, action, cfg_key, old_value, new_value, trace_id, reason_code, reason)
-        VALUES (%s,%s,%s,%s,%s,%s,%s,%s)
-        """,
-        (actor, "SET", key, old_val, value, trace_id, reason_code, reason),
-    )
-
-
 @app.get("/admin/status")
 def admin_status(
     settings: Settings = Depends(get_settings),
@@ -9,12 +9,14 @@ from collections import deque
 from datetime import datetime, timedelta
 from typing import Any, Deque, Dict, List, Optional, Tuple
 
+import redis
+
 from shared.config import Settings, load_settings
 from shared.db import MariaDB, migrate
 from shared.exchange import make_exchange
 from shared.exchange.errors import RateLimitError
 from shared.logging import get_logger, new_trace_id
-from shared.redis import LeaderElector, redis_client
+from shared.redis import LeaderElector, notify_cache_fresh, redis_client
 from shared.domain.heartbeat import upsert_service_status
 from shared.domain.instance import get_instance_id
 from shared.domain.runtime_config import RuntimeConfig
@@ -467,8 +469,12 @@ def process_precompute_tasks(
     *,
     symbol: str,
     max_tasks: int = 800,
+    r: Optional[redis.Redis] = None,
 ) -> int:
-    """Process pending precompute tasks for one symbol; computes cache rows and marks tasks done."""
+    """Process pending precompute tasks for one symbol; computes cache rows and marks tasks done.
+
+    If ``r`` is given, pushes a freshness notification so waiters (admin-cli) can wait on it instead of polling.
+    """
     interval = int(settings.interval_minutes)
     tasks = db.fetch_all(
         """
@@ -627,6 +633,8 @@ def process_precompute_tasks(
                 cache_rows,
             )
         _mark_tasks_done(db, symbol=symbol, interval_minutes=interval, feature_version=int(settings.feature_version), up_to_open_time_ms=max_ot)
+        if r is not None and cache_rows:
+            notify_cache_fresh(r, symbol=symbol, interval_minutes=interval, feature_version=int(settings.feature_version), open_time_ms=max(int(row[2]) for row in cache_rows))
 
         metrics.precompute_tasks_processed_total.labels(SERVICE, symbol, str(interval)).inc(len(open_times))
         metrics.feature_compute_seconds.labels(SERVICE, symbol).observe(time.time() - t0)
@@ -923,7 +931,7 @@ def main():
                 time.sleep(max(0.5, float(sleep_s)))
                 continue
             # process a slice of precompute tasks per symbol each loop
-            processed = process_precompute_tasks(db, settings, metrics, symbol=sym, max_tasks=800)
+            processed = process_precompute_tasks(db, settings, metrics, symbol=sym, max_tasks=800, r=r)
             if processed:
                 logger.info(f"precompute_done symbol={sym} processed={processed}")
 
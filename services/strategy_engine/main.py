@@ -6,6 +6,7 @@ import json
 import os
 import time
 import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Optional
 
@@ -18,16 +19,16 @@ from shared.ai import OnlineLogisticRegression, SGDClassifierCompat, load_curren
 from shared.domain.system_config import get_system_config, write_system_config
 from shared.domain.control_commands import fetch_new_control_commands, mark_control_command_processed
 from shared.logging import get_logger, new_trace_id
-from shared.redis import distributed_lock, redis_client, LeaderElector
+from shared.redis import distributed_lock, redis_client, LeaderElector, notify_emergency_exit
 from shared.telemetry import Metrics, Telegram, start_metrics_http_server, log_action, build_system_summary, send_system_alert
 from shared.telemetry.trade_alerts import build_trade_summary, send_trade_alert
 from shared.domain.enums import OrderEventType, ReasonCode, Side
 from shared.domain.heartbeat import upsert_service_status
 from shared.domain.instance import get_instance_id
 from shared.domain.runtime_config import RuntimeConfig
-from shared.domain.events import append_order_event, get_first_event_created_at
+from shared.domain.events import append_order_event, append_order_events, get_first_event_created_at
 from shared.domain.idempotency import make_client_order_id
-from shared.domain.time import next_tick_sleep_seconds, HK
+from shared.domain.time import next_tick_epoch, HK
 
 SERVICE = "strategy-engine"
 logger = get_logger(SERVICE, os.getenv("LOG_LEVEL", "INFO"))
@@ -108,45 +109,36 @@ def reconcile_stale_orders(db: MariaDB, ex, *, exchange_name: str, max_age_secon
 
             trace_id = new_trace_id("reconcile")
 
+            eid = str(getattr(st, "exchange_order_id", "") or exchange_order_id)
+            side = str(r.get("side") or "")
+            price = float(avg_price) if avg_price is not None else None
+            common = dict(
+                trace_id=trace_id,
+                service=SERVICE,
+                exchange=exchange_name,
+                symbol=symbol,
+                client_order_id=client_order_id,
+                exchange_order_id=eid,
+                side=side,
+                status=status_u,
+                reason_code=ReasonCode.RECONCILE,
+                payload=payload,
+            )
+            # PARTIAL / 终态 / RECONCILED 同一事务写入（一次连接 + 一次 COMMIT），顺序即 id 顺序
+            events = []
             # PARTIAL：如果交易所返回“部分成交”，写入一次 PARTIAL 事件（幂等）。
             if partial_event and qty > 0:
-                append_order_event(
-                    db,
-                    trace_id=trace_id,
-                    service=SERVICE,
-                    exchange=exchange_name,
-                    symbol=symbol,
-                    client_order_id=client_order_id,
-                    exchange_order_id=str(getattr(st, "exchange_order_id", "") or exchange_order_id),
-                    event_type=OrderEventType.PARTIAL,
-                    side=str(r.get("side") or ""),
-                    qty=qty,
-                    price=float(avg_price) if avg_price is not None else None,
-                    status=status_u,
-                    reason_code=ReasonCode.RECONCILE,
-                    reason="Reconciled partial fill",
-                    payload=payload,
-                )
-
+                events.append(dict(common, event_type=OrderEventType.PARTIAL, qty=qty, price=price,
+                                   reason="Reconciled partial fill"))
+            if terminal_event is not None:
+                events.append(dict(common, event_type=terminal_event, qty=qty or float(r.get("qty") or 0.0),
+                                   price=price, reason="Reconciled terminal status"))
+            events.append(dict(common, event_type=OrderEventType.RECONCILED, qty=float(r.get("qty") or 0.0),
+                               price=None, reason="Reconciled order status"))
+            inserted_flags = append_order_events(db, events)
 
             if terminal_event is not None:
-                inserted = append_order_event(
-                    db,
-                    trace_id=trace_id,
-                    service=SERVICE,
-                    exchange=exchange_name,
-                    symbol=symbol,
-                    client_order_id=client_order_id,
-                    exchange_order_id=str(getattr(st, "exchange_order_id", "") or exchange_order_id),
-                    event_type=terminal_event,
-                    side=str(r.get("side") or ""),
-                    qty=qty or float(r.get("qty") or 0.0),
-                    price=float(avg_price) if avg_price is not None else None,
-                    status=status_u,
-                    reason_code=ReasonCode.RECONCILE,
-                    reason="Reconciled terminal status",
-                    payload=payload,
-                )
+                inserted = inserted_flags[-2]
                 if inserted:
                     # e2e latency：从 CREATED 到首次进入终态事件
                     created_at = get_first_event_created_at(
@@ -163,24 +155,6 @@ def reconcile_stale_orders(db: MariaDB, ex, *, exchange_name: str, max_age_secon
                             pass
                     metrics.reconcile_fixed_total.labels(SERVICE, symbol, status_u).inc()
                     fixed += 1
-
-            append_order_event(
-                db,
-                trace_id=trace_id,
-                service=SERVICE,
-                exchange=exchange_name,
-                symbol=symbol,
-                client_order_id=client_order_id,
-                exchange_order_id=str(getattr(st, "exchange_order_id", "") or exchange_order_id),
-                event_type=OrderEventType.RECONCILED,
-                side=str(r.get("side") or ""),
-                qty=float(r.get("qty") or 0.0),
-                price=None,
-                status=status_u,
-                reason_code=ReasonCode.RECONCILE,
-                reason="Reconciled order status",
-                payload=payload,
-            )
         except Exception as e:
             try:
                 send_system_alert(
@@ -263,37 +237,27 @@ def get_flag(db: MariaDB, key: str, default: str = "false") -> str:
 def set_flag(db: MariaDB, key: str, value: str) -> None:
     db.execute("INSERT INTO system_config(`key`,`value`) VALUES (%s,%s) ON DUPLICATE KEY UPDATE `value`=VALUES(`value`)", (key, value))
 
-def latest_cache(db: MariaDB, symbol: str, interval_minutes: int, feature_version: int = 1):
-    return db.fetch_one(
-        """
+# 每个 tick × symbol 都会执行的行情/指标查询：SQL 文本在模块级拼好一次，调用点只绑定参数
+_SQL_CACHE_ROWS = """
         SELECT m.open_time_ms, m.close_price, c.ema_fast, c.ema_slow, c.rsi, c.features_json
         FROM market_data m
         LEFT JOIN market_data_cache c
           ON c.symbol=m.symbol AND c.interval_minutes=m.interval_minutes AND c.open_time_ms=m.open_time_ms AND c.feature_version=%s
         WHERE m.symbol=%s AND m.interval_minutes=%s
         ORDER BY m.open_time_ms DESC
-        LIMIT 1
-        """,
-        (symbol, interval_minutes, int(feature_version or 1)),
-    )
+        """
+_SQL_LATEST_CACHE = _SQL_CACHE_ROWS + "LIMIT 1"
+_SQL_LAST_TWO_CACHE = _SQL_CACHE_ROWS + "LIMIT 2"
+
+def latest_cache(db: MariaDB, symbol: str, interval_minutes: int, feature_version: int = 1):
+    return db.fetch_one(_SQL_LATEST_CACHE, (int(feature_version or 1), symbol, interval_minutes))
 
 def last_two_cache(db: MariaDB, symbol: str, interval_minutes: int, feature_version: int = 1):
     """Return (latest, prev) cache rows. prev may be None."""
-    rows = db.fetch_all(
-        """
-        SELECT m.open_time_ms, m.close_price, c.ema_fast, c.ema_slow, c.rsi, c.features_json
-        FROM market_data m
-        LEFT JOIN market_data_cache c
-          ON c.symbol=m.symbol AND c.interval_minutes=m.interval_minutes AND c.open_time_ms=m.open_time_ms AND c.feature_version=%s
-        WHERE m.symbol=%s AND m.interval_minutes=%s
-        ORDER BY m.open_time_ms DESC
-        LIMIT 2
-        """,
-        (symbol, interval_minutes, int(feature_version or 1)),
-    ) or []
-    latest = rows[0] if len(rows) >= 1 else None
-    prev = rows[1] if len(rows) >= 2 else None
-    return latest, prev
+    rows = db.fetch_all(_SQL_LAST_TWO_CACHE, (int(feature_version or 1), symbol, interval_minutes))
+    if not rows:
+        return None, None
+    return rows[0], (rows[1] if len(rows) > 1 else None)
 
 def get_position(db: MariaDB, symbol: str):
     return db.fetch_one(
@@ -1118,12 +1082,32 @@ def _close_trade_and_train(
         except Exception:
             pass
 
+# setup_b_decision 读取的特征字段（按解包顺序）
+_SETUP_B_KEYS = ("adx14", "plus_di14", "minus_di14", "vol_ratio", "mom10", "squeeze_status")
+_SETUP_B_PREV_KEYS = ("mom10", "squeeze_status")
+
+def _fnums(d: dict, keys: tuple) -> tuple:
+    """一次取出多个数值特征（缺失/非法为 None），便于调用方直接元组解包。"""
+    get = d.get
+    out = []
+    for k in keys:
+        v = get(k)
+        if v is None:
+            out.append(None)
+            continue
+        try:
+            out.append(float(v))
+        except Exception:
+            out.append(None)
+    return tuple(out)
+
 def setup_b_decision(
     latest: dict,
     prev: dict | None,
     *,
     ai_score: float,
     settings: Settings,
+    explain: bool = True,
 ) -> tuple[bool, ReasonCode, str]:
     """V8.3 Setup B decision.
 
@@ -1134,62 +1118,47 @@ def setup_b_decision(
       - Volume ratio >= threshold
       - AI score >= threshold
 
+    explain=False: 首个不满足的条件即返回（reason 只含该条），且趋势过滤失败时不再解析 prev 特征；
+    调用方不需要完整原因列表时使用。
+
     Returns: (should_buy, reason_code, reason)
     """
+    reason_code = ReasonCode.SETUP_B_SQUEEZE_RELEASE
     f = _parse_json_maybe(latest.get("features_json"))
-    fp = _parse_json_maybe(prev.get("features_json")) if prev else {}
-
-    def _fnum(d: dict, k: str):
-        try:
-            v = d.get(k)
-            return float(v) if v is not None else None
-        except Exception:
-            return None
-
-    adx = _fnum(f, "adx14")
-    pdi = _fnum(f, "plus_di14")
-    mdi = _fnum(f, "minus_di14")
-    vol_ratio = _fnum(f, "vol_ratio")
-    mom = _fnum(f, "mom10")
-    sq = _fnum(f, "squeeze_status")
-    mom_prev = _fnum(fp, "mom10")
-    sq_prev = _fnum(fp, "squeeze_status")
+    adx, pdi, mdi, vol_ratio, mom, sq = _fnums(f, _SETUP_B_KEYS)
 
     adx_min = float(getattr(settings, "setup_b_adx_min", 20))
     vol_min = float(getattr(settings, "setup_b_vol_ratio_min", 1.5))
     ai_min = float(getattr(settings, "setup_b_ai_score_min", 55))
 
-    squeeze_release = (sq_prev == 1.0 and sq == 0.0)
-    mom_flip_pos = (mom_prev is not None and mom is not None and mom_prev < 0.0 and mom > 0.0)
-
-    ok = True
     reasons = []
     if adx is None or pdi is None or mdi is None:
-        ok = False
         reasons.append("missing_adx_di")
     else:
         if adx < adx_min:
-            ok = False
             reasons.append(f"adx<{adx_min}")
         if pdi <= mdi:
-            ok = False
             reasons.append("+DI<=-DI")
+    # 多数 tick 在趋势过滤处即失败：快速返回，省掉 prev 特征解析
+    if reasons and not explain:
+        return False, reason_code, "SetupB未满足: " + reasons[0]
+
+    fp = _parse_json_maybe(prev.get("features_json")) if prev else {}
+    mom_prev, sq_prev = _fnums(fp, _SETUP_B_PREV_KEYS)
+
+    squeeze_release = (sq_prev == 1.0 and sq == 0.0)
+    mom_flip_pos = (mom_prev is not None and mom is not None and mom_prev < 0.0 and mom > 0.0)
 
     if not squeeze_release:
-        ok = False
         reasons.append("no_squeeze_release")
     if not mom_flip_pos:
-        ok = False
         reasons.append("no_mom_flip_pos")
     if vol_ratio is None or vol_ratio < vol_min:
-        ok = False
         reasons.append(f"vol_ratio<{vol_min}")
     if float(ai_score) < ai_min:
-        ok = False
         reasons.append(f"ai<{ai_min}")
 
-    reason_code = ReasonCode.SETUP_B_SQUEEZE_RELEASE
-    if ok:
+    if not reasons:
         reason = (
             f"Squeeze释放+动量转正+量能放大，ADX趋势确认; "
             f"adx={adx:.1f}, +di={pdi:.1f}, -di={mdi:.1f}, "
@@ -1197,13 +1166,13 @@ def setup_b_decision(
         )
         return True, reason_code, reason
 
-    reason = "SetupB未满足: " + ", ".join(reasons)
+    reason = "SetupB未满足: " + ", ".join(reasons if explain else reasons[:1])
     return False, reason_code, reason
 
 
 def setup_b_signal(latest: dict) -> Optional[str]:
     """Backward compatible wrapper."""
-    ok, _, _ = setup_b_decision(latest, None, ai_score=50.0, settings=load_settings())
+    ok, _, _ = setup_b_decision(latest, None, ai_score=50.0, settings=load_settings(), explain=False)
     return "BUY" if ok else None
     if float(ema_fast) > float(ema_slow) and (rsi is None or float(rsi) < 70):
         return "BUY"
@@ -1308,6 +1277,15 @@ def get_equity_usdt(exchange: ExchangeClient, settings: Settings) -> float:
         return 0.0
 
 
+def get_equity_usdt_cached(exchange: ExchangeClient, settings: Settings, cache: dict) -> float:
+    """同一 tick 内多个币对开仓共用一次权益查询（cache 由调用方按 tick 新建）。"""
+    v = cache.get("equity_usdt")
+    if v is None:
+        v = get_equity_usdt(exchange, settings)
+        cache["equity_usdt"] = v
+    return v
+
+
 def compute_base_margin_usdt(*, equity_usdt: float, ai_score: float, settings: Settings) -> float:
     base = max(50.0, float(equity_usdt) * 0.10)
     # allow boost when ai_score high (V8.3)
@@ -1336,20 +1314,31 @@ def enforce_risk_budget(
     if budget <= 0:
         return True, lev, "no_budget_configured"
 
+    margin = float(base_margin_usdt)
+
     def risk_amt(lv: int) -> float:
-        return float(base_margin_usdt) * float(lv) * float(stop_pct)
+        # 乘法顺序与原逐级实现一致（浮点结果逐位相同，边界判断与说明文本不变）
+        return margin * float(lv) * stop_pct
 
-    if risk_amt(lev) <= budget:
-        return True, lev, f"risk_ok risk={risk_amt(lev):.2f}<=budget={budget:.2f}"
+    risk = risk_amt(lev)
+    if risk <= budget:
+        return True, lev, f"risk_ok risk={risk:.2f}<=budget={budget:.2f}"
 
-    # reduce leverage
-    while lev > 1 and risk_amt(lev) > budget:
-        lev -= 1
+    # reduce leverage：直接算出满足预算的最大杠杆（risk 随 lev 单调），不再逐级递减
+    if lev > 1:
+        lv = max(1, min(lev, int(budget // (margin * stop_pct))))
+        # 浮点边界修正：结果与逐级比较 risk_amt(lv) > budget 一致
+        while lv < lev and risk_amt(lv + 1) <= budget:
+            lv += 1
+        while lv > 1 and risk_amt(lv) > budget:
+            lv -= 1
+        lev = lv
+        risk = risk_amt(lev)
 
-    if risk_amt(lev) <= budget:
-        return True, lev, f"risk_adjusted risk={risk_amt(lev):.2f}<=budget={budget:.2f}"
+    if risk <= budget:
+        return True, lev, f"risk_adjusted risk={risk:.2f}<=budget={budget:.2f}"
 
-    return False, lev, f"risk_reject risk={risk_amt(lev):.2f}>budget={budget:.2f}"
+    return False, lev, f"risk_reject risk={risk:.2f}>budget={budget:.2f}"
 
 
 def min_qty_from_min_margin_usdt(min_margin_usdt: float, last_price: float, leverage: int, *, precision: int = 6) -> float:
@@ -1409,7 +1398,18 @@ def get_latest_positions_map(db: MariaDB, symbols: list[str]) -> dict[str, float
         out[str(r["symbol"]).upper()] = float(r["base_qty"])
     return out
 
+_SYMBOL_IO_WORKERS = 8
+
 def main():
+    # 选币阶段按 symbol 并发读取行情缓存（纯 DB I/O）；主循环以任何方式退出都关闭线程池
+    symbol_io_pool = ThreadPoolExecutor(max_workers=_SYMBOL_IO_WORKERS, thread_name_prefix="symbol-io")
+    try:
+        _run(symbol_io_pool)
+    finally:
+        symbol_io_pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _run(symbol_io_pool: ThreadPoolExecutor) -> None:
     settings = load_settings()
     exchange = settings.exchange
     db = MariaDB(settings.db_host, settings.db_port, settings.db_user, settings.db_pass, settings.db_name)
@@ -1464,6 +1464,7 @@ def main():
         pass
     next_cfg_refresh_ts = time.time() + float(settings.runtime_config_refresh_seconds)
     next_stop_poll_ts = time.time() + float(max(1, int(runtime_cfg.stop_order_poll_seconds)))
+    next_snapshot_ts = time.time() + float(getattr(settings, "position_snapshot_interval_seconds", 300) or 300)
 
     while True:
         # leader election: only leader executes trading ticks; followers only heartbeat + metrics
@@ -1488,10 +1489,12 @@ def main():
             continue
 
         # Sleep until next tick, but keep refreshing runtime config so SYMBOLS/HALT/EMERGENCY can hot-reload
-        sleep_s = next_tick_sleep_seconds(settings.strategy_tick_seconds)
-        end_ts = time.time() + float(sleep_s)
-        while time.time() < end_ts:
-            if time.time() >= next_cfg_refresh_ts:
+        end_ts = next_tick_epoch(settings.strategy_tick_seconds)
+        while True:
+            now_ts = time.time()
+            if now_ts >= end_ts:
+                break
+            if now_ts >= next_cfg_refresh_ts:
                 try:
                     changes = runtime_cfg.refresh(db, settings)
                     metrics.runtime_config_refresh_total.labels(SERVICE).inc()
@@ -1506,7 +1509,7 @@ def main():
 
             # periodic position snapshots (V8.3): every N seconds write a snapshot for active positions
             try:
-                if time.time() >= next_snapshot_ts and symbols:
+                if now_ts >= next_snapshot_ts and symbols:
                     snap_trace_id = new_trace_id("pos_snap")
                     interval_s = float(getattr(settings, "position_snapshot_interval_seconds", 300) or 300)
                     for sym in list(symbols):
@@ -1542,7 +1545,7 @@ def main():
             # protective stop poll (between ticks) - for crash recovery / timely stop fill detection
             try:
                 if (
-                    time.time() >= next_stop_poll_ts
+                    now_ts >= next_stop_poll_ts
                     and bool(runtime_cfg.use_protective_stop_order)
                     and settings.exchange != "paper"
                     and symbols
@@ -1642,387 +1645,892 @@ def main():
             except Exception:
                 pass
 
-            time.sleep(min(2.0, max(0.1, end_ts - time.time())))
+            # 直接睡到下一个到期事件（tick / 配置刷新 / 快照 / 止损轮询），不再固定 2s 轮询
+            wake_ts = min(end_ts, next_cfg_refresh_ts)
+            if symbols:
+                wake_ts = min(wake_ts, next_snapshot_ts)
+                if bool(runtime_cfg.use_protective_stop_order) and settings.exchange != "paper":
+                    wake_ts = min(wake_ts, next_stop_poll_ts)
+            time.sleep(max(0.1, wake_ts - time.time()))
 
         trace_id = new_trace_id("tick")
 
-        try:
-            # HALT_TRADING: hot-reload from system_config
-            if bool(runtime_cfg.halt_trading):
-                telegram.send(f"[HALT] 本轮跳过 trace_id={trace_id} symbols={','.join(symbols)}")
-                continue
-
-            tick_id = int(time.time() // settings.strategy_tick_seconds)
+        # 整个 tick 复用同一条 DB 连接（每条语句仍独立提交），tick 结束即关闭
+        with db.session():
+            try:
+                # HALT_TRADING: hot-reload from system_config
+                if bool(runtime_cfg.halt_trading):
+                    telegram.send(f"[HALT] 本轮跳过 trace_id={trace_id} symbols={','.join(symbols)}")
+                    continue
 
-            tick_start_ts = time.time()
-            def _budget_exceeded() -> bool:
-                return (time.time() - float(tick_start_ts)) > float(settings.tick_budget_seconds)
+                tick_id = int(time.time() // settings.strategy_tick_seconds)
 
-            # best-effort reconcile (stale CREATED/SUBMITTED orders)
-            try:
-                fixed = reconcile_stale_orders(db, ex, exchange_name=settings.exchange, max_age_seconds=180, metrics=metrics, telegram=telegram)
-                if fixed:
-                    logger.info(f"reconcile_fixed={fixed} trace_id={trace_id}")
-            except Exception:
-                pass
+                tick_start_ts = time.time()
+                def _budget_exceeded() -> bool:
+                    return (time.time() - float(tick_start_ts)) > float(settings.tick_budget_seconds)
 
-            # 先计算“当前全局已持仓数量”，用于限制最多 3 单（跨交易对）
-            pos_map = get_latest_positions_map(db, tuple(symbols))
-            open_cnt = sum(1 for q in pos_map.values() if q > 0)
+                # best-effort reconcile (stale CREATED/SUBMITTED orders)
+                try:
+                    fixed = reconcile_stale_orders(db, ex, exchange_name=settings.exchange, max_age_seconds=180, metrics=metrics, telegram=telegram)
+                    if fixed:
+                        logger.info(f"reconcile_fixed={fixed} trace_id={trace_id}")
+                except Exception:
+                    pass
 
-            # --- AI 选币：从 SYMBOLS(10-20) 中选择“最优”开仓币对 ---
-            # 需求：同一时间最多只允许 MAX_CONCURRENT_POSITIONS 个仓位（跨交易对全局限制）。
-            # 我们对“当前无持仓”的币对计算 BUY 信号与机器人评分，并按评分排序，取前 N 个执行开仓。
-            selected_open_symbols: set[str] = set()
-            selected_open_meta: dict[str, dict] = {}
-            try:
-                max_pos = int(settings.max_concurrent_positions)
-                available_slots = max(0, max_pos - open_cnt)
-                if available_slots > 0:
-                    candidates = []  # (combined_score, symbol, meta)
-                    ai_model = _load_ai_model(db, settings) if settings.ai_enabled else None
-                    for s in symbols:
-                        if _budget_exceeded():
-                            log_action(logger, "TICK_TIME_BUDGET_EXCEEDED", trace_id=trace_id, reason_code=ReasonCode.TICK_TIMEOUT.value, reason=f"tick budget exceeded during selection (>{settings.tick_budget_seconds}s)")
-                            break
-                        if float(pos_map.get(s, 0.0) or 0.0) > 0.0:
-                            continue  # 已有仓位的币对不参与“选币开仓”，但仍会参与后续平仓/止损逻辑
-                        latest_s, prev_s = last_two_cache(db, s, settings.interval_minutes, settings.feature_version)
-                        if not latest_s:
-                            continue
-                        # 你要求的口径：MIN_ORDER_USDT 是“实际保证金(USDT)”，名义价值 = 价格*qty ≈ 保证金*杠杆。
-                        # 因此选币阶段也要用“保证金*杠杆”的方式反推 qty，避免选中后又因 qty 过小被跳过。
-                        try:
-                            last_px = float(latest_s.get("close_price") or 0.0)
-                        except Exception:
-                            last_px = 0.0
-                        if last_px <= 0:
-                            continue
-                        score_s = compute_robot_score(latest_s, signal="BUY")
-                        lev_s = leverage_from_score(settings, score_s)
-                        qty_s = min_qty_from_min_margin_usdt(settings.min_order_usdt, last_px, lev_s, precision=6)
-                        if qty_s <= 0:
-                            continue
-                        ai_prob = None
-                        feat_bundle = {}
-                        if settings.ai_enabled and ai_model is not None:
+                # 先计算“当前全局已持仓数量”，用于限制最多 3 单（跨交易对）
+                pos_map = get_latest_positions_map(db, tuple(symbols))
+                open_cnt = sum(1 for q in pos_map.values() if q > 0)
+
+                # --- AI 选币：从 SYMBOLS(10-20) 中选择“最优”开仓币对 ---
+                # 需求：同一时间最多只允许 MAX_CONCURRENT_POSITIONS 个仓位（跨交易对全局限制）。
+                # 我们对“当前无持仓”的币对计算 BUY 信号与机器人评分，并按评分排序，取前 N 个执行开仓。
+                selected_open_symbols: set[str] = set()
+                selected_open_meta: dict[str, dict] = {}
+                # 本 tick 内复用：选币阶段已取过的 (latest, prev) 行、账户权益（每 tick 最多查一次交易所）
+                cache_rows: dict[str, tuple] = {}
+                tick_cache: dict[str, float] = {}
+                try:
+                    max_pos = int(settings.max_concurrent_positions)
+                    available_slots = max(0, max_pos - open_cnt)
+                    if available_slots > 0:
+                        candidates = []  # (combined_score, symbol, meta)
+                        ai_model = _load_ai_model(db, settings) if settings.ai_enabled else None
+                        # 无持仓币对的 last_two_cache 并发预取：本轮耗时 ≈ 单个查询而非 N 个之和。
+                        # db.session() 的连接只绑定 tick 主线程：worker 线程上的查询各自新建短连接（线程安全）
+                        flat_symbols = [s for s in symbols if float(pos_map.get(s, 0.0) or 0.0) <= 0.0]
+                        cache_rows = dict(zip(flat_symbols, symbol_io_pool.map(
+                            lambda s: last_two_cache(db, s, settings.interval_minutes, settings.feature_version),
+                            flat_symbols,
+                        )))
+                        for s in symbols:
+                            if _budget_exceeded():
+                                log_action(logger, "TICK_TIME_BUDGET_EXCEEDED", trace_id=trace_id, reason_code=ReasonCode.TICK_TIMEOUT.value, reason=f"tick budget exceeded during selection (>{settings.tick_budget_seconds}s)")
+                                break
+                            if float(pos_map.get(s, 0.0) or 0.0) > 0.0:
+                                continue  # 已有仓位的币对不参与“选币开仓”，但仍会参与后续平仓/止损逻辑
+                            latest_s, prev_s = cache_rows.get(s, (None, None))
+                            if not latest_s:
+                                continue
+                            # 你要求的口径：MIN_ORDER_USDT 是“实际保证金(USDT)”，名义价值 = 价格*qty ≈ 保证金*杠杆。
+                            # 因此选币阶段也要用“保证金*杠杆”的方式反推 qty，避免选中后又因 qty 过小被跳过。
                             try:
-                                x, feat_bundle = _vectorize_for_ai(latest_s)
-                                ai_prob = float(ai_model.predict_proba(x))
-                                metrics.ai_predictions_total.labels(SERVICE, s).inc()
+                                last_px = float(latest_s.get("close_price") or 0.0)
                             except Exception:
-                                ai_prob = None
-                        combined = float(score_s)
-                        if ai_prob is not None:
-                            w = _clamp(float(settings.ai_weight), 0.0, 1.0)
-                            combined = (1.0 - w) * float(score_s) + w * (ai_prob * 100.0)
-                        # V8.3 Setup B: decision must include AI score + prev bar for squeeze/mom flip
-                        ai_score_s = float(ai_prob * 100.0) if ai_prob is not None else 50.0
-                        should_buy_s, open_reason_code_s, open_reason_s = setup_b_decision(
-                            latest_s,
-                            prev_s,
-                            ai_score=ai_score_s,
-                            settings=settings,
-                        )
-                        if not should_buy_s:
-                            continue
-                        meta = {
-                            "robot_score": float(score_s),
-                            "ai_prob": ai_prob,
-                            "combined_score": float(combined),
-                            "features_bundle": feat_bundle,
-                            "open_reason_code": open_reason_code_s.value,
-                            "open_reason": open_reason_s,
-                        }
-                        candidates.append((float(combined), s, meta))
-                    # 按评分从高到低选择前 N 个开仓候选
-                    candidates.sort(key=lambda x: x[0], reverse=True)
-                    selected_open_symbols = set([sym for _, sym, _ in candidates[:available_slots]])
-                    selected_open_meta = {sym: meta for _, sym, meta in candidates[:available_slots]}
-            except Exception:
-                # 选币失败不应导致主循环崩溃：回退为“无候选”，本轮不主动开仓
-                selected_open_symbols = set()
-                selected_open_meta = {}
-            apply_control_commands(db, telegram, exchange=settings.exchange, trace_id=trace_id)
-            # Circuit breaker auto-halt
-            should_halt, note = breaker.should_halt()
-            if should_halt and get_flag(db, "HALT_TRADING", "false") != "true":
-                set_flag(db, "HALT_TRADING", "true")
-                send_system_alert(
-                    telegram,
-                    title="熔断触发暂停交易",
-                    summary_kv=build_system_summary(
-                        event="CIRCUIT_HALT",
+                                last_px = 0.0
+                            if last_px <= 0:
+                                continue
+                            score_s = compute_robot_score(latest_s, signal="BUY")
+                            lev_s = leverage_from_score(settings, score_s)
+                            qty_s = min_qty_from_min_margin_usdt(settings.min_order_usdt, last_px, lev_s, precision=6)
+                            if qty_s <= 0:
+                                continue
+                            ai_prob = None
+                            feat_bundle = {}
+                            if settings.ai_enabled and ai_model is not None:
+                                try:
+                                    x, feat_bundle = _vectorize_for_ai(latest_s)
+                                    ai_prob = float(ai_model.predict_proba(x))
+                                    metrics.ai_predictions_total.labels(SERVICE, s).inc()
+                                except Exception:
+                                    ai_prob = None
+                            combined = float(score_s)
+                            if ai_prob is not None:
+                                w = _clamp(float(settings.ai_weight), 0.0, 1.0)
+                                combined = (1.0 - w) * float(score_s) + w * (ai_prob * 100.0)
+                            # V8.3 Setup B: decision must include AI score + prev bar for squeeze/mom flip
+                            ai_score_s = float(ai_prob * 100.0) if ai_prob is not None else 50.0
+                            should_buy_s, open_reason_code_s, open_reason_s = setup_b_decision(
+                                latest_s,
+                                prev_s,
+                                ai_score=ai_score_s,
+                                settings=settings,
+                                explain=False,
+                            )
+                            if not should_buy_s:
+                                continue
+                            meta = {
+                                "robot_score": float(score_s),
+                                "ai_prob": ai_prob,
+                                "combined_score": float(combined),
+                                "features_bundle": feat_bundle,
+                                "open_reason_code": open_reason_code_s.value,
+                                "open_reason": open_reason_s,
+                            }
+                            candidates.append((float(combined), s, meta))
+                        # 按评分从高到低选择前 N 个开仓候选
+                        candidates.sort(key=lambda x: x[0], reverse=True)
+                        selected_open_symbols = set([sym for _, sym, _ in candidates[:available_slots]])
+                        selected_open_meta = {sym: meta for _, sym, meta in candidates[:available_slots]}
+                except Exception:
+                    # 选币失败不应导致主循环崩溃：回退为“无候选”，本轮不主动开仓
+                    selected_open_symbols = set()
+                    selected_open_meta = {}
+                apply_control_commands(db, telegram, exchange=settings.exchange, trace_id=trace_id)
+                # Circuit breaker auto-halt
+                should_halt, note = breaker.should_halt()
+                if should_halt and get_flag(db, "HALT_TRADING", "false") != "true":
+                    set_flag(db, "HALT_TRADING", "true")
+                    send_system_alert(
+                        telegram,
+                        title="熔断触发暂停交易",
+                        summary_kv=build_system_summary(
+                            event="CIRCUIT_HALT",
+                            trace_id=trace_id,
+                            exchange=exchange,
+                            level="WARN",
+                            reason_code=ReasonCode.CIRCUIT_BREAKER_HALT,
+                            reason=note,
+                        ),
+                        payload={"note": note},
+                    )
+                    log_action(
+                        logger,
+                        action="CIRCUIT_BREAKER_HALT",
                         trace_id=trace_id,
-                        exchange=exchange,
-                        level="WARN",
                         reason_code=ReasonCode.CIRCUIT_BREAKER_HALT,
                         reason=note,
-                    ),
-                    payload={"note": note},
-                )
-                log_action(
-                    logger,
-                    action="CIRCUIT_BREAKER_HALT",
-                    trace_id=trace_id,
-                    reason_code=ReasonCode.CIRCUIT_BREAKER_HALT,
-                    reason=note,
-                    client_order_id=None,
-                )
-                append_order_event(db, trace_id=trace_id, service=SERVICE, exchange=exchange, symbol="*",
-                                 client_order_id=None, exchange_order_id=None, event_type=OrderEventType.ERROR,
-                                 side=Side.BUY.value, qty=0.0, price=None, status="HALT",
-                                 reason_code=ReasonCode.CIRCUIT_BREAKER_HALT.value, reason=note, payload={"window_seconds": breaker.window_seconds})
-
-                log_action(logger, "CIRCUIT_BREAKER_HALT", trace_id=trace_id,
-                           reason_code=ReasonCode.CIRCUIT_BREAKER_HALT.value, reason=note,
-                           window_seconds=breaker.window_seconds)
-
-            for symbol in symbols:
-                if _budget_exceeded():
-                    log_action(logger, "TICK_TIME_BUDGET_EXCEEDED", trace_id=trace_id, reason_code=ReasonCode.TICK_TIMEOUT.value, reason=f"tick budget exceeded before processing symbols (>{settings.tick_budget_seconds}s)")
-                    break
-                lock_key = f"asv8:lock:trade:{symbol}"
-                with distributed_lock(r, lock_key, ttl_ms=int(min(float(settings.trade_lock_ttl_seconds), float(settings.strategy_tick_seconds)) * 1000)) as acquired:
-                    if not acquired:
-                        continue
-
-                    latest, prev = last_two_cache(db, symbol, settings.interval_minutes, settings.feature_version)
-                    if not latest:
-                        continue
-
-                    last_price = float(latest["close_price"])
-                    if hasattr(ex, "update_last_price"):
-                        ex.update_last_price(symbol, last_price)
-
-                    pos = get_position(db, symbol)
-                    base_qty = float(pos["base_qty"]) if pos else 0.0
-                    avg_entry = float(pos["avg_entry_price"]) if pos and pos["avg_entry_price"] is not None else None
-
-                    # --- 交易所保护止损单：轮询 + 异常分支（拒绝/过期/取消）自动重挂或降级 ---
-                    if base_qty > 0 and bool(runtime_cfg.use_protective_stop_order) and settings.exchange != "paper":
-                        meta_before = _parse_json_maybe(pos.get("meta_json") if pos else None)
-                        closed_by_stop, meta_after = _ensure_protective_stop(
-                            exchange=ex,
-                            db=db,
-                            metrics=metrics,
-                            telegram=telegram,
-                            settings=settings,
-                            runtime_cfg=runtime_cfg,
-                            symbol=symbol,
-                            base_qty=float(base_qty),
-                            avg_entry=avg_entry,
-                            pos_row=pos,
-                            trace_id=trace_id,
-                        )
-                        # 仅当 meta 有变化时写快照（避免每轮都写）
-                        try:
-                            if meta_after != meta_before:
-                                save_position(db, symbol, float(base_qty), float(avg_entry) if avg_entry is not None else None, meta_after)
-                        except Exception:
-                            pass
+                        client_order_id=None,
+                    )
+                    append_order_event(db, trace_id=trace_id, service=SERVICE, exchange=exchange, symbol="*",
+                                     client_order_id=None, exchange_order_id=None, event_type=OrderEventType.ERROR,
+                                     side=Side.BUY.value, qty=0.0, price=None, status="HALT",
+                                     reason_code=ReasonCode.CIRCUIT_BREAKER_HALT.value, reason=note, payload={"window_seconds": breaker.window_seconds})
+
+                    log_action(logger, "CIRCUIT_BREAKER_HALT", trace_id=trace_id,
+                               reason_code=ReasonCode.CIRCUIT_BREAKER_HALT.value, reason=note,
+                               window_seconds=breaker.window_seconds)
+
+                for symbol in symbols:
+                    if _budget_exceeded():
+                        log_action(logger, "TICK_TIME_BUDGET_EXCEEDED", trace_id=trace_id, reason_code=ReasonCode.TICK_TIMEOUT.value, reason=f"tick budget exceeded before processing symbols (>{settings.tick_budget_seconds}s)")
+                        break
+                    lock_key = f"asv8:lock:trade:{symbol}"
+                    with distributed_lock(r, lock_key, ttl_ms=int(min(float(settings.trade_lock_ttl_seconds), float(settings.strategy_tick_seconds)) * 1000)) as acquired:
+                        if not acquired:
+                            continue
 
-                        if closed_by_stop:
-                            # 止损单已成交 -> 更新本地仓位为 0，关闭 trade
-                            stop_fill = meta_after.pop("_stop_fill", {}) if isinstance(meta_after, dict) else {}
-                            exit_price = stop_fill.get("avg_price") or meta_after.get("stop_price") or avg_entry
-                            trade_id2 = _find_open_trade_id(db, symbol, meta_after if isinstance(meta_after, dict) else {})
-                            save_position(db, symbol, 0.0, None, {"trace_id": trace_id, "note": "protective_stop_filled", "trade_id": trade_id2})
-                            if trade_id2 > 0:
-                                _close_trade_and_train(
-                                    db,
-                                    settings,
-                                    metrics,
-                                    _load_ai_model(db, settings) if settings.ai_enabled else None,
-                                    trade_id=trade_id2,
-                                    symbol=symbol,
-                                    qty=float(base_qty),
-                                    exit_price=float(exit_price) if exit_price is not None else None,
-                                    pnl_usdt=stop_fill.get("pnl_usdt"),
-                                    close_reason_code=ReasonCode.STOP_LOSS.value,
-                                    close_reason="Protective stop filled (exchange)",
-                                    trace_id=trace_id,
-                                )
-                            open_cnt = max(0, open_cnt - 1)
-                            stop_p = None
-                            try:
-                                stop_p = float(meta_after.get("stop_price") or 0.0) if isinstance(meta_after, dict) else None
-                            except Exception:
-                                stop_p = None
-                            summary_kv = build_trade_summary(
-                                event="PROTECTIVE_STOP_FILLED",
-                                trace_id=trace_id,
-                                exchange=exchange,
+                        latest, prev = cache_rows.get(symbol) or last_two_cache(db, symbol, settings.interval_minutes, settings.feature_version)
+                        if not latest:
+                            continue
+
+                        last_price = float(latest["close_price"])
+                        if hasattr(ex, "update_last_price"):
+                            ex.update_last_price(symbol, last_price)
+
+                        pos = get_position(db, symbol)
+                        base_qty = float(pos["base_qty"]) if pos else 0.0
+                        avg_entry = float(pos["avg_entry_price"]) if pos and pos["avg_entry_price"] is not None else None
+
+                        # --- 交易所保护止损单：轮询 + 异常分支（拒绝/过期/取消）自动重挂或降级 ---
+                        if base_qty > 0 and bool(runtime_cfg.use_protective_stop_order) and settings.exchange != "paper":
+                            meta_before = _parse_json_maybe(pos.get("meta_json") if pos else None)
+                            closed_by_stop, meta_after = _ensure_protective_stop(
+                                exchange=ex,
+                                db=db,
+                                metrics=metrics,
+                                telegram=telegram,
+                                settings=settings,
+                                runtime_cfg=runtime_cfg,
                                 symbol=symbol,
-                                side="SELL",
-                                qty=base_qty,
-                                price=exit_price,
-                                stop_price=stop_p,
-                                reason_code=ReasonCode.STOP_LOSS,
-                                reason="Protective stop filled (exchange)",
-                                extra={"pnl_usdt": stop_fill.get("pnl_usdt")},
-                            )
-                            send_trade_alert(
-                                telegram,
-                                title="交易所止损单成交",
-                                summary_kv=summary_kv,
-                                payload={"stop_fill": stop_fill},
-                            )
-                            log_action(
-                                logger,
-                                "PROTECTIVE_STOP_FILLED",
+                                base_qty=float(base_qty),
+                                avg_entry=avg_entry,
+                                pos_row=pos,
                                 trace_id=trace_id,
-                                exchange=exchange,
-                                symbol=symbol,
-                                side="SELL",
-                                qty=base_qty,
-                                price=exit_price,
-                                stop_price=stop_p,
-                                reason_code=ReasonCode.STOP_LOSS.value,
-                                reason="Protective stop filled (exchange)",
-                                pnl_usdt=stop_fill.get("pnl_usdt"),
                             )
+                            # 仅当 meta 有变化时写快照（避免每轮都写）
                             try:
-                                metrics.orders_total.labels(SERVICE, settings.exchange, symbol, "STOP_LOSS").inc()
+                                if meta_after != meta_before:
+                                    save_position(db, symbol, float(base_qty), float(avg_entry) if avg_entry is not None else None, meta_after)
                             except Exception:
                                 pass
-                            continue
 
-                    # --- 紧急退出：对所有交易对生效 ---
-                    if bool(runtime_cfg.emergency_exit):
-                        if base_qty > 0:
-                            client_order_id = make_client_order_id(
-                                "exit",
-                                symbol,
-                                interval_minutes=settings.interval_minutes,
-                                kline_open_time_ms=int(latest["open_time_ms"]),
-                                trace_id=trace_id,
-                            )
-                            append_order_event(
-                                db, trace_id=trace_id, service=SERVICE, exchange=exchange, symbol=symbol,
-                                client_order_id=client_order_id, exchange_order_id=None, event_type=OrderEventType.CREATED,
-                                side=Side.SELL.value, qty=base_qty, price=None, status="CREATED",
-                                reason_code=ReasonCode.EMERGENCY_EXIT, reason="Emergency exit requested", payload={}
-                            )
-                            meta = _parse_json_maybe(pos.get('meta_json') if pos else None)
-                            meta["base_qty"] = float(base_qty)
-                            if runtime_cfg.use_protective_stop_order and settings.exchange != "paper" and meta.get("stop_client_order_id"):
-                                _cancel_protective_stop(exchange=ex, db=db, symbol=symbol, trace_id=trace_id, meta=meta)
-                            send_system_alert(
-                                telegram,
-                                title="紧急退出下单已提交",
-                                summary_kv=build_system_summary(
-                                    event="EMERGENCY_EXIT_SUBMITTED",
+                            if closed_by_stop:
+                                # 止损单已成交 -> 更新本地仓位为 0，关闭 trade
+                                stop_fill = meta_after.pop("_stop_fill", {}) if isinstance(meta_after, dict) else {}
+                                exit_price = stop_fill.get("avg_price") or meta_after.get("stop_price") or avg_entry
+                                trade_id2 = _find_open_trade_id(db, symbol, meta_after if isinstance(meta_after, dict) else {})
+                                save_position(db, symbol, 0.0, None, {"trace_id": trace_id, "note": "protective_stop_filled", "trade_id": trade_id2})
+                                if trade_id2 > 0:
+                                    _close_trade_and_train(
+                                        db,
+                                        settings,
+                                        metrics,
+                                        _load_ai_model(db, settings) if settings.ai_enabled else None,
+                                        trade_id=trade_id2,
+                                        symbol=symbol,
+                                        qty=float(base_qty),
+                                        exit_price=float(exit_price) if exit_price is not None else None,
+                                        pnl_usdt=stop_fill.get("pnl_usdt"),
+                                        close_reason_code=ReasonCode.STOP_LOSS.value,
+                                        close_reason="Protective stop filled (exchange)",
+                                        trace_id=trace_id,
+                                    )
+                                open_cnt = max(0, open_cnt - 1)
+                                stop_p = None
+                                try:
+                                    stop_p = float(meta_after.get("stop_price") or 0.0) if isinstance(meta_after, dict) else None
+                                except Exception:
+                                    stop_p = None
+                                summary_kv = build_trade_summary(
+                                    event="PROTECTIVE_STOP_FILLED",
+                                    trace_id=trace_id,
+                                    exchange=exchange,
+                                    symbol=symbol,
+                                    side="SELL",
+                                    qty=base_qty,
+                                    price=exit_price,
+                                    stop_price=stop_p,
+                                    reason_code=ReasonCode.STOP_LOSS,
+                                    reason="Protective stop filled (exchange)",
+                                    extra={"pnl_usdt": stop_fill.get("pnl_usdt")},
+                                )
+                                send_trade_alert(
+                                    telegram,
+                                    title="交易所止损单成交",
+                                    summary_kv=summary_kv,
+                                    payload={"stop_fill": stop_fill},
+                                )
+                                log_action(
+                                    logger,
+                                    "PROTECTIVE_STOP_FILLED",
                                     trace_id=trace_id,
                                     exchange=exchange,
-                                    level="WARN",
-                                    extra={
+                                    symbol=symbol,
+                                    side="SELL",
+                                    qty=base_qty,
+                                    price=exit_price,
+                                    stop_price=stop_p,
+                                    reason_code=ReasonCode.STOP_LOSS.value,
+                                    reason="Protective stop filled (exchange)",
+                                    pnl_usdt=stop_fill.get("pnl_usdt"),
+                                )
+                                try:
+                                    metrics.orders_total.labels(SERVICE, settings.exchange, symbol, "STOP_LOSS").inc()
+                                except Exception:
+                                    pass
+                                continue
+
+                        # --- 紧急退出：对所有交易对生效 ---
+                        if bool(runtime_cfg.emergency_exit):
+                            if base_qty > 0:
+                                client_order_id = make_client_order_id(
+                                    "exit",
+                                    symbol,
+                                    interval_minutes=settings.interval_minutes,
+                                    kline_open_time_ms=int(latest["open_time_ms"]),
+                                    trace_id=trace_id,
+                                )
+                                append_order_event(
+                                    db, trace_id=trace_id, service=SERVICE, exchange=exchange, symbol=symbol,
+                                    client_order_id=client_order_id, exchange_order_id=None, event_type=OrderEventType.CREATED,
+                                    side=Side.SELL.value, qty=base_qty, price=None, status="CREATED",
+                                    reason_code=ReasonCode.EMERGENCY_EXIT, reason="Emergency exit requested", payload={}
+                                )
+                                meta = _parse_json_maybe(pos.get('meta_json') if pos else None)
+                                meta["base_qty"] = float(base_qty)
+                                if runtime_cfg.use_protective_stop_order and settings.exchange != "paper" and meta.get("stop_client_order_id"):
+                                    _cancel_protective_stop(exchange=ex, db=db, symbol=symbol, trace_id=trace_id, meta=meta)
+                                send_system_alert(
+                                    telegram,
+                                    title="紧急退出下单已提交",
+                                    summary_kv=build_system_summary(
+                                        event="EMERGENCY_EXIT_SUBMITTED",
+                                        trace_id=trace_id,
+                                        exchange=exchange,
+                                        level="WARN",
+                                        extra={
+                                            "symbol": symbol,
+                                            "side": "SELL",
+                                            "qty": float(base_qty),
+                                            "last_price": float(last_price),
+                                            "client_order_id": client_order_id,
+                                        },
+                                    ),
+                                    payload={
                                         "symbol": symbol,
                                         "side": "SELL",
                                         "qty": float(base_qty),
                                         "last_price": float(last_price),
                                         "client_order_id": client_order_id,
                                     },
-                                ),
-                                payload={
-                                    "symbol": symbol,
-                                    "side": "SELL",
-                                    "qty": float(base_qty),
-                                    "last_price": float(last_price),
-                                    "client_order_id": client_order_id,
-                                },
-                            )
-                            summary_kv = build_trade_summary(
-                                event="STOP_LOSS_SUBMITTED",
-                                trace_id=trace_id,
-                                exchange=exchange,
-                                symbol=symbol,
-                                side="SELL",
-                                qty=base_qty,
-                                price=last_price,
-                                stop_price=stop_price,
-                                reason_code=ReasonCode.STOP_LOSS,
-                                reason=f"Hard stop loss submit: last={last_price} <= stop={stop_price}",
-                                client_order_id=client_order_id,
+                                )
+                                summary_kv = build_trade_summary(
+                                    event="STOP_LOSS_SUBMITTED",
+                                    trace_id=trace_id,
+                                    exchange=exchange,
+                                    symbol=symbol,
+                                    side="SELL",
+                                    qty=base_qty,
+                                    price=last_price,
+                                    stop_price=stop_price,
+                                    reason_code=ReasonCode.STOP_LOSS,
+                                    reason=f"Hard stop loss submit: last={last_price} <= stop={stop_price}",
+                                    client_order_id=client_order_id,
+                                    status="SUBMITTING",
+                                )
+                                send_trade_alert(
+                                    telegram,
+                                    title="止损下单已提交",
+                                    summary_kv=summary_kv,
+                                    payload={
+                                        "client_order_id": client_order_id,
+                                        "symbol": symbol,
+                                        "side": "SELL",
+                                        "qty": float(base_qty),
+                                        "last_price": float(last_price),
+                                        "stop_price": float(stop_price),
+                                    },
+                                )
+                                res = ex.place_market_order(symbol=symbol, side="SELL", qty=base_qty, client_order_id=client_order_id)
+                                append_order_event(
+                                    db, trace_id=trace_id, service=SERVICE, exchange=exchange, symbol=symbol,
+                                    client_order_id=client_order_id, exchange_order_id=res.exchange_order_id,
+                                    event_type=_event_type_from_status(res.status),
+                                    side=Side.SELL.value, qty=base_qty, price=res.avg_price, status=res.status,
+                                    reason_code=ReasonCode.EMERGENCY_EXIT, reason="Emergency exit executed", payload=res.raw or {}
+                                )
+                                meta2 = _parse_json_maybe(pos.get("meta_json") if pos else None)
+                                trade_id2 = _find_open_trade_id(db, symbol, meta2)
+                                save_position(db, symbol, 0.0, None, {"trace_id": trace_id, "note": "emergency_exit", "trade_id": trade_id2})
+                                # 通知等待方（admin smoke-test）：已平仓，免轮询 order_events
+                                notify_emergency_exit(r, symbol=symbol, trace_id=trace_id)
+                                if trade_id2 > 0:
+                                    _close_trade_and_train(
+                                        db,
+                                        settings,
+                                        metrics,
+                                        _load_ai_model(db, settings) if settings.ai_enabled else None,
+                                        trade_id=trade_id2,
+                                        symbol=symbol,
+                                        qty=float(base_qty),
+                                        exit_price=res.avg_price,
+                                        pnl_usdt=res.pnl_usdt,
+                                        close_reason_code=ReasonCode.EMERGENCY_EXIT.value,
+                                        close_reason="Emergency exit executed",
+                                        trace_id=trace_id,
+                                    )
+                                open_cnt = max(0, open_cnt - 1)
+                                send_system_alert(
+                                    telegram,
+                                    title="紧急退出已执行",
+                                    summary_kv=build_system_summary(
+                                        event="EMERGENCY_EXIT_EXECUTED",
+                                        trace_id=trace_id,
+                                        exchange=exchange,
+                                        level="INFO",
+                                        extra={
+                                            "symbol": symbol,
+                                            "side": "SELL",
+                                            "qty": base_qty,
+                                            "price": res.avg_price,
+                                            "fee_usdt": res.fee_usdt,
+                                            "pnl_usdt": res.pnl_usdt,
+                                        },
+                                    ),
+                                    payload={
+                                        "client_order_id": client_order_id,
+                                        "exchange_order_id": res.exchange_order_id,
+                                        "avg_price": res.avg_price,
+                                        "fee_usdt": res.fee_usdt,
+                                        "pnl_usdt": res.pnl_usdt,
+                                    },
+                                )
+
+                            # 当所有币对都检查完后再清掉 EMERGENCY_EXIT
+                            continue
+
+                        # --- 硬止损（逐仓合约） ---
+                        if base_qty > 0 and avg_entry is not None:
+                            meta = _parse_json_maybe(pos.get('meta_json') if pos else None)
+                            stop_dist_pct = float(meta.get('stop_dist_pct') or settings.hard_stop_loss_pct)
+                            stop_price = float(meta.get('stop_price') or (avg_entry * (1.0 - stop_dist_pct)))
+                            if last_price <= stop_price and not (runtime_cfg.use_protective_stop_order and settings.exchange != "paper" and meta.get('stop_client_order_id')):
+                                client_order_id = make_client_order_id(
+                                    "sl",
+                                    symbol,
+                                    interval_minutes=settings.interval_minutes,
+                                    kline_open_time_ms=int(latest["open_time_ms"]),
+                                    trace_id=trace_id,
+                                )
+                                append_order_event(
+                                    db, trace_id=trace_id, service=SERVICE, exchange=exchange, symbol=symbol,
+                                    client_order_id=client_order_id, exchange_order_id=None, event_type=OrderEventType.CREATED,
+                                    side=Side.SELL.value, qty=base_qty, price=None, status="CREATED",
+                                    reason_code=ReasonCode.STOP_LOSS,
+                                    reason=f"Hard stop loss: last={last_price} <= stop={stop_price}",
+                                    payload={"last_price": last_price, "stop_price": stop_price}
+                                )
+                                res = ex.place_market_order(symbol=symbol, side="SELL", qty=base_qty, client_order_id=client_order_id)
+                                append_order_event(
+                                    db, trace_id=trace_id, service=SERVICE, exchange=exchange, symbol=symbol,
+                                    client_order_id=client_order_id, exchange_order_id=res.exchange_order_id,
+                                    event_type=_event_type_from_status(res.status),
+                                    side=Side.SELL.value, qty=base_qty, price=res.avg_price, status=res.status,
+                                    reason_code=ReasonCode.STOP_LOSS, reason="Stop loss executed", payload=res.raw or {}
+                                )
+                                meta2 = _parse_json_maybe(pos.get("meta_json") if pos else None)
+                                trade_id2 = _find_open_trade_id(db, symbol, meta2)
+                                save_position(db, symbol, 0.0, None, {"trace_id": trace_id, "note": "stop_loss", "trade_id": trade_id2})
+                                if trade_id2 > 0:
+                                    _close_trade_and_train(
+                                        db,
+                                        settings,
+                                        metrics,
+                                        _load_ai_model(db, settings) if settings.ai_enabled else None,
+                                        trade_id=trade_id2,
+                                        symbol=symbol,
+                                        qty=float(base_qty),
+                                        exit_price=res.avg_price,
+                                        pnl_usdt=res.pnl_usdt,
+                                        close_reason_code=ReasonCode.STOP_LOSS.value,
+                                        close_reason="Hard stop loss triggered",
+                                        trace_id=trace_id,
+                                    )
+                                open_cnt = max(0, open_cnt - 1)
+                                summary_kv = build_trade_summary(
+                                    event="STOP_LOSS",
+                                    trace_id=trace_id,
+                                    exchange=exchange,
+                                    symbol=symbol,
+                                    side="SELL",
+                                    qty=base_qty,
+                                    price=res.avg_price,
+                                    stop_price=stop_price,
+                                    reason_code=ReasonCode.STOP_LOSS,
+                                    reason="Stop loss triggered",
+                                    client_order_id=client_order_id,
+                                    exchange_order_id=res.exchange_order_id,
+                                    extra={"last_price": round(float(last_price), 4), "fee_usdt": res.fee_usdt, "pnl_usdt": res.pnl_usdt},
+                                )
+                                send_trade_alert(
+                                    telegram,
+                                    title="触发止损",
+                                    summary_kv=summary_kv,
+                                    payload={
+                                        "client_order_id": client_order_id,
+                                        "exchange_order_id": res.exchange_order_id,
+                                        "avg_price": res.avg_price,
+                                        "fee_usdt": res.fee_usdt,
+                                        "pnl_usdt": res.pnl_usdt,
+                                        "raw": res.raw or {},
+                                    },
+                                )
+                                log_action(
+                                    logger,
+                                    "STOP_LOSS",
+                                    trace_id=trace_id,
+                                    exchange=exchange,
+                                    symbol=symbol,
+                                    side="SELL",
+                                    qty=base_qty,
+                                    price=res.avg_price,
+                                    stop_price=stop_price,
+                                    client_order_id=client_order_id,
+                                    exchange_order_id=res.exchange_order_id,
+                                    reason_code=ReasonCode.STOP_LOSS.value,
+                                    reason="Stop loss triggered",
+                                    pnl_usdt=res.pnl_usdt,
+                                )
+                                metrics.orders_total.labels(SERVICE, settings.exchange, symbol, "STOP_LOSS").inc()
+                                continue
+
+                        sig = setup_b_signal(latest)
+                        if sig == "BUY" and base_qty <= 0:
+                            # 多币对选币开仓：仅允许本轮被 AI 选中的币对执行开仓
+                            if symbol not in selected_open_symbols:
+                                continue
+                            # 全局最多 3 单（跨交易对）
+                            if open_cnt >= int(settings.max_concurrent_positions):
+                                continue
+
+                            # 动态杠杆：10~20 倍（由机器人评分决定）
+                            meta_open = selected_open_meta.get(symbol, {})
+                            score = float(meta_open.get("robot_score") or compute_robot_score(latest, signal="BUY"))
+                            ai_prob = meta_open.get("ai_prob")
+                            combined_score = float(meta_open.get("combined_score") or score)
+                            feat_bundle = meta_open.get("features_bundle") or {}
+                            lev = leverage_from_score(settings, score)
+                            # V8.3 risk budget hard-constraint
+                            equity_usdt = get_equity_usdt_cached(ex, settings, tick_cache)
+                            ai_score = float(ai_prob * 100.0) if ai_prob is not None else 50.0
+                            base_margin_usdt = compute_base_margin_usdt(equity_usdt=equity_usdt, ai_score=ai_score, settings=settings)
+                            ok_risk, lev2, risk_note = enforce_risk_budget(
+                                equity_usdt=equity_usdt,
+                                base_margin_usdt=base_margin_usdt,
+                                leverage=int(lev),
+                                stop_dist_pct=float(settings.hard_stop_loss_pct),
+                                settings=settings,
+                            )
+                            if not ok_risk:
+                                append_order_event(
+                                    db,
+                                    trace_id=trace_id,
+                                    service=SERVICE,
+                                    exchange=exchange,
+                                    symbol=symbol,
+                                    client_order_id=None,
+                                    exchange_order_id=None,
+                                    event_type=OrderEventType.REJECTED,
+                                    side=Side.BUY.value,
+                                    qty=0.0,
+                                    price=None,
+                                    status="REJECTED",
+                                    reason_code=ReasonCode.RISK_BUDGET_REJECT.value,
+                                    reason=risk_note,
+                                    payload={"equity_usdt": equity_usdt, "base_margin_usdt": base_margin_usdt, "stop_dist_pct": float(settings.hard_stop_loss_pct), "ai_score": ai_score},
+                                )
+
+                            log_action(logger, "RISK_BUDGET_REJECT", trace_id=trace_id, symbol=symbol,
+                                       reason_code=ReasonCode.RISK_BUDGET_REJECT.value, reason=risk_note,
+                                       ai_score=ai_score, leverage=lev, stop_dist_pct=stop_dist_pct,
+                                       client_order_id=client_order_id)
+                            summary_kv = build_trade_summary(
+                                event="RISK_REJECT",
+                                trace_id=trace_id,
+                                exchange=exchange,
+                                symbol=symbol,
+                                side="BUY",
+                                leverage=lev,
+                                ai_score=ai_score,
+                                stop_dist_pct=stop_dist_pct,
+                                reason_code=ReasonCode.RISK_BUDGET_REJECT,
+                                reason=risk_note,
+                                client_order_id=client_order_id,
+                            )
+                            send_trade_alert(telegram, title="开仓被风控拒绝", summary_kv=summary_kv, payload={"note": risk_note})
+                            continue
+                            if int(lev2) != int(lev):
+                                lev = int(lev2)
+                                append_order_event(
+                                    db,
+                                    trace_id=trace_id,
+                                    service=SERVICE,
+                                    exchange=exchange,
+                                    symbol=symbol,
+                                    client_order_id=None,
+                                    exchange_order_id=None,
+                                    event_type=OrderEventType.CREATED,
+                                    side=Side.BUY.value,
+                                    qty=0.0,
+                                    price=None,
+                                    status="ADJUST",
+                                    reason_code=ReasonCode.RISK_BUDGET_ADJUST_LEVERAGE.value,
+                                    reason=risk_note,
+                                    payload={"equity_usdt": equity_usdt, "base_margin_usdt": base_margin_usdt, "stop_dist_pct": float(settings.hard_stop_loss_pct), "ai_score": ai_score},
+                                )
+
+                            log_action(logger, "RISK_BUDGET_ADJUST", trace_id=trace_id, symbol=symbol,
+                                       reason_code=ReasonCode.RISK_BUDGET_ADJUST_LEVERAGE.value, reason=risk_note,
+                                       ai_score=ai_score, leverage_before=lev, leverage_after=lev2,
+                                       stop_dist_pct=stop_dist_pct, client_order_id=client_order_id)
+
+
+                            # 你要求的口径：MIN_ORDER_USDT 是“实际保证金(USDT)”，而不是名义仓位。
+                            # 名义价值(notional) ≈ 价格 * qty ≈ 保证金 * 杠杆。
+                            # 因此最小下单 qty 需要按 notional_min = min_margin * leverage 反推。
+                            qty = min_qty_from_min_margin_usdt(settings.min_order_usdt, last_price, lev, precision=6)
+                            if qty <= 0:
+                                continue
+
+                            # 设置逐仓杠杆（Bybit / Binance 合约）
+                            if hasattr(ex, "set_leverage_and_margin_mode"):
+                                ex.set_leverage_and_margin_mode(symbol=symbol, leverage=lev)
+
+                            client_order_id = make_client_order_id(
+                                "buy",
+                                symbol,
+                                interval_minutes=settings.interval_minutes,
+                                kline_open_time_ms=int(latest["open_time_ms"]),
+                                trace_id=trace_id,
+                            )
+
+                            # V8.3 Setup B decision (needs prev cache for squeeze/mom flip)
+                            ai_score = float(ai_prob * 100.0) if ai_prob is not None else 50.0
+                            should_buy, open_reason_code, open_reason = setup_b_decision(
+                                latest,
+                                prev,
+                                ai_score=ai_score,
+                                settings=settings,
+                                explain=False,
+                            )
+                            if not should_buy:
+                                continue
+
+                            stop_dist_pct = float(settings.hard_stop_loss_pct)
+
+                            stop_price_init = float(last_price) * (1.0 - stop_dist_pct)
+                            open_reason = f"Setup B BUY; robot={round(float(score),2)}; ai_prob={round(float(ai_prob),4) if ai_prob is not None else None}; combined={round(float(combined_score),2)}"
+
+                            trade_id = _open_trade_log(
+                                db,
+                                trace_id=trace_id,
+                                symbol=symbol,
+                                qty=float(qty),
+                                actor=SERVICE,
+                                leverage=int(lev),
+                                stop_dist_pct=float(stop_dist_pct),
+                                stop_price=float(stop_price_init),
+                                client_order_id=client_order_id,
+                                robot_score=float(score),
+                                ai_prob=float(ai_prob) if ai_prob is not None else None,
+                                open_reason_code=open_reason_code.value,
+                                open_reason=open_reason,
+                                features_bundle=feat_bundle if isinstance(feat_bundle, dict) else {},
+                            )
+                            metrics.trades_open_total.labels(SERVICE, symbol).inc()
+
+                            append_order_event(
+                                db, trace_id=trace_id, service=SERVICE, exchange=exchange, symbol=symbol,
+                                client_order_id=client_order_id, exchange_order_id=None, event_type=OrderEventType.CREATED,
+                                side=Side.BUY.value, qty=qty, price=None, status="CREATED",
+                                reason_code=open_reason_code,
+                                reason=open_reason,
+                                payload={
+                                    "latest": latest,
+                                    "robot_score": score,
+                                    "ai_prob": ai_prob,
+                                    "combined_score": combined_score,
+                                    "trade_id": trade_id,
+                                    "stop_dist_pct": stop_dist_pct,
+                                    "stop_price": stop_price_init,
+                                    "leverage": lev,
+                                    "min_margin_usdt": settings.min_order_usdt,
+                                    "notional_min_usdt": round(float(settings.min_order_usdt) * float(lev), 4),
+                                    "qty": qty,
+                                    "last_price": last_price,
+                                }
+                            )
+                            # Telegram：下单已提交（避免只在成交后才告警，导致不知道是否已经挂/成交）
+                            summary_kv = build_trade_summary(
+                                event="BUY_SUBMITTED",
+                                trace_id=trace_id,
+                                exchange=exchange,
+                                symbol=symbol,
+                                side="BUY",
+                                qty=qty,
+                                price=last_price,
+                                leverage=lev,
+                                ai_score=ai_score,
+                                stop_price=stop_price_init,
+                                stop_dist_pct=stop_dist_pct,
+                                reason_code=open_reason_code,
+                                reason=open_reason,
+                                client_order_id=client_order_id,
                                 status="SUBMITTING",
+                                extra={"trade_id": trade_id},
                             )
                             send_trade_alert(
                                 telegram,
-                                title="止损下单已提交",
+                                title="开仓下单已提交",
                                 summary_kv=summary_kv,
                                 payload={
                                     "client_order_id": client_order_id,
                                     "symbol": symbol,
-                                    "side": "SELL",
-                                    "qty": float(base_qty),
+                                    "side": "BUY",
+                                    "qty": float(qty),
                                     "last_price": float(last_price),
-                                    "stop_price": float(stop_price),
+                                    "expected_stop_price": float(stop_price_init),
+                                    "leverage": int(lev),
+                                    "reason_code": open_reason_code.value if hasattr(open_reason_code, "value") else str(open_reason_code),
+                                    "reason": open_reason,
                                 },
                             )
-                            res = ex.place_market_order(symbol=symbol, side="SELL", qty=base_qty, client_order_id=client_order_id)
+                            res = ex.place_market_order(symbol=symbol, side="BUY", qty=qty, client_order_id=client_order_id)
                             append_order_event(
                                 db, trace_id=trace_id, service=SERVICE, exchange=exchange, symbol=symbol,
                                 client_order_id=client_order_id, exchange_order_id=res.exchange_order_id,
                                 event_type=_event_type_from_status(res.status),
-                                side=Side.SELL.value, qty=base_qty, price=res.avg_price, status=res.status,
-                                reason_code=ReasonCode.EMERGENCY_EXIT, reason="Emergency exit executed", payload=res.raw or {}
+                                side=Side.BUY.value, qty=qty, price=res.avg_price, status=res.status,
+                                reason_code=open_reason_code, reason=open_reason, payload={"exchange": res.raw or {}, "open_reason": open_reason, "open_reason_code": open_reason_code.value}
+
                             )
-                            meta2 = _parse_json_maybe(pos.get("meta_json") if pos else None)
-                            trade_id2 = _find_open_trade_id(db, symbol, meta2)
-                            save_position(db, symbol, 0.0, None, {"trace_id": trace_id, "note": "emergency_exit", "trade_id": trade_id2})
-                            if trade_id2 > 0:
-                                _close_trade_and_train(
-                                    db,
-                                    settings,
-                                    metrics,
-                                    _load_ai_model(db, settings) if settings.ai_enabled else None,
-                                    trade_id=trade_id2,
+                            entry_price = res.avg_price if res.avg_price is not None else last_price
+                            stop_price_final = float(entry_price) * (1.0 - float(stop_dist_pct))
+                            _update_trade_after_entry_fill(
+                                db,
+                                trade_id=int(trade_id),
+                                entry_price=float(entry_price) if entry_price is not None else None,
+                                exchange_order_id=res.exchange_order_id,
+                                stop_price=float(stop_price_final),
+                            )
+                            stop_client_order_id = None
+                            stop_exchange_order_id = None
+                            if runtime_cfg.use_protective_stop_order and settings.exchange != "paper":
+                                stop_client_order_id, stop_exchange_order_id = _arm_protective_stop_with_retry(
+                                    exchange=ex,
+                                    db=db,
+                                    metrics=metrics,
+                                    telegram=telegram,
+                                    settings=settings,
+                                    runtime_cfg=runtime_cfg,
                                     symbol=symbol,
-                                    qty=float(base_qty),
-                                    exit_price=res.avg_price,
-                                    pnl_usdt=res.pnl_usdt,
-                                    close_reason_code=ReasonCode.EMERGENCY_EXIT.value,
-                                    close_reason="Emergency exit executed",
+                                    qty=float(qty),
+                                    stop_price=float(stop_price_final),
                                     trace_id=trace_id,
+                                    trade_id=int(trade_id),
+                                    base_open_client_order_id=client_order_id,
+                                    action="ARM",
+                                    seq=1,
                                 )
-                            open_cnt = max(0, open_cnt - 1)
-                            send_system_alert(
+                            meta_enter = {
+                                "trace_id": trace_id,
+                                "note": "entered",
+                                "robot_score": float(score),
+                                "leverage": int(lev),
+                                "trade_id": int(trade_id),
+                                "open_client_order_id": client_order_id,
+                                "entry_client_order_id": client_order_id,
+                                "stop_dist_pct": float(stop_dist_pct),
+                                "stop_price": float(stop_price_final),
+                                "stop_client_order_id": stop_client_order_id,
+                                "stop_exchange_order_id": stop_exchange_order_id,
+                            }
+                            save_position(db, symbol, float(qty), float(entry_price), meta_enter)
+                            open_cnt += 1
+
+                            summary_kv = build_trade_summary(
+                                event="BUY_FILLED",
+                                trace_id=trace_id,
+                                exchange=exchange,
+                                symbol=symbol,
+                                side="BUY",
+                                qty=qty,
+                                price=entry_price,
+                                leverage=lev,
+                                ai_score=ai_score,
+                                stop_price=stop_price_final,
+                                stop_dist_pct=stop_dist_pct,
+                                reason_code=open_reason_code,
+                                reason=open_reason,
+                                client_order_id=client_order_id,
+                                exchange_order_id=res.exchange_order_id,
+                                stop_client_order_id=stop_client_order_id,
+                                stop_exchange_order_id=stop_exchange_order_id,
+                            )
+                            send_trade_alert(
                                 telegram,
-                                title="紧急退出已执行",
-                                summary_kv=build_system_summary(
-                                    event="EMERGENCY_EXIT_EXECUTED",
-                                    trace_id=trace_id,
-                                    exchange=exchange,
-                                    level="INFO",
-                                    extra={
-                                        "symbol": symbol,
-                                        "side": "SELL",
-                                        "qty": base_qty,
-                                        "price": res.avg_price,
-                                        "fee_usdt": res.fee_usdt,
-                                        "pnl_usdt": res.pnl_usdt,
-                                    },
-                                ),
+                                title="开仓成交",
+                                summary_kv=summary_kv,
                                 payload={
                                     "client_order_id": client_order_id,
                                     "exchange_order_id": res.exchange_order_id,
                                     "avg_price": res.avg_price,
                                     "fee_usdt": res.fee_usdt,
                                     "pnl_usdt": res.pnl_usdt,
+                                    "robot_score": score,
+                                    "leverage": lev,
+                                    "reason_code": open_reason_code.value if hasattr(open_reason_code, 'value') else str(open_reason_code),
+                                    "reason": open_reason,
+                                    "raw": res.raw or {},
                                 },
                             )
+                            log_action(
+                                logger,
+                                "BUY_FILLED",
+                                trace_id=trace_id,
+                                exchange=exchange,
+                                symbol=symbol,
+                                side="BUY",
+                                qty=qty,
+                                price=entry_price,
+                                leverage=lev,
+                                ai_score=ai_score,
+                                stop_price=stop_price_final,
+                                stop_dist_pct=stop_dist_pct,
+                                client_order_id=client_order_id,
+                                exchange_order_id=res.exchange_order_id,
+                                reason_code=open_reason_code.value if hasattr(open_reason_code, 'value') else str(open_reason_code),
+                                reason=open_reason,
+                            )
+                            metrics.orders_total.labels(SERVICE, settings.exchange, symbol, "BUY").inc()
+
+                        elif sig == "SELL" and base_qty > 0:
+                            meta = _parse_json_maybe(pos.get('meta_json') if pos else None)
+                            meta["base_qty"] = float(base_qty)
+                            if runtime_cfg.use_protective_stop_order and settings.exchange != "paper" and meta.get("stop_client_order_id"):
+                                _cancel_protective_stop(exchange=ex, db=db, symbol=symbol, trace_id=trace_id, meta=meta)
+                            qty = base_qty
+                            score = compute_robot_score(latest, signal="SELL")
+                            lev = leverage_from_score(settings, score)
+                            # V8.3 risk budget hard-constraint
+                            equity_usdt = get_equity_usdt_cached(ex, settings, tick_cache)
+                            ai_score = float(ai_prob * 100.0) if ai_prob is not None else 50.0
+                            base_margin_usdt = compute_base_margin_usdt(equity_usdt=equity_usdt, ai_score=ai_score, settings=settings)
+                            ok_risk, lev2, risk_note = enforce_risk_budget(
+                                equity_usdt=equity_usdt,
+                                base_margin_usdt=base_margin_usdt,
+                                leverage=int(lev),
+                                stop_dist_pct=float(settings.hard_stop_loss_pct),
+                                settings=settings,
+                            )
+                            if not ok_risk:
+                                append_order_event(
+                                    db,
+                                    trace_id=trace_id,
+                                    service=SERVICE,
+                                    exchange=exchange,
+                                    symbol=symbol,
+                                    client_order_id=None,
+                                    exchange_order_id=None,
+                                    event_type=OrderEventType.REJECTED,
+                                    side=Side.BUY.value,
+                                    qty=0.0,
+                                    price=None,
+                                    status="REJECTED",
+                                    reason_code=ReasonCode.RISK_BUDGET_REJECT.value,
+                                    reason=risk_note,
+                                    payload={"equity_usdt": equity_usdt, "base_margin_usdt": base_margin_usdt, "stop_dist_pct": float(settings.hard_stop_loss_pct), "ai_score": ai_score},
+                                )
+
+                            log_action(logger, "RISK_BUDGET_REJECT", trace_id=trace_id, symbol=symbol,
+                                       reason_code=ReasonCode.RISK_BUDGET_REJECT.value, reason=risk_note,
+                                       ai_score=ai_score, leverage=lev, stop_dist_pct=stop_dist_pct,
+                                       client_order_id=client_order_id)
+                            summary_kv = build_trade_summary(
+                                event="RISK_REJECT",
+                                trace_id=trace_id,
+                                exchange=exchange,
+                                symbol=symbol,
+                                side="BUY",
+                                leverage=lev,
+                                ai_score=ai_score,
+                                stop_dist_pct=stop_dist_pct,
+                                reason_code=ReasonCode.RISK_BUDGET_REJECT,
+                                reason=risk_note,
+                                client_order_id=client_order_id,
+                            )
+                            send_trade_alert(telegram, title="开仓被风控拒绝", summary_kv=summary_kv, payload={"note": risk_note})
+                            continue
+                            if int(lev2) != int(lev):
+                                lev = int(lev2)
+                                append_order_event(
+                                    db,
+                                    trace_id=trace_id,
+                                    service=SERVICE,
+                                    exchange=exchange,
+                                    symbol=symbol,
+                                    client_order_id=None,
+                                    exchange_order_id=None,
+                                    event_type=OrderEventType.CREATED,
+                                    side=Side.BUY.value,
+                                    qty=0.0,
+                                    price=None,
+                                    status="ADJUST",
+                                    reason_code=ReasonCode.RISK_BUDGET_ADJUST_LEVERAGE.value,
+                                    reason=risk_note,
+                                    payload={"equity_usdt": equity_usdt, "base_margin_usdt": base_margin_usdt, "stop_dist_pct": float(settings.hard_stop_loss_pct), "ai_score": ai_score},
+                                )
 
-                        # 当所有币对都检查完后再清掉 EMERGENCY_EXIT
-                        continue
+                            log_action(logger, "RISK_BUDGET_ADJUST", trace_id=trace_id, symbol=symbol,
+                                       reason_code=ReasonCode.RISK_BUDGET_ADJUST_LEVERAGE.value, reason=risk_note,
+                                       ai_score=ai_score, leverage_before=lev, leverage_after=lev2,
+                                       stop_dist_pct=stop_dist_pct, client_order_id=client_order_id)
+
+                            if hasattr(ex, "set_leverage_and_margin_mode"):
+                                ex.set_leverage_and_margin_mode(symbol=symbol, leverage=lev)
 
-                    # --- 硬止损（逐仓合约） ---
-                    if base_qty > 0 and avg_entry is not None:
-                        meta = _parse_json_maybe(pos.get('meta_json') if pos else None)
-                        stop_dist_pct = float(meta.get('stop_dist_pct') or settings.hard_stop_loss_pct)
-                        stop_price = float(meta.get('stop_price') or (avg_entry * (1.0 - stop_dist_pct)))
-                        if last_price <= stop_price and not (runtime_cfg.use_protective_stop_order and settings.exchange != "paper" and meta.get('stop_client_order_id')):
                             client_order_id = make_client_order_id(
-                                "sl",
+                                "sell",
                                 symbol,
                                 interval_minutes=settings.interval_minutes,
                                 kline_open_time_ms=int(latest["open_time_ms"]),
@@ -2031,22 +2539,54 @@ def main():
                             append_order_event(
                                 db, trace_id=trace_id, service=SERVICE, exchange=exchange, symbol=symbol,
                                 client_order_id=client_order_id, exchange_order_id=None, event_type=OrderEventType.CREATED,
-                                side=Side.SELL.value, qty=base_qty, price=None, status="CREATED",
-                                reason_code=ReasonCode.STOP_LOSS,
-                                reason=f"Hard stop loss: last={last_price} <= stop={stop_price}",
-                                payload={"last_price": last_price, "stop_price": stop_price}
+                                side=Side.SELL.value, qty=qty, price=None, status="CREATED",
+                                reason_code=ReasonCode.STRATEGY_SIGNAL,
+                                reason="Setup B SELL",
+                                payload={"latest": latest, "robot_score": score, "leverage": lev}
+                            )
+                            summary_kv = build_trade_summary(
+                                event="SELL_SUBMITTED",
+                                trace_id=trace_id,
+                                exchange=exchange,
+                                symbol=symbol,
+                                side="SELL",
+                                qty=qty,
+                                price=last_price,
+                                leverage=lev,
+                                reason_code=ReasonCode.STRATEGY_EXIT,
+                                reason="Setup B SELL",
+                                client_order_id=client_order_id,
+                                status="SUBMITTING",
                             )
-                            res = ex.place_market_order(symbol=symbol, side="SELL", qty=base_qty, client_order_id=client_order_id)
+                            send_trade_alert(
+                                telegram,
+                                title="平仓下单已提交",
+                                summary_kv=summary_kv,
+                                payload={
+                                    "client_order_id": client_order_id,
+                                    "symbol": symbol,
+                                    "side": "SELL",
+                                    "qty": float(qty),
+                                    "last_price": float(last_price),
+                                    "leverage": int(lev),
+                                    "reason_code": ReasonCode.STRATEGY_EXIT.value,
+                                    "reason": "Setup B SELL",
+                                },
+                            )
+                            res = ex.place_market_order(symbol=symbol, side="SELL", qty=qty, client_order_id=client_order_id)
                             append_order_event(
                                 db, trace_id=trace_id, service=SERVICE, exchange=exchange, symbol=symbol,
                                 client_order_id=client_order_id, exchange_order_id=res.exchange_order_id,
                                 event_type=_event_type_from_status(res.status),
-                                side=Side.SELL.value, qty=base_qty, price=res.avg_price, status=res.status,
-                                reason_code=ReasonCode.STOP_LOSS, reason="Stop loss executed", payload=res.raw or {}
+                                side=Side.SELL.value, qty=qty, price=res.avg_price, status=res.status,
+                                reason_code=open_reason_code, reason=open_reason, payload={"exchange": res.raw or {}, "open_reason": open_reason, "open_reason_code": open_reason_code.value}
                             )
                             meta2 = _parse_json_maybe(pos.get("meta_json") if pos else None)
                             trade_id2 = _find_open_trade_id(db, symbol, meta2)
-                            save_position(db, symbol, 0.0, None, {"trace_id": trace_id, "note": "stop_loss", "trade_id": trade_id2})
+                            save_position(db, symbol, 0.0, None, {"trace_id": trace_id, "note": "exited", "trade_id": trade_id2, "robot_score": score, "leverage": lev})
+                            close_code = ReasonCode.STRATEGY_EXIT.value
+                            if settings.take_profit_reason_on_positive_pnl and (res.pnl_usdt is not None and float(res.pnl_usdt) > 0):
+                                close_code = ReasonCode.TAKE_PROFIT.value
                             if trade_id2 > 0:
                                 _close_trade_and_train(
                                     db,
@@ -2055,32 +2595,33 @@ def main():
                                     _load_ai_model(db, settings) if settings.ai_enabled else None,
                                     trade_id=trade_id2,
                                     symbol=symbol,
-                                    qty=float(base_qty),
+                                    qty=float(qty),
                                     exit_price=res.avg_price,
                                     pnl_usdt=res.pnl_usdt,
-                                    close_reason_code=ReasonCode.STOP_LOSS.value,
-                                    close_reason="Hard stop loss triggered",
+                                    close_reason_code=close_code,
+                                    close_reason="Setup B SELL",
                                     trace_id=trace_id,
                                 )
                             open_cnt = max(0, open_cnt - 1)
+
                             summary_kv = build_trade_summary(
-                                event="STOP_LOSS",
+                                event="SELL_FILLED",
                                 trace_id=trace_id,
                                 exchange=exchange,
                                 symbol=symbol,
                                 side="SELL",
-                                qty=base_qty,
+                                qty=qty,
                                 price=res.avg_price,
-                                stop_price=stop_price,
-                                reason_code=ReasonCode.STOP_LOSS,
-                                reason="Stop loss triggered",
+                                leverage=lev,
+                                reason_code=close_code,
+                                reason="Setup B SELL",
                                 client_order_id=client_order_id,
                                 exchange_order_id=res.exchange_order_id,
-                                extra={"last_price": round(float(last_price), 4), "fee_usdt": res.fee_usdt, "pnl_usdt": res.pnl_usdt},
+                                extra={"robot_score": round(float(score), 2), "fee_usdt": res.fee_usdt, "pnl_usdt": res.pnl_usdt},
                             )
                             send_trade_alert(
                                 telegram,
-                                title="触发止损",
+                                title="平仓成交",
                                 summary_kv=summary_kv,
                                 payload={
                                     "client_order_id": client_order_id,
@@ -2088,629 +2629,113 @@ def main():
                                     "avg_price": res.avg_price,
                                     "fee_usdt": res.fee_usdt,
                                     "pnl_usdt": res.pnl_usdt,
+                                    "robot_score": score,
+                                    "leverage": lev,
                                     "raw": res.raw or {},
                                 },
                             )
                             log_action(
                                 logger,
-                                "STOP_LOSS",
+                                "SELL_FILLED",
                                 trace_id=trace_id,
                                 exchange=exchange,
                                 symbol=symbol,
                                 side="SELL",
-                                qty=base_qty,
+                                qty=qty,
                                 price=res.avg_price,
-                                stop_price=stop_price,
+                                leverage=lev,
                                 client_order_id=client_order_id,
                                 exchange_order_id=res.exchange_order_id,
-                                reason_code=ReasonCode.STOP_LOSS.value,
-                                reason="Stop loss triggered",
+                                reason_code=close_code,
+                                reason="Setup B SELL",
                                 pnl_usdt=res.pnl_usdt,
                             )
-                            metrics.orders_total.labels(SERVICE, settings.exchange, symbol, "STOP_LOSS").inc()
-                            continue
-
-                    sig = setup_b_signal(latest)
-                    if sig == "BUY" and base_qty <= 0:
-                        # 多币对选币开仓：仅允许本轮被 AI 选中的币对执行开仓
-                        if symbol not in selected_open_symbols:
-                            continue
-                        # 全局最多 3 单（跨交易对）
-                        if open_cnt >= int(settings.max_concurrent_positions):
-                            continue
-
-                        # 动态杠杆：10~20 倍（由机器人评分决定）
-                        meta_open = selected_open_meta.get(symbol, {})
-                        score = float(meta_open.get("robot_score") or compute_robot_score(latest, signal="BUY"))
-                        ai_prob = meta_open.get("ai_prob")
-                        combined_score = float(meta_open.get("combined_score") or score)
-                        feat_bundle = meta_open.get("features_bundle") or {}
-                        lev = leverage_from_score(settings, score)
-                        # V8.3 risk budget hard-constraint
-                        equity_usdt = get_equity_usdt(ex, settings)
-                        ai_score = float(ai_prob * 100.0) if ai_prob is not None else 50.0
-                        base_margin_usdt = compute_base_margin_usdt(equity_usdt=equity_usdt, ai_score=ai_score, settings=settings)
-                        ok_risk, lev2, risk_note = enforce_risk_budget(
-                            equity_usdt=equity_usdt,
-                            base_margin_usdt=base_margin_usdt,
-                            leverage=int(lev),
-                            stop_dist_pct=float(settings.hard_stop_loss_pct),
-                            settings=settings,
-                        )
-                        if not ok_risk:
-                            append_order_event(
-                                db,
-                                trace_id=trace_id,
-                                service=SERVICE,
-                                exchange=exchange,
-                                symbol=symbol,
-                                client_order_id=None,
-                                exchange_order_id=None,
-                                event_type=OrderEventType.REJECTED,
-                                side=Side.BUY.value,
-                                qty=0.0,
-                                price=None,
-                                status="REJECTED",
-                                reason_code=ReasonCode.RISK_BUDGET_REJECT.value,
-                                reason=risk_note,
-                                payload={"equity_usdt": equity_usdt, "base_margin_usdt": base_margin_usdt, "stop_dist_pct": float(settings.hard_stop_loss_pct), "ai_score": ai_score},
-                            )
-
-                        log_action(logger, "RISK_BUDGET_REJECT", trace_id=trace_id, symbol=symbol,
-                                   reason_code=ReasonCode.RISK_BUDGET_REJECT.value, reason=risk_note,
-                                   ai_score=ai_score, leverage=lev, stop_dist_pct=stop_dist_pct,
-                                   client_order_id=client_order_id)
-                        summary_kv = build_trade_summary(
-                            event="RISK_REJECT",
-                            trace_id=trace_id,
-                            exchange=exchange,
-                            symbol=symbol,
-                            side="BUY",
-                            leverage=lev,
-                            ai_score=ai_score,
-                            stop_dist_pct=stop_dist_pct,
-                            reason_code=ReasonCode.RISK_BUDGET_REJECT,
-                            reason=risk_note,
-                            client_order_id=client_order_id,
-                        )
-                        send_trade_alert(telegram, title="开仓被风控拒绝", summary_kv=summary_kv, payload={"note": risk_note})
-                        continue
-                        if int(lev2) != int(lev):
-                            lev = int(lev2)
-                            append_order_event(
-                                db,
-                                trace_id=trace_id,
-                                service=SERVICE,
-                                exchange=exchange,
-                                symbol=symbol,
-                                client_order_id=None,
-                                exchange_order_id=None,
-                                event_type=OrderEventType.CREATED,
-                                side=Side.BUY.value,
-                                qty=0.0,
-                                price=None,
-                                status="ADJUST",
-                                reason_code=ReasonCode.RISK_BUDGET_ADJUST_LEVERAGE.value,
-                                reason=risk_note,
-                                payload={"equity_usdt": equity_usdt, "base_margin_usdt": base_margin_usdt, "stop_dist_pct": float(settings.hard_stop_loss_pct), "ai_score": ai_score},
-                            )
+                            metrics.orders_total.labels(SERVICE, settings.exchange, symbol, "SELL").inc()
 
-                        log_action(logger, "RISK_BUDGET_ADJUST", trace_id=trace_id, symbol=symbol,
-                                   reason_code=ReasonCode.RISK_BUDGET_ADJUST_LEVERAGE.value, reason=risk_note,
-                                   ai_score=ai_score, leverage_before=lev, leverage_after=lev2,
-                                   stop_dist_pct=stop_dist_pct, client_order_id=client_order_id)
-
-
-                        # 你要求的口径：MIN_ORDER_USDT 是“实际保证金(USDT)”，而不是名义仓位。
-                        # 名义价值(notional) ≈ 价格 * qty ≈ 保证金 * 杠杆。
-                        # 因此最小下单 qty 需要按 notional_min = min_margin * leverage 反推。
-                        qty = min_qty_from_min_margin_usdt(settings.min_order_usdt, last_price, lev, precision=6)
-                        if qty <= 0:
-                            continue
+                        metrics.last_tick_success.labels(SERVICE, symbol).set(1)
 
-                        # 设置逐仓杠杆（Bybit / Binance 合约）
-                        if hasattr(ex, "set_leverage_and_margin_mode"):
-                            ex.set_leverage_and_margin_mode(symbol=symbol, leverage=lev)
+                # 如果触发紧急退出：在本轮处理完所有 symbol 之后清掉开关
+                if get_flag(db, "EMERGENCY_EXIT", "false") == "true":
+                    set_flag(db, "EMERGENCY_EXIT", "false")
 
-                        client_order_id = make_client_order_id(
-                            "buy",
-                            symbol,
-                            interval_minutes=settings.interval_minutes,
-                            kline_open_time_ms=int(latest["open_time_ms"]),
-                            trace_id=trace_id,
-                        )
-
-                        # V8.3 Setup B decision (needs prev cache for squeeze/mom flip)
-                        ai_score = float(ai_prob * 100.0) if ai_prob is not None else 50.0
-                        should_buy, open_reason_code, open_reason = setup_b_decision(
-                            latest,
-                            prev,
-                            ai_score=ai_score,
-                            settings=settings,
-                        )
-                        if not should_buy:
-                            continue
-
-                        stop_dist_pct = float(settings.hard_stop_loss_pct)
-
-                        stop_price_init = float(last_price) * (1.0 - stop_dist_pct)
-                        open_reason = f"Setup B BUY; robot={round(float(score),2)}; ai_prob={round(float(ai_prob),4) if ai_prob is not None else None}; combined={round(float(combined_score),2)}"
-
-                        trade_id = _open_trade_log(
-                            db,
-                            trace_id=trace_id,
-                            symbol=symbol,
-                            qty=float(qty),
-                            actor=SERVICE,
-                            leverage=int(lev),
-                            stop_dist_pct=float(stop_dist_pct),
-                            stop_price=float(stop_price_init),
-                            client_order_id=client_order_id,
-                            robot_score=float(score),
-                            ai_prob=float(ai_prob) if ai_prob is not None else None,
-                            open_reason_code=open_reason_code.value,
-                            open_reason=open_reason,
-                            features_bundle=feat_bundle if isinstance(feat_bundle, dict) else {},
-                        )
-                        metrics.trades_open_total.labels(SERVICE, symbol).inc()
-
-                        append_order_event(
-                            db, trace_id=trace_id, service=SERVICE, exchange=exchange, symbol=symbol,
-                            client_order_id=client_order_id, exchange_order_id=None, event_type=OrderEventType.CREATED,
-                            side=Side.BUY.value, qty=qty, price=None, status="CREATED",
-                            reason_code=open_reason_code,
-                            reason=open_reason,
-                            payload={
-                                "latest": latest,
-                                "robot_score": score,
-                                "ai_prob": ai_prob,
-                                "combined_score": combined_score,
-                                "trade_id": trade_id,
-                                "stop_dist_pct": stop_dist_pct,
-                                "stop_price": stop_price_init,
-                                "leverage": lev,
-                                "min_margin_usdt": settings.min_order_usdt,
-                                "notional_min_usdt": round(float(settings.min_order_usdt) * float(lev), 4),
-                                "qty": qty,
-                                "last_price": last_price,
-                            }
-                        )
-                        # Telegram：下单已提交（避免只在成交后才告警，导致不知道是否已经挂/成交）
-                        summary_kv = build_trade_summary(
-                            event="BUY_SUBMITTED",
-                            trace_id=trace_id,
-                            exchange=exchange,
-                            symbol=symbol,
-                            side="BUY",
-                            qty=qty,
-                            price=last_price,
-                            leverage=lev,
-                            ai_score=ai_score,
-                            stop_price=stop_price_init,
-                            stop_dist_pct=stop_dist_pct,
-                            reason_code=open_reason_code,
-                            reason=open_reason,
-                            client_order_id=client_order_id,
-                            status="SUBMITTING",
-                            extra={"trade_id": trade_id},
-                        )
-                        send_trade_alert(
-                            telegram,
-                            title="开仓下单已提交",
-                            summary_kv=summary_kv,
-                            payload={
-                                "client_order_id": client_order_id,
-                                "symbol": symbol,
-                                "side": "BUY",
-                                "qty": float(qty),
-                                "last_price": float(last_price),
-                                "expected_stop_price": float(stop_price_init),
-                                "leverage": int(lev),
-                                "reason_code": open_reason_code.value if hasattr(open_reason_code, "value") else str(open_reason_code),
-                                "reason": open_reason,
-                            },
-                        )
-                        res = ex.place_market_order(symbol=symbol, side="BUY", qty=qty, client_order_id=client_order_id)
-                        append_order_event(
-                            db, trace_id=trace_id, service=SERVICE, exchange=exchange, symbol=symbol,
-                            client_order_id=client_order_id, exchange_order_id=res.exchange_order_id,
-                            event_type=_event_type_from_status(res.status),
-                            side=Side.BUY.value, qty=qty, price=res.avg_price, status=res.status,
-                            reason_code=open_reason_code, reason=open_reason, payload={"exchange": res.raw or {}, "open_reason": open_reason, "open_reason_code": open_reason_code.value}
-
-                        )
-                        entry_price = res.avg_price if res.avg_price is not None else last_price
-                        stop_price_final = float(entry_price) * (1.0 - float(stop_dist_pct))
-                        _update_trade_after_entry_fill(
-                            db,
-                            trade_id=int(trade_id),
-                            entry_price=float(entry_price) if entry_price is not None else None,
-                            exchange_order_id=res.exchange_order_id,
-                            stop_price=float(stop_price_final),
-                        )
-                        stop_client_order_id = None
-                        stop_exchange_order_id = None
-                        if runtime_cfg.use_protective_stop_order and settings.exchange != "paper":
-                            stop_client_order_id, stop_exchange_order_id = _arm_protective_stop_with_retry(
-                                exchange=ex,
-                                db=db,
-                                metrics=metrics,
-                                telegram=telegram,
-                                settings=settings,
-                                runtime_cfg=runtime_cfg,
-                                symbol=symbol,
-                                qty=float(qty),
-                                stop_price=float(stop_price_final),
-                                trace_id=trace_id,
-                                trade_id=int(trade_id),
-                                base_open_client_order_id=client_order_id,
-                                action="ARM",
-                                seq=1,
-                            )
-                        meta_enter = {
+                # status snapshot for /admin/status
+                try:
+                    upsert_service_status(
+                        db,
+                        service_name=SERVICE,
+                        instance_id=instance_id,
+                        status={
                             "trace_id": trace_id,
-                            "note": "entered",
-                            "robot_score": float(score),
-                            "leverage": int(lev),
-                            "trade_id": int(trade_id),
-                            "open_client_order_id": client_order_id,
-                            "entry_client_order_id": client_order_id,
-                            "stop_dist_pct": float(stop_dist_pct),
-                            "stop_price": float(stop_price_final),
-                            "stop_client_order_id": stop_client_order_id,
-                            "stop_exchange_order_id": stop_exchange_order_id,
-                        }
-                        save_position(db, symbol, float(qty), float(entry_price), meta_enter)
-                        open_cnt += 1
-
-                        summary_kv = build_trade_summary(
-                            event="BUY_FILLED",
-                            trace_id=trace_id,
-                            exchange=exchange,
-                            symbol=symbol,
-                            side="BUY",
-                            qty=qty,
-                            price=entry_price,
-                            leverage=lev,
-                            ai_score=ai_score,
-                            stop_price=stop_price_final,
-                            stop_dist_pct=stop_dist_pct,
-                            reason_code=open_reason_code,
-                            reason=open_reason,
-                            client_order_id=client_order_id,
-                            exchange_order_id=res.exchange_order_id,
-                            stop_client_order_id=stop_client_order_id,
-                            stop_exchange_order_id=stop_exchange_order_id,
-                        )
-                        send_trade_alert(
-                            telegram,
-                            title="开仓成交",
-                            summary_kv=summary_kv,
-                            payload={
-                                "client_order_id": client_order_id,
-                                "exchange_order_id": res.exchange_order_id,
-                                "avg_price": res.avg_price,
-                                "fee_usdt": res.fee_usdt,
-                                "pnl_usdt": res.pnl_usdt,
-                                "robot_score": score,
-                                "leverage": lev,
-                                "reason_code": open_reason_code.value if hasattr(open_reason_code, 'value') else str(open_reason_code),
-                                "reason": open_reason,
-                                "raw": res.raw or {},
-                            },
-                        )
-                        log_action(
-                            logger,
-                            "BUY_FILLED",
-                            trace_id=trace_id,
-                            exchange=exchange,
-                            symbol=symbol,
-                            side="BUY",
-                            qty=qty,
-                            price=entry_price,
-                            leverage=lev,
-                            ai_score=ai_score,
-                            stop_price=stop_price_final,
-                            stop_dist_pct=stop_dist_pct,
-                            client_order_id=client_order_id,
-                            exchange_order_id=res.exchange_order_id,
-                            reason_code=open_reason_code.value if hasattr(open_reason_code, 'value') else str(open_reason_code),
-                            reason=open_reason,
-                        )
-                        metrics.orders_total.labels(SERVICE, settings.exchange, symbol, "BUY").inc()
-
-                    elif sig == "SELL" and base_qty > 0:
-                        meta = _parse_json_maybe(pos.get('meta_json') if pos else None)
-                        meta["base_qty"] = float(base_qty)
-                        if runtime_cfg.use_protective_stop_order and settings.exchange != "paper" and meta.get("stop_client_order_id"):
-                            _cancel_protective_stop(exchange=ex, db=db, symbol=symbol, trace_id=trace_id, meta=meta)
-                        qty = base_qty
-                        score = compute_robot_score(latest, signal="SELL")
-                        lev = leverage_from_score(settings, score)
-                        # V8.3 risk budget hard-constraint
-                        equity_usdt = get_equity_usdt(ex, settings)
-                        ai_score = float(ai_prob * 100.0) if ai_prob is not None else 50.0
-                        base_margin_usdt = compute_base_margin_usdt(equity_usdt=equity_usdt, ai_score=ai_score, settings=settings)
-                        ok_risk, lev2, risk_note = enforce_risk_budget(
-                            equity_usdt=equity_usdt,
-                            base_margin_usdt=base_margin_usdt,
-                            leverage=int(lev),
-                            stop_dist_pct=float(settings.hard_stop_loss_pct),
-                            settings=settings,
-                        )
-                        if not ok_risk:
-                            append_order_event(
-                                db,
-                                trace_id=trace_id,
-                                service=SERVICE,
-                                exchange=exchange,
-                                symbol=symbol,
-                                client_order_id=None,
-                                exchange_order_id=None,
-                                event_type=OrderEventType.REJECTED,
-                                side=Side.BUY.value,
-                                qty=0.0,
-                                price=None,
-                                status="REJECTED",
-                                reason_code=ReasonCode.RISK_BUDGET_REJECT.value,
-                                reason=risk_note,
-                                payload={"equity_usdt": equity_usdt, "base_margin_usdt": base_margin_usdt, "stop_dist_pct": float(settings.hard_stop_loss_pct), "ai_score": ai_score},
-                            )
-
-                        log_action(logger, "RISK_BUDGET_REJECT", trace_id=trace_id, symbol=symbol,
-                                   reason_code=ReasonCode.RISK_BUDGET_REJECT.value, reason=risk_note,
-                                   ai_score=ai_score, leverage=lev, stop_dist_pct=stop_dist_pct,
-                                   client_order_id=client_order_id)
-                        summary_kv = build_trade_summary(
-                            event="RISK_REJECT",
-                            trace_id=trace_id,
-                            exchange=exchange,
-                            symbol=symbol,
-                            side="BUY",
-                            leverage=lev,
-                            ai_score=ai_score,
-                            stop_dist_pct=stop_dist_pct,
-                            reason_code=ReasonCode.RISK_BUDGET_REJECT,
-                            reason=risk_note,
-                            client_order_id=client_order_id,
-                        )
-                        send_trade_alert(telegram, title="开仓被风控拒绝", summary_kv=summary_kv, payload={"note": risk_note})
-                        continue
-                        if int(lev2) != int(lev):
-                            lev = int(lev2)
-                            append_order_event(
-                                db,
-                                trace_id=trace_id,
-                                service=SERVICE,
-                                exchange=exchange,
-                                symbol=symbol,
-                                client_order_id=None,
-                                exchange_order_id=None,
-                                event_type=OrderEventType.CREATED,
-                                side=Side.BUY.value,
-                                qty=0.0,
-                                price=None,
-                                status="ADJUST",
-                                reason_code=ReasonCode.RISK_BUDGET_ADJUST_LEVERAGE.value,
-                                reason=risk_note,
-                                payload={"equity_usdt": equity_usdt, "base_margin_usdt": base_margin_usdt, "stop_dist_pct": float(settings.hard_stop_loss_pct), "ai_score": ai_score},
-                            )
-
-                        log_action(logger, "RISK_BUDGET_ADJUST", trace_id=trace_id, symbol=symbol,
-                                   reason_code=ReasonCode.RISK_BUDGET_ADJUST_LEVERAGE.value, reason=risk_note,
-                                   ai_score=ai_score, leverage_before=lev, leverage_after=lev2,
-                                   stop_dist_pct=stop_dist_pct, client_order_id=client_order_id)
-
-                        if hasattr(ex, "set_leverage_and_margin_mode"):
-                            ex.set_leverage_and_margin_mode(symbol=symbol, leverage=lev)
+                            "last_tick_id": tick_id,
+                            "last_tick_ts_utc": datetime.datetime.utcnow().replace(tzinfo=datetime.timezone.utc).isoformat(),
+                            "last_tick_ts_hk": datetime.datetime.now(HK).isoformat(),
+                            "symbols": getattr(settings, "symbols", []),
+                            "open_positions": open_cnt if "open_cnt" in locals() else None,
+                            "halt": get_flag(db, "HALT_TRADING", "false"),
+                            "emergency": get_flag(db, "EMERGENCY_EXIT", "false"),
+                        },
+                    )
+                except Exception:
+                    pass
 
-                        client_order_id = make_client_order_id(
-                            "sell",
-                            symbol,
-                            interval_minutes=settings.interval_minutes,
-                            kline_open_time_ms=int(latest["open_time_ms"]),
-                            trace_id=trace_id,
-                        )
-                        append_order_event(
-                            db, trace_id=trace_id, service=SERVICE, exchange=exchange, symbol=symbol,
-                            client_order_id=client_order_id, exchange_order_id=None, event_type=OrderEventType.CREATED,
-                            side=Side.SELL.value, qty=qty, price=None, status="CREATED",
-                            reason_code=ReasonCode.STRATEGY_SIGNAL,
-                            reason="Setup B SELL",
-                            payload={"latest": latest, "robot_score": score, "leverage": lev}
-                        )
-                        summary_kv = build_trade_summary(
-                            event="SELL_SUBMITTED",
-                            trace_id=trace_id,
-                            exchange=exchange,
-                            symbol=symbol,
-                            side="SELL",
-                            qty=qty,
-                            price=last_price,
-                            leverage=lev,
-                            reason_code=ReasonCode.STRATEGY_EXIT,
-                            reason="Setup B SELL",
-                            client_order_id=client_order_id,
-                            status="SUBMITTING",
-                        )
-                        send_trade_alert(
+            except RateLimitError as e:
+                sleep_s = e.retry_after_seconds or 2.0
+                # 仅对 severe 的限流发送 Telegram，避免刷屏
+                try:
+                    if getattr(e, "severe", False):
+                        send_system_alert(
                             telegram,
-                            title="平仓下单已提交",
-                            summary_kv=summary_kv,
-                            payload={
-                                "client_order_id": client_order_id,
-                                "symbol": symbol,
-                                "side": "SELL",
-                                "qty": float(qty),
-                                "last_price": float(last_price),
-                                "leverage": int(lev),
-                                "reason_code": ReasonCode.STRATEGY_EXIT.value,
-                                "reason": "Setup B SELL",
-                            },
-                        )
-                        res = ex.place_market_order(symbol=symbol, side="SELL", qty=qty, client_order_id=client_order_id)
-                        append_order_event(
-                            db, trace_id=trace_id, service=SERVICE, exchange=exchange, symbol=symbol,
-                            client_order_id=client_order_id, exchange_order_id=res.exchange_order_id,
-                            event_type=_event_type_from_status(res.status),
-                            side=Side.SELL.value, qty=qty, price=res.avg_price, status=res.status,
-                            reason_code=open_reason_code, reason=open_reason, payload={"exchange": res.raw or {}, "open_reason": open_reason, "open_reason_code": open_reason_code.value}
-                        )
-                        meta2 = _parse_json_maybe(pos.get("meta_json") if pos else None)
-                        trade_id2 = _find_open_trade_id(db, symbol, meta2)
-                        save_position(db, symbol, 0.0, None, {"trace_id": trace_id, "note": "exited", "trade_id": trade_id2, "robot_score": score, "leverage": lev})
-                        close_code = ReasonCode.STRATEGY_EXIT.value
-                        if settings.take_profit_reason_on_positive_pnl and (res.pnl_usdt is not None and float(res.pnl_usdt) > 0):
-                            close_code = ReasonCode.TAKE_PROFIT.value
-                        if trade_id2 > 0:
-                            _close_trade_and_train(
-                                db,
-                                settings,
-                                metrics,
-                                _load_ai_model(db, settings) if settings.ai_enabled else None,
-                                trade_id=trade_id2,
-                                symbol=symbol,
-                                qty=float(qty),
-                                exit_price=res.avg_price,
-                                pnl_usdt=res.pnl_usdt,
-                                close_reason_code=close_code,
-                                close_reason="Setup B SELL",
+                            title="⏳ 限流退避",
+                            summary_kv=build_system_summary(
+                                event="RATE_LIMIT_BACKOFF",
                                 trace_id=trace_id,
-                            )
-                        open_cnt = max(0, open_cnt - 1)
-
-                        summary_kv = build_trade_summary(
-                            event="SELL_FILLED",
-                            trace_id=trace_id,
-                            exchange=exchange,
-                            symbol=symbol,
-                            side="SELL",
-                            qty=qty,
-                            price=res.avg_price,
-                            leverage=lev,
-                            reason_code=close_code,
-                            reason="Setup B SELL",
-                            client_order_id=client_order_id,
-                            exchange_order_id=res.exchange_order_id,
-                            extra={"robot_score": round(float(score), 2), "fee_usdt": res.fee_usdt, "pnl_usdt": res.pnl_usdt},
-                        )
-                        send_trade_alert(
-                            telegram,
-                            title="平仓成交",
-                            summary_kv=summary_kv,
+                                exchange=exchange,
+                                level="WARN",
+                                reason_code=ReasonCode.RATE_LIMIT_429,
+                                reason=f"rate limit backoff {float(sleep_s):.2f}s",
+                                extra={
+                                    "group": getattr(e, "group", None),
+                                    "sleep_s": round(float(sleep_s), 2),
+                                    "severe": bool(getattr(e, "severe", False)),
+                                },
+                            ),
                             payload={
-                                "client_order_id": client_order_id,
-                                "exchange_order_id": res.exchange_order_id,
-                                "avg_price": res.avg_price,
-                                "fee_usdt": res.fee_usdt,
-                                "pnl_usdt": res.pnl_usdt,
-                                "robot_score": score,
-                                "leverage": lev,
-                                "raw": res.raw or {},
-                            },
-                        )
-                        log_action(
-                            logger,
-                            "SELL_FILLED",
-                            trace_id=trace_id,
-                            exchange=exchange,
-                            symbol=symbol,
-                            side="SELL",
-                            qty=qty,
-                            price=res.avg_price,
-                            leverage=lev,
-                            client_order_id=client_order_id,
-                            exchange_order_id=res.exchange_order_id,
-                            reason_code=close_code,
-                            reason="Setup B SELL",
-                            pnl_usdt=res.pnl_usdt,
-                        )
-                        metrics.orders_total.labels(SERVICE, settings.exchange, symbol, "SELL").inc()
-
-                    metrics.last_tick_success.labels(SERVICE, symbol).set(1)
-
-            # 如果触发紧急退出：在本轮处理完所有 symbol 之后清掉开关
-            if get_flag(db, "EMERGENCY_EXIT", "false") == "true":
-                set_flag(db, "EMERGENCY_EXIT", "false")
-
-            # status snapshot for /admin/status
-            try:
-                upsert_service_status(
-                    db,
-                    service_name=SERVICE,
-                    instance_id=instance_id,
-                    status={
-                        "trace_id": trace_id,
-                        "last_tick_id": tick_id,
-                        "last_tick_ts_utc": datetime.datetime.utcnow().replace(tzinfo=datetime.timezone.utc).isoformat(),
-                        "last_tick_ts_hk": datetime.datetime.now(HK).isoformat(),
-                        "symbols": getattr(settings, "symbols", []),
-                        "open_positions": open_cnt if "open_cnt" in locals() else None,
-                        "halt": get_flag(db, "HALT_TRADING", "false"),
-                        "emergency": get_flag(db, "EMERGENCY_EXIT", "false"),
-                    },
-                )
-            except Exception:
-                pass
-
-        except RateLimitError as e:
-            sleep_s = e.retry_after_seconds or 2.0
-            # 仅对 severe 的限流发送 Telegram，避免刷屏
-            try:
-                if getattr(e, "severe", False):
-                    send_system_alert(
-                        telegram,
-                        title="⏳ 限流退避",
-                        summary_kv=build_system_summary(
-                            event="RATE_LIMIT_BACKOFF",
-                            trace_id=trace_id,
-                            exchange=exchange,
-                            level="WARN",
-                            reason_code=ReasonCode.RATE_LIMIT_429,
-                            reason=f"rate limit backoff {float(sleep_s):.2f}s",
-                            extra={
                                 "group": getattr(e, "group", None),
-                                "sleep_s": round(float(sleep_s), 2),
+                                "sleep_s": float(sleep_s),
                                 "severe": bool(getattr(e, "severe", False)),
                             },
-                        ),
-                        payload={
+                        )
+                    log_action(
+                        logger,
+                        action="RATE_LIMIT_BACKOFF",
+                        trace_id=trace_id,
+                        reason_code=ReasonCode.RATE_LIMIT_429,
+                        reason=f"rate limit backoff {float(sleep_s):.2f}s",
+                        client_order_id=None,
+                        extra={
                             "group": getattr(e, "group", None),
                             "sleep_s": float(sleep_s),
                             "severe": bool(getattr(e, "severe", False)),
                         },
                     )
-                log_action(
-                    logger,
-                    action="RATE_LIMIT_BACKOFF",
-                    trace_id=trace_id,
-                    reason_code=ReasonCode.RATE_LIMIT_429,
-                    reason=f"rate limit backoff {float(sleep_s):.2f}s",
-                    client_order_id=None,
-                    extra={
-                        "group": getattr(e, "group", None),
-                        "sleep_s": float(sleep_s),
-                        "severe": bool(getattr(e, "severe", False)),
-                    },
-                )
-            except Exception:
-                pass
-            time.sleep(max(0.5, float(sleep_s)))
-            continue
-        except Exception as e:
-            # 全局异常：避免某一个 symbol 的错误把整个服务打崩
-            for sym in symbols:
-                metrics.last_tick_success.labels(SERVICE, sym).set(0)
-            try:
-                send_system_alert(
-                    telegram,
-                    title="❌ 策略引擎异常",
-                    summary_kv=build_system_summary(event="ENGINE_ERROR", trace_id=trace_id, exchange=exchange, level="ERROR", reason=str(e)[:200]),
-                    payload={"error": str(e)},
-                )
-                log_action(logger, action="ENGINE_ERROR", trace_id=trace_id, reason_code="ERROR", reason=str(e)[:200], client_order_id=None)
-            except Exception:
-                pass
+                except Exception:
+                    pass
+                time.sleep(max(0.5, float(sleep_s)))
+                continue
+            except Exception as e:
+                # 全局异常：避免某一个 symbol 的错误把整个服务打崩
+                for sym in symbols:
+                    metrics.last_tick_success.labels(SERVICE, sym).set(0)
+                try:
+                    send_system_alert(
+                        telegram,
+                        title="❌ 策略引擎异常",
+                        summary_kv=build_system_summary(event="ENGINE_ERROR", trace_id=trace_id, exchange=exchange, level="ERROR", reason=str(e)[:200]),
+                        payload={"error": str(e)},
+                    )
+                    log_action(logger, action="ENGINE_ERROR", trace_id=trace_id, reason_code="ERROR", reason=str(e)[:200], client_order_id=None)
+                except Exception:
+                    pass
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -3,16 +3,22 @@
 
 from __future__ import annotations
 import contextlib
-from typing import Any, Dict, List, Optional, Tuple
+import threading
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
 import pymysql
+from pymysql.constants import CLIENT
 
 class MariaDB:
-    def __init__(self, host: str, port: int, user: str, password: str, db: str):
+    def __init__(self, host: str, port: int, user: str, password: str, db: str, *, multi_statements: bool = False):
         self.host = host
         self.port = port
         self.user = user
         self.password = password
         self.db = db
+        # 允许 execute_many_sql 把多条语句合成一次发送（默认关闭，仅需要的进程显式开启）
+        self.multi_statements = bool(multi_statements)
+        # session() 期间当前线程固定使用的连接（其它线程不受影响）
+        self._local = threading.local()
 
     def connect(self) -> pymysql.connections.Connection:
         return pymysql.connect(
@@ -24,31 +30,74 @@ class MariaDB:
             charset="utf8mb4",
             autocommit=False,
             cursorclass=pymysql.cursors.DictCursor,
+            client_flag=(CLIENT.MULTI_STATEMENTS if self.multi_statements else 0),
         )
 
     @contextlib.contextmanager
-    def tx(self):
-        conn = self.connect()
+    def session(self):
+        """在当前线程内复用同一条连接，直到退出（可嵌套，仅最外层生效）。
+
+        每次 tx()/fetch_*/execute 仍是独立事务（各自 COMMIT/ROLLBACK），只是不再每次新建 TCP 连接。
+        """
+        local = self._local
+        if getattr(local, "active", False):
+            yield self
+            return
+        local.active = True
+        local.conn = None
         try:
-            with conn.cursor() as cur:
+            yield self
+        finally:
+            conn = local.conn
+            local.active = False
+            local.conn = None
+            if conn is not None:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+
+    @contextlib.contextmanager
+    def tx(self, cursorclass: Optional[type] = None):
+        local = self._local
+        # 固定连接上已有未结束的 tx（嵌套调用）时另开连接，保持各自独立提交的语义
+        pinned = getattr(local, "active", False) and not getattr(local, "in_tx", False)
+        if pinned:
+            if local.conn is None:
+                local.conn = self.connect()
+            conn = local.conn
+            local.in_tx = True
+        else:
+            conn = self.connect()
+        try:
+            with conn.cursor(cursorclass) as cur:
                 yield cur
             conn.commit()
-        except Exception:
-            conn.rollback()
+        except Exception as e:
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+            # 固定连接已断开：丢弃，session 内下一次调用重新建连
+            if pinned and isinstance(e, (pymysql.err.OperationalError, pymysql.err.InterfaceError)):
+                local.conn = None
+                try:
+                    conn.close()
+                except Exception:
+                    pass
             raise
         finally:
-            conn.close()
+            if pinned:
+                local.in_tx = False
+            else:
+                conn.close()
 
     def ping(self) -> bool:
+        # 走 tx()：session() 内复用固定连接（不再为探活单独握手），断开时丢弃连接由下次调用重建
         try:
-            conn = self.connect()
-            try:
-                with conn.cursor() as cur:
-                    cur.execute("SELECT 1 AS ok")
-                    cur.fetchone()
-                conn.commit()
-            finally:
-                conn.close()
+            with self.tx() as cur:
+                cur.execute("SELECT 1 AS ok")
+                cur.fetchone()
             return True
         except Exception:
             return False
@@ -66,3 +115,34 @@ class MariaDB:
     def execute(self, sql: str, params: Tuple[Any, ...] = ()) -> int:
         with self.tx() as cur:
             return cur.execute(sql, params)
+
+    def fetch_iter(self, sql: str, params: Tuple[Any, ...] = ()) -> Iterator[Dict[str, Any]]:
+        """逐行读取（服务端游标 SSDictCursor，不在客户端缓存整个结果集）。
+
+        迭代期间占用连接/事务，需读完（或关闭生成器）才会提交并释放。
+        """
+        with self.tx(pymysql.cursors.SSDictCursor) as cur:
+            cur.execute(sql, params)
+            yield from cur
+
+    def execute_many_sql(self, stmts: Sequence[Tuple[str, Tuple[Any, ...]]]) -> List[List[Dict[str, Any]]]:
+        """在同一事务里按顺序执行多条（不同表的）语句，返回每条语句的结果行（非查询语句为空列表）。
+
+        开启 multi_statements 时参数先在客户端转义拼成一条 `;` 分隔的批次，一次往返发送；
+        否则逐条 execute。任一条失败整体回滚。
+        """
+        if not stmts:
+            return []
+        results: List[List[Dict[str, Any]]] = []
+        with self.tx() as cur:
+            if self.multi_statements and len(stmts) > 1:
+                cur.execute(";\n".join(cur.mogrify(sql, params) for sql, params in stmts))
+                results.append(list(cur.fetchall()))
+                # 逐个读取后续结果集：后面语句的错误在这里抛出
+                while cur.nextset():
+                    results.append(list(cur.fetchall()))
+            else:
+                for sql, params in stmts:
+                    cur.execute(sql, params)
+                    results.append(list(cur.fetchall()))
+        return results
@@ -4,13 +4,23 @@
 from __future__ import annotations
 import re
 from pathlib import Path
-from typing import List
+from typing import List, Set
+
+import pymysql
+from pymysql.constants import ER
+
 from .maria import MariaDB
 
 MIGRATION_RE = re.compile(r"^(\d{4})_.*\.sql$")
 
-def migrate(db: MariaDB, migrations_dir: Path) -> List[str]:
-    migrations_dir = migrations_dir.resolve()
+
+def _applied_versions(db: MariaDB) -> Set[str]:
+    """已执行的版本号；表不存在时（首次部署）先建表。常见情况只需一条 SELECT。"""
+    try:
+        return {r["version"] for r in db.fetch_all("SELECT version FROM schema_migrations")}
+    except pymysql.err.ProgrammingError as e:
+        if not e.args or e.args[0] != ER.NO_SUCH_TABLE:
+            raise
     with db.tx() as cur:
         cur.execute(
             """
@@ -20,8 +30,18 @@ def migrate(db: MariaDB, migrations_dir: Path) -> List[str]:
             ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
             """
         )
+    return set()
+
+
+def migrate(db: MariaDB, migrations_dir: Path) -> List[str]:
+    migrations_dir = migrations_dir.resolve()
+    # 整个迁移过程复用一条连接（原先每个 tx 各自建连）
+    with db.session():
+        return _migrate(db, migrations_dir)
+
 
-    applied = {r["version"] for r in db.fetch_all("SELECT version FROM schema_migrations")}
+def _migrate(db: MariaDB, migrations_dir: Path) -> List[str]:
+    applied = _applied_versions(db)
     ran: List[str] = []
 
     for p in sorted(migrations_dir.glob("*.sql")):
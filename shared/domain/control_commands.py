@@ -1,13 +1,12 @@
 from __future__ import annotations
 
 import json
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
 from shared.db import MariaDB
 
 
-def write_control_command(
-    db: MariaDB,
+def control_command_stmt(
     *,
     command: str,
     payload: Dict[str, Any],
@@ -16,9 +15,9 @@ def write_control_command(
     actor: Optional[str] = None,
     reason_code: Optional[str] = None,
     reason: Optional[str] = None,
-) -> int:
-    """Append a control command (auditable). Returns inserted id (best-effort)."""
-    db.execute(
+) -> Tuple[str, Tuple[Any, ...]]:
+    """控制命令 INSERT 的 (sql, params)：可与其它写入一起交给 MariaDB.execute_many_sql 同事务发送。"""
+    return (
         """
         INSERT INTO control_commands(command, payload_json, status, trace_id, actor, reason_code, reason)
         VALUES (%s, %s, %s, %s, %s, %s, %s)
@@ -33,6 +32,31 @@ def write_control_command(
             (str(reason) if reason else None),
         ),
     )
+
+
+def write_control_command(
+    db: MariaDB,
+    *,
+    command: str,
+    payload: Dict[str, Any],
+    status: str = "NEW",
+    trace_id: Optional[str] = None,
+    actor: Optional[str] = None,
+    reason_code: Optional[str] = None,
+    reason: Optional[str] = None,
+) -> int:
+    """Append a control command (auditable). Returns inserted id (best-effort)."""
+    db.execute(
+        *control_command_stmt(
+            command=command,
+            payload=payload,
+            status=status,
+            trace_id=trace_id,
+            actor=actor,
+            reason_code=reason_code,
+            reason=reason,
+        )
+    )
     try:
         row = db.fetch_one("SELECT LAST_INSERT_ID() AS id")
         return int(row["id"]) if row and row.get("id") is not None else 0
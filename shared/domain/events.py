@@ -5,7 +5,7 @@ from __future__ import annotations
 import datetime
 import json
 from decimal import Decimal
-from typing import Any, Dict, Optional, Union
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
 
 from ..db.maria import MariaDB
 from .enums import OrderEventType, ReasonCode
@@ -83,8 +83,20 @@ def get_first_event_created_at(
     return row.get("created_at") if row else None
 
 
-def append_order_event(
-    db: MariaDB,
+def _dumps_payload(obj: Any) -> str:
+    # 紧凑分隔符：payload_json 的字节形式与运行环境无关
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), default=_json_default)
+
+
+_ORDER_EVENT_SQL = """
+    INSERT INTO order_events(
+        trace_id, service, exchange, symbol, client_order_id, exchange_order_id,
+        event_type, action, actor, side, qty, price, status, reason_code, reason, event_ts_hk, raw_payload_json, payload_json
+    ) VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)
+    """
+
+
+def _order_event_params(
     *,
     trace_id: str,
     service: str,
@@ -102,8 +114,7 @@ def append_order_event(
     reason_code: Union[ReasonCode, str],
     reason: str,
     payload: Dict[str, Any],
-) -> bool:
-    """Insert into order_events (append-only + idempotent)."""
+) -> Tuple[Any, ...]:
     et = event_type.value if isinstance(event_type, OrderEventType) else str(event_type or OrderEventType.ERROR.value)
     rc = reason_code.value if isinstance(reason_code, ReasonCode) else str(reason_code or ReasonCode.ERROR.value)
 
@@ -117,14 +128,8 @@ def append_order_event(
         coid = f"SYS-{trace_id}"[:64]
 
     payload_obj = sanitize_payload(payload or {})
-    payload_json = json.dumps(payload_obj, ensure_ascii=False, default=_json_default)
-    sql = """
-    INSERT INTO order_events(
-        trace_id, service, exchange, symbol, client_order_id, exchange_order_id,
-        event_type, action, actor, side, qty, price, status, reason_code, reason, event_ts_hk, raw_payload_json, payload_json
-    ) VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)
-    """
-    params = (
+    payload_json = _dumps_payload(payload_obj)
+    return (
         trace_id,
         service,
         exchange,
@@ -144,16 +149,83 @@ def append_order_event(
         payload_json,
         payload_json,
     )
+
+
+def _is_duplicate_order_event(e: Exception) -> bool:
+    msg = str(e).lower()
+    return "duplicate" in msg and ("uq_client_order_event" in msg or "uq_client_order" in msg)
+
+
+def append_order_event(
+    db: MariaDB,
+    *,
+    trace_id: str,
+    service: str,
+    exchange: str,
+    symbol: str,
+    client_order_id: Optional[str],
+    exchange_order_id: Optional[str],
+    event_type: Union[OrderEventType, str],
+    action: Optional[str] = None,
+    actor: Optional[str] = None,
+    side: str,
+    qty: float,
+    price: Optional[float],
+    status: str,
+    reason_code: Union[ReasonCode, str],
+    reason: str,
+    payload: Dict[str, Any],
+) -> bool:
+    """Insert into order_events (append-only + idempotent)."""
+    params = _order_event_params(
+        trace_id=trace_id,
+        service=service,
+        exchange=exchange,
+        symbol=symbol,
+        client_order_id=client_order_id,
+        exchange_order_id=exchange_order_id,
+        event_type=event_type,
+        action=action,
+        actor=actor,
+        side=side,
+        qty=qty,
+        price=price,
+        status=status,
+        reason_code=reason_code,
+        reason=reason,
+        payload=payload,
+    )
     try:
-        db.execute(sql, params)
+        db.execute(_ORDER_EVENT_SQL, params)
         return True
     except Exception as e:
-        msg = str(e).lower()
-        if "duplicate" in msg and ("uq_client_order_event" in msg or "uq_client_order" in msg):
+        if _is_duplicate_order_event(e):
             return False
         raise
 
 
+def append_order_events(db: MariaDB, events: Sequence[Dict[str, Any]]) -> List[bool]:
+    """Insert several order events in one transaction (one connection + one COMMIT).
+
+    Order is preserved (ids stay monotonic in list order). A duplicate only skips that row;
+    any other error rolls back the whole batch. Returns per-event inserted flags.
+    """
+    params_list = [_order_event_params(**ev) for ev in events]
+    if not params_list:
+        return []
+    inserted: List[bool] = []
+    with db.tx() as cur:
+        for params in params_list:
+            try:
+                cur.execute(_ORDER_EVENT_SQL, params)
+                inserted.append(True)
+            except Exception as e:
+                if not _is_duplicate_order_event(e):
+                    raise
+                inserted.append(False)
+    return inserted
+
+
 def append_error_event(
     db: MariaDB,
     *,
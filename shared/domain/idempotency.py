@@ -18,14 +18,20 @@
 from __future__ import annotations
 
 import hashlib
+from functools import lru_cache
 from typing import Optional
 
+_SYMBOL_STRIP = str.maketrans("", "", "/-: ")
+
 
 def normalize_symbol(symbol: str) -> str:
-    s = (symbol or "").upper().strip()
-    for ch in ["/", "-", ":", " "]:
-        s = s.replace(ch, "")
-    return s
+    return (symbol or "").upper().strip().translate(_SYMBOL_STRIP)
+
+
+@lru_cache(maxsize=256)
+def _cid_prefix(symbol: str, side: str, interval_minutes: int) -> str:
+    """asv8-{symbol}-{side}-{timeframe}- 前缀：同一 symbol/side/周期只构造一次。"""
+    return f"asv8-{normalize_symbol(symbol)}-{(side or '').upper().strip()}-{int(interval_minutes)}m-"
 
 
 def _short_hash(s: str, n: int = 8) -> str:
@@ -42,17 +48,16 @@ def make_client_order_id_v83(
     max_len: int = 64,
 ) -> str:
     """V8.3 口径的 client_order_id 生成器。"""
-    sym = normalize_symbol(symbol)
-    sd = (side or "").upper().strip()
-    tf = f"{int(interval_minutes)}m"
     close_ts = int(kline_open_time_ms) + int(interval_minutes) * 60_000
     nn = (nonce or "0").strip()
-    base = f"asv8-{sym}-{sd}-{tf}-{close_ts}-{nn}"
+    base = f"{_cid_prefix(symbol, side, interval_minutes)}{close_ts}-{nn}"
     if len(base) <= max_len:
         return base
 
     # 超长：缩短 symbol + hash 保持唯一
-    sym_short = sym[:10]
+    sym_short = normalize_symbol(symbol)[:10]
+    sd = (side or "").upper().strip()
+    tf = f"{int(interval_minutes)}m"
     h = _short_hash(base, 10)
     short = f"asv8-{sym_short}-{sd}-{tf}-{close_ts}-{h}"
     return short[:max_len]
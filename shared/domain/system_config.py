@@ -1,6 +1,9 @@
 from __future__ import annotations
 
-from shared.db import MariaDB
+from typing import TYPE_CHECKING, Any, Dict, List, Tuple
+
+if TYPE_CHECKING:  # 仅用于类型标注：admin_cli 按需加载 DB 依赖时 import 本模块不引入 pymysql
+    from shared.db import MariaDB
 
 
 def get_system_config(db: MariaDB, key: str, default: str | None = None) -> str:
@@ -10,6 +13,55 @@ def get_system_config(db: MariaDB, key: str, default: str | None = None) -> str:
     return "" if default is None else str(default)
 
 
+def get_system_configs(db: MariaDB, defaults: Dict[str, str]) -> Dict[str, str]:
+    """一次 IN 查询读取多个 key；缺失或为 NULL 的取 defaults 中的默认值。"""
+    keys = list(defaults)
+    found: Dict[str, str] = {}
+    if keys:
+        rows = db.fetch_all(
+            f"SELECT `key`, `value` FROM system_config WHERE `key` IN ({', '.join(['%s'] * len(keys))})",
+            tuple(keys),
+        )
+        found = {r["key"]: str(r["value"]) for r in rows if r.get("value") is not None}
+    return {k: found.get(k, d) for k, d in defaults.items()}
+
+
+def system_config_write_stmts(
+    *,
+    actor: str,
+    key: str,
+    value: str,
+    trace_id: str,
+    reason_code: str,
+    reason: str,
+    action: str = "SET",
+) -> List[Tuple[str, Tuple[Any, ...]]]:
+    """UPSERT + 审计两条语句的 (sql, params) 列表（顺序不可调换：审计引用 UPSERT 设置的 @cfg_old）。
+
+    UPSERT 顺带把被覆盖的旧值捕获到会话变量 @cfg_old，不再单独 SELECT 旧值；
+    UPSERT 本身对该 key 加排他锁，并发写同一 key 时 old_value 与实际被覆盖的值一致。
+    """
+    # VALUES 里先把 @cfg_old 置 NULL（新插入时保持 NULL），命中重复键时在 UPDATE 中记下旧值
+    return [
+        (
+            """
+            INSERT INTO system_config(`key`, `value`)
+            VALUES (%s, IF((@cfg_old := NULL) IS NULL, %s, NULL))
+            ON DUPLICATE KEY UPDATE
+              `value` = IF((@cfg_old := `value`) IS NULL, VALUES(`value`), VALUES(`value`))
+            """,
+            (key, value),
+        ),
+        (
+            """
+            INSERT INTO config_audit(actor, action, cfg_key, old_value, new_value, trace_id, reason_code, reason)
+            VALUES (%s, %s, %s, @cfg_old, %s, %s, %s, %s)
+            """,
+            (actor, action, key, value, trace_id, reason_code, reason),
+        ),
+    ]
+
+
 def write_system_config(
     db: MariaDB,
     *,
@@ -21,17 +73,19 @@ def write_system_config(
     reason: str,
     action: str = "SET",
 ) -> None:
-    old = db.fetch_one("SELECT `value` FROM system_config WHERE `key`=%s", (key,))
-    old_val = old["value"] if old else None
+    """写 system_config，并记录 config_audit（用于审计/回溯）。
 
-    db.execute(
-        "INSERT INTO system_config(`key`,`value`) VALUES (%s,%s) ON DUPLICATE KEY UPDATE `value`=VALUES(`value`)",
-        (key, value),
-    )
-    db.execute(
-        """
-        INSERT INTO config_audit(actor, action, cfg_key, old_value, new_value, trace_id, reason_code, reason)
-        VALUES (%s,%s,%s,%s,%s,%s,%s,%s)
-        """,
-        (actor, action, key, old_val, value, trace_id, reason_code, reason),
+    同一事务两条语句（连接开启 multi_statements 时一次往返），配置与审计原子生效。
+    审计刻意保持同步：它与 UPSERT 同批发送，不额外增加往返；改为后台队列反而会在进程退出/崩溃时丢审计。
+    """
+    db.execute_many_sql(
+        system_config_write_stmts(
+            actor=actor,
+            key=key,
+            value=value,
+            trace_id=trace_id,
+            reason_code=reason_code,
+            reason=reason,
+            action=action,
+        )
     )
@@ -1,16 +1,19 @@
 
 from __future__ import annotations
 import time
-from datetime import datetime
 from zoneinfo import ZoneInfo
 
 HK = ZoneInfo("Asia/Hong_Kong")
 
 def now_ms() -> int:
-    return int(time.time() * 1000)
+    return time.time_ns() // 1_000_000
+
+def next_tick_epoch(interval_seconds: int, now: float | None = None) -> float:
+    """下一个 tick 边界（epoch 秒，按 interval_seconds 对齐）。"""
+    epoch = time.time() if now is None else now
+    return float(((int(epoch) // interval_seconds) + 1) * interval_seconds)
 
 def next_tick_sleep_seconds(interval_seconds: int) -> float:
-    now = datetime.now(HK)
-    epoch = now.timestamp()
-    next_epoch = ((int(epoch) // interval_seconds) + 1) * interval_seconds
-    return max(0.0, next_epoch - epoch)
+    # tick 边界按 epoch 秒对齐（与时区无关），直接用 time.time()
+    epoch = time.time()
+    return max(0.0, next_tick_epoch(interval_seconds, epoch) - epoch)
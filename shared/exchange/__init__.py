@@ -1,2 +1,2 @@
-from .factory import make_exchange
+from .factory import get_shared_limiter, make_exchange
 from .types import Kline, OrderResult
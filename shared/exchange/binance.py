@@ -1,7 +1,9 @@
 from __future__ import annotations
 
+import binascii
 import hashlib
 import hmac
+import json
 import time
 from typing import Any, Dict, List, Optional, Tuple
 
@@ -82,7 +84,7 @@ class BinanceUsdtFuturesClient(ExchangeClient):
     # HTTP + 签名
     # -------------------------
     def _sign(self, qs: str) -> str:
-        return hmac.new(self.api_secret, qs.encode("utf-8"), hashlib.sha256).hexdigest()
+        return binascii.b2a_hex(hmac.new(self.api_secret, qs.encode("utf-8"), hashlib.sha256).digest()).decode("ascii")
 
     def _request(self, method: str, path: str, *, params: Dict[str, Any], signed: bool, budget: str) -> Any:
         url = f"{self.base_url}{path}"
@@ -127,7 +129,8 @@ class BinanceUsdtFuturesClient(ExchangeClient):
                 raise ExchangeError(resp.text[:200])
 
             self.limiter.feedback_ok(budget, headers=dict(resp.headers))
-            return resp.json()
+            # 直接从 bytes 解析（json.loads 支持 UTF-8 bytes），不先构造 resp.text
+            return json.loads(resp.content)
         except httpx.TimeoutException as e:
             raise TemporaryError(str(e)) from e
 
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import binascii
 import hashlib
 import hmac
 import json
@@ -19,6 +20,40 @@ def _now_ms() -> int:
     return int(time.time() * 1000)
 
 
+def _ret_code(data: Any) -> int:
+    """把 Bybit 的 retCode 统一为 int（兼容字符串 "0" / 缺失；无法解析视为错误 -1）。"""
+    if not isinstance(data, dict):
+        return 0
+    rc = data.get("retCode")
+    if rc is None:
+        return 0
+    try:
+        return int(rc)
+    except (TypeError, ValueError):
+        return -1
+
+
+def _result_list(data: Any) -> List[Any]:
+    """取 Bybit 响应的 result.list（缺失/非 dict 时返回空列表）。"""
+    r = data.get("result") if isinstance(data, dict) else None
+    return (r.get("list") if isinstance(r, dict) else None) or []
+
+
+def _to_float(v: Any) -> Optional[float]:
+    """宽松转 float：None / "" / 非数值 -> None（避免调用点层层 try/except）。"""
+    if v is None or v == "":
+        return None
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        return None
+
+
+# 市价单固定字段（每次下单在此基础上补充 symbol/side/qty/orderLinkId）
+_MARKET_ORDER_BASE: Dict[str, Any] = {"category": "linear", "orderType": "Market", "timeInForce": "GTC"}
+_SIDE_MAP = {"BUY": "Buy", "SELL": "Sell"}
+
+
 class BybitV5LinearClient(ExchangeClient):
     """Bybit V5 USDT 合约（linear，逐仓）客户端。
 
@@ -63,13 +98,35 @@ class BybitV5LinearClient(ExchangeClient):
 
         self._prepared_symbols: set[str] = set()
 
+        # 指标 child 预绑定缓存：避免每次请求都走 labels() 的锁 + 字典查找
+        self._lat_children: Dict[str, Any] = {}
+        self._req_children: Dict[Tuple[str, str], Any] = {}
+
+    def _observe_request(self, endpoint: str, status: str, elapsed_s: float) -> None:
+        if self.metrics is None:
+            return
+        try:
+            h = self._lat_children.get(endpoint)
+            if h is None:
+                h = self.metrics.exchange_latency_seconds.labels(self.service_name, self.name, endpoint)
+                self._lat_children[endpoint] = h
+            h.observe(elapsed_s)
+
+            c = self._req_children.get((endpoint, status))
+            if c is None:
+                c = self.metrics.exchange_requests_total.labels(self.service_name, self.name, endpoint, status)
+                self._req_children[(endpoint, status)] = c
+            c.inc()
+        except Exception:
+            pass
+
     # -------------------------
     # Bybit V5 签名
     # -------------------------
     def _sign(self, payload: str, ts_ms: int) -> str:
         # v5: prehash = timestamp + api_key + recv_window + payload
         pre = f"{ts_ms}{self.api_key}{self.recv_window}{payload}"
-        return hmac.new(self.api_secret, pre.encode("utf-8"), hashlib.sha256).hexdigest()
+        return binascii.b2a_hex(hmac.new(self.api_secret, pre.encode("utf-8"), hashlib.sha256).digest()).decode("ascii")
 
     def _request(
         self,
@@ -118,6 +175,9 @@ class BybitV5LinearClient(ExchangeClient):
                 }
             )
 
+        # status: ok / 4xx / 5xx / 429 / timeout / error（retCode 业务错误或其它异常）
+        status = "error"
+        t0 = time.monotonic_ns()
         try:
             with httpx.Client(timeout=10) as client:
                 if method.upper() == "GET":
@@ -129,6 +189,7 @@ class BybitV5LinearClient(ExchangeClient):
                         resp = client.request(method, url, params=send_params, headers=headers, json=json_body)
 
             if resp.status_code in (429, 418):
+                status = "429"
                 retry_after = None
                 ra = resp.headers.get("Retry-After") or resp.headers.get("retry-after")
                 if ra:
@@ -143,6 +204,10 @@ class BybitV5LinearClient(ExchangeClient):
                     group=budget,
                     severe=bool(decision.get("severe")),
                 )
+            if resp.status_code >= 500:
+                status = "5xx"
+            elif resp.status_code >= 400:
+                status = "4xx"
             if resp.status_code in (401, 403):
                 raise AuthError(resp.text[:200])
             if resp.status_code >= 500:
@@ -150,16 +215,22 @@ class BybitV5LinearClient(ExchangeClient):
             if resp.status_code >= 400:
                 raise ExchangeError(resp.text[:200])
 
-            data = resp.json()
+            # 直接从 bytes 解析（json.loads 支持 UTF-8 bytes），不先构造 resp.text
+            data = json.loads(resp.content)
 
             # Bybit V5: retCode != 0 视为业务错误
-            if isinstance(data, dict) and data.get("retCode") not in (0, "0", None):
+            ret_code = _ret_code(data)
+            if ret_code:
                 raise ExchangeError(f"{data.get('retMsg')} (retCode={data.get('retCode')})")
 
+            status = "ok"
             self.limiter.feedback_ok(budget, headers=dict(resp.headers))
             return data
         except httpx.TimeoutException as e:
+            status = "timeout"
             raise TemporaryError(str(e)) from e
+        finally:
+            self._observe_request(path, status, (time.monotonic_ns() - t0) / 1e9)
 
     # -------------------------
     # 逐仓 + 杠杆（一次性准备）
@@ -203,13 +274,16 @@ class BybitV5LinearClient(ExchangeClient):
 
         data = self._request("GET", "/v5/market/kline", params=params, signed=False, budget="market_data")
 
-        rows = (((data or {}).get("result") or {}).get("list") or [])
+        rows = _result_list(data)
+        interval_ms = int(interval_minutes) * 60_000
         out: List[Kline] = []
+        append = out.append
         for row in rows:
-            out.append(
+            ot = int(row[0])
+            append(
                 Kline(
-                    open_time_ms=int(row[0]),
-                    close_time_ms=int(row[0]) + int(interval_minutes) * 60_000,
+                    open_time_ms=ot,
+                    close_time_ms=ot + interval_ms,
                     open=float(row[1]),
                     high=float(row[2]),
                     low=float(row[3]),
@@ -217,7 +291,11 @@ class BybitV5LinearClient(ExchangeClient):
                     volume=float(row[5]),
                 )
             )
-        out.sort(key=lambda k: k.open_time_ms)
+        # Bybit 按 startTime 倒序返回：已倒序时直接反转（O(n)），否则兜底排序
+        if len(out) > 1 and out[0].open_time_ms > out[-1].open_time_ms:
+            out.reverse()
+        if any(out[i].open_time_ms > out[i + 1].open_time_ms for i in range(len(out) - 1)):
+            out.sort(key=lambda k: k.open_time_ms)
         return out
 
     # -------------------------
@@ -239,12 +317,10 @@ class BybitV5LinearClient(ExchangeClient):
         self._ensure_isolated_and_leverage(symbol)
 
         payload: Dict[str, Any] = {
-            "category": "linear",
+            **_MARKET_ORDER_BASE,
             "symbol": symbol,
-            "side": "Buy" if side_u == "BUY" else "Sell",
-            "orderType": "Market",
+            "side": _SIDE_MAP[side_u],
             "qty": str(qty),
-            "timeInForce": "GTC",
             "orderLinkId": client_order_id,
         }
 
@@ -279,10 +355,10 @@ class BybitV5LinearClient(ExchangeClient):
             # Bybit 订单查询里通常有 cumExecFee
             try:
                 if st.raw and isinstance(st.raw, dict):
-                    o = (((st.raw.get("result") or {}).get("list") or [{}])[0]) or {}
-                    cf = o.get("cumExecFee")
-                    if cf not in (None, "", "0", 0):
-                        fee_usdt = float(cf)
+                    o = (_result_list(st.raw) or [{}])[0] or {}
+                    cf = _to_float(o.get("cumExecFee"))
+                    if cf:
+                        fee_usdt = cf
             except Exception:
                 pass
 
@@ -339,7 +415,7 @@ class BybitV5LinearClient(ExchangeClient):
             except ExchangeError:
                 data = None
 
-            lst = (((data or {}).get("result") or {}).get("list") or [])
+            lst = _result_list(data)
             for row in lst:
                 if str(row.get("orderId", "")) == str(order_id):
                     pnl = None
@@ -431,40 +507,28 @@ class BybitV5LinearClient(ExchangeClient):
         data = self._request("GET", "/v5/order/realtime", params=params, signed=True, budget="order")
         o: Dict[str, Any] = {}
         try:
-            o = (((data.get("result") or {}).get("list") or [{}])[0]) or {}
+            o = (_result_list(data) or [{}])[0] or {}
         except Exception:
             o = {}
 
         if not o or not o.get("orderId"):
             data2 = self._request("GET", "/v5/order/history", params=params, signed=True, budget="order")
             try:
-                o = (((data2.get("result") or {}).get("list") or [{}])[0]) or {}
+                o = (_result_list(data2) or [{}])[0] or {}
                 data = data2
             except Exception:
                 o = {}
 
         status = str(o.get("orderStatus") or o.get("order_status") or "UNKNOWN")
-        filled_qty = 0.0
-        try:
-            filled_qty = float(o.get("cumExecQty", 0.0) or 0.0)
-        except Exception:
-            filled_qty = 0.0
+        filled_qty = _to_float(o.get("cumExecQty")) or 0.0
 
-        avg_price: Optional[float] = None
-        try:
-            ap = o.get("avgPrice")
-            if ap not in (None, "", "0", 0):
-                avg_price = float(ap)
-        except Exception:
-            avg_price = None
+        # avgPrice="0" 表示尚无成交均价
+        avg_price: Optional[float] = _to_float(o.get("avgPrice")) or None
 
         # fallback: cumExecValue / cumExecQty
         if avg_price is None and filled_qty > 0:
-            try:
-                cum_value = float(o.get("cumExecValue", 0) or 0.0)
-                avg_price = (cum_value / filled_qty) if cum_value > 0 else None
-            except Exception:
-                avg_price = None
+            cum_value = _to_float(o.get("cumExecValue")) or 0.0
+            avg_price = (cum_value / filled_qty) if cum_value > 0 else None
 
         return OrderResult(
             exchange_order_id=str(o.get("orderId") or exchange_order_id or ""),
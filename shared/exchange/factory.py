@@ -1,19 +1,48 @@
 from __future__ import annotations
 
+import threading
+from typing import Dict, Optional
+
 from .rate_limiter import AdaptiveRateLimiter
 from .binance import BinanceUsdtFuturesClient
 from .bybit import BybitV5LinearClient
 from .paper import PaperExchange
 
 
-def make_exchange(settings, *, metrics=None, service_name: str = "unknown"):
+_shared_limiters: Dict[str, AdaptiveRateLimiter] = {}
+_shared_limiters_lock = threading.Lock()
+
+
+def get_shared_limiter(exchange: str, *, metrics=None) -> AdaptiveRateLimiter:
+    """进程内按交易所共享的限速器：同一进程多次 make_exchange（交易 + 数据同步）共用一套预算。"""
+    key = (exchange or "").lower()
+    with _shared_limiters_lock:
+        limiter = _shared_limiters.get(key)
+        if limiter is None:
+            limiter = AdaptiveRateLimiter(metrics=metrics, exchange=key)
+            _shared_limiters[key] = limiter
+        elif limiter.metrics is None and metrics is not None:
+            limiter.metrics = metrics
+        return limiter
+
+
+def make_exchange(
+    settings,
+    *,
+    metrics=None,
+    service_name: str = "unknown",
+    limiter: Optional[AdaptiveRateLimiter] = None,
+):
     """创建交易所客户端（本项目仅支持逐仓合约：Binance USDT-M Futures / Bybit Linear）。
 
     运行期：二选一（EXCHANGE=binance 或 bybit 或 paper）
+    limiter 未传入时使用进程内共享限速器（见 get_shared_limiter）。
     """
-    limiter = AdaptiveRateLimiter(metrics=metrics, exchange=settings.exchange.lower())
     ex = settings.exchange.lower()
 
+    if ex in ("binance", "bybit") and limiter is None:
+        limiter = get_shared_limiter(ex, metrics=metrics)
+
     if ex == "binance":
         return BinanceUsdtFuturesClient(
             base_url=settings.binance_base_url,
@@ -2,3 +2,11 @@ from .client import redis_client
 from .locks import distributed_lock
 
 from .leader import LeaderElector
+from .cache_events import (
+    cache_fresh_key,
+    emergency_exit_key,
+    notify_cache_fresh,
+    notify_emergency_exit,
+    wait_cache_fresh,
+    wait_emergency_exit,
+)
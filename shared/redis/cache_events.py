@@ -0,0 +1,105 @@
+"""Redis list notifications (LPUSH + PUBLISH on write, non-consuming wait).
+
+- market_data_cache freshness: data-syncer pushes the newest open_time_ms after
+  each cache upsert; waiters (admin-cli status / smoke-test) block on it
+  instead of polling MariaDB.
+- emergency exit: strategy-engine pushes the trace_id once a symbol has been
+  flattened; smoke-test waits on it instead of polling order_events.
+
+Waiters only read the list head (LINDEX 0) and never pop it, so every waiter
+on the same key wakes up; PUBLISH on a channel named like the key is the
+wake-up signal.
+"""
+
+from __future__ import annotations
+import time
+from typing import Any, Callable, Optional
+import redis
+
+
+_KEEP = 16
+_TTL_SECONDS = 3600
+
+
+def _push(r: redis.Redis, key: str, value: Any) -> None:
+    try:
+        pipe = r.pipeline(transaction=False)
+        pipe.lpush(key, value)
+        pipe.ltrim(key, 0, _KEEP - 1)
+        pipe.expire(key, _TTL_SECONDS)
+        pipe.publish(key, value)
+        pipe.execute()
+    except Exception:
+        pass
+
+
+def _wait_head(r: redis.Redis, key: str, is_new: Callable[[str], bool], timeout_seconds: float) -> Optional[str]:
+    """Return the list head once is_new(head) holds, else None at the deadline.
+
+    Subscribes before reading the head, so a push between the read and the wait
+    still wakes us. The wait uses the remaining time as a float (no 1s floor).
+    """
+    deadline = time.monotonic() + timeout_seconds
+    pubsub = r.pubsub(ignore_subscribe_messages=True)
+    try:
+        pubsub.subscribe(key)
+        while True:
+            head = r.lindex(key, 0)
+            if head is not None and is_new(head):
+                return head
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            pubsub.get_message(timeout=remaining)
+    finally:
+        pubsub.close()
+
+
+def cache_fresh_key(symbol: str, interval_minutes: int, feature_version: int) -> str:
+    return f"md:fresh:{symbol}:{int(interval_minutes)}:{int(feature_version)}"
+
+
+def notify_cache_fresh(r: redis.Redis, *, symbol: str, interval_minutes: int, feature_version: int, open_time_ms: int) -> None:
+    """Best-effort: never raises (cache write already committed)."""
+    _push(r, cache_fresh_key(symbol, interval_minutes, feature_version), int(open_time_ms))
+
+
+def wait_cache_fresh(
+    r: redis.Redis,
+    *,
+    symbol: str,
+    interval_minutes: int,
+    feature_version: int,
+    timeout_seconds: float,
+    after: Optional[int] = None,
+) -> Optional[int]:
+    """Block until the newest pushed open_time_ms is > after (any value if after is None), or timeout.
+
+    Returns that open_time_ms, else None. Raises redis errors so callers can fall back to polling.
+    """
+
+    def _newer(value: str) -> bool:
+        try:
+            return after is None or int(value) > after
+        except (TypeError, ValueError):
+            return False
+
+    value = _wait_head(r, cache_fresh_key(symbol, interval_minutes, feature_version), _newer, timeout_seconds)
+    return int(value) if value is not None else None
+
+
+def emergency_exit_key(symbol: str) -> str:
+    return f"oe:emergency_exit:{symbol}"
+
+
+def notify_emergency_exit(r: redis.Redis, *, symbol: str, trace_id: str) -> None:
+    """Best-effort: never raises (exit order + position already recorded)."""
+    _push(r, emergency_exit_key(symbol), trace_id)
+
+
+def wait_emergency_exit(r: redis.Redis, *, symbol: str, timeout_seconds: float, last_seen: Optional[str] = None) -> Optional[str]:
+    """Block until the newest pushed trace_id differs from last_seen (or timeout). Returns it, else None.
+
+    Raises redis errors so callers can fall back to polling.
+    """
+    return _wait_head(r, emergency_exit_key(symbol), lambda value: value != last_seen, timeout_seconds)
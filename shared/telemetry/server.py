@@ -1,15 +1,62 @@
 from __future__ import annotations
 
 import socket
-from prometheus_client import start_http_server
+import threading
+
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+
+_CONTENT_TYPE = CONTENT_TYPE_LATEST.encode("latin-1")
+
+
+async def _metrics_app(scope, receive, send) -> None:
+    """Minimal ASGI app: GET /metrics (or /) returns the default registry in text format."""
+    if scope["type"] != "http":
+        return
+    if scope.get("path") not in ("/metrics", "/"):
+        await send({"type": "http.response.start", "status": 404, "headers": [(b"content-type", b"text/plain")]})
+        await send({"type": "http.response.body", "body": b"not found"})
+        return
+    body = generate_latest()
+    await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", _CONTENT_TYPE)]})
+    await send({"type": "http.response.body", "body": body})
 
 
 def start_metrics_http_server(port: int) -> None:
     """Start a background HTTP server for Prometheus scrape.
 
+    Served by uvicorn (single plain-asyncio loop in a daemon thread) instead of
+    prometheus_client's thread-per-request stdlib server.
+
+    The listening socket is bound in the caller's thread, so a port-in-use /
+    bind error raises OSError here (as prometheus_client's start_http_server
+    did) instead of silently killing the background server.
+
     If port <= 0, does nothing.
     """
     if not port or int(port) <= 0:
         return
-    # start_http_server is non-blocking
-    start_http_server(int(port))
+
+    import uvicorn
+
+    config = uvicorn.Config(
+        _metrics_app,
+        host="0.0.0.0",
+        port=int(port),
+        lifespan="off",
+        # 固定纯 asyncio + h11：uvicorn[standard] 下 loop="auto" 会选 uvloop 并设置进程级
+        # event loop policy，影响宿主服务；这里只让本线程有自己的 asyncio loop
+        loop="asyncio",
+        http="h11",
+        access_log=False,
+        log_level="warning",
+    )
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind(("0.0.0.0", int(port)))
+    except OSError:
+        sock.close()
+        raise
+    server = uvicorn.Server(config)
+    # non-blocking: uvicorn skips signal handlers when not on the main thread
+    threading.Thread(target=server.run, kwargs={"sockets": [sock]}, name="metrics-http", daemon=True).start()
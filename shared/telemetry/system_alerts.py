@@ -44,6 +44,9 @@ def send_system_alert(
     title: str,
     summary_kv: Dict[str, Any],
     payload: Optional[Dict[str, Any]] = None,
+    payload_json: Optional[str] = None,
 ) -> None:
-    """统一系统类告警发送入口。"""
-    telegram.send_alert_zh(title=title, summary_kv=summary_kv, payload=payload or {})
+    """统一系统类告警发送入口。payload_json：调用方已序列化好的 payload（可选，避免重复编码）。"""
+    if not telegram.enabled():
+        return
+    telegram.send_alert_zh(title=title, summary_kv=summary_kv, payload=payload or {}, payload_json=payload_json)
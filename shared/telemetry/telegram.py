@@ -1,13 +1,131 @@
 from __future__ import annotations
 
+import atexit
 import datetime
 import json
+import logging
 import os
+import queue
+import threading
+import time
 from decimal import Decimal
 from html import escape as html_escape
-from typing import Any, Dict, List, Optional
-from urllib.parse import urlencode
-from urllib.request import Request, urlopen
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import quote_plus, urlencode
+
+import httpx
+
+
+logger = logging.getLogger(__name__)
+
+# 进程内共享的发送队列 + 单个后台线程：调用方只入队，网络 I/O 不阻塞交易主循环。
+# 单消费者保证同一条长消息的分段按顺序送达；httpx.Client 复用 keep-alive 连接。
+_QUEUE_MAXSIZE = 256
+_FLUSH_ON_EXIT_SECONDS = 3.0
+
+# Telegram 单条消息上限 4096，留余量
+_MAX_MESSAGE_LEN = 3500
+_COALESCE_SEP = "\n\n"
+
+# (url, 固定表单前缀 chat_id..., text, parse_mode, timeout)；text 在 worker 里才编码，便于合并
+_Item = Tuple[str, bytes, str, Optional[str], float]
+_send_q: "queue.Queue[_Item]" = queue.Queue(maxsize=_QUEUE_MAXSIZE)
+_worker_lock = threading.Lock()
+_worker: Optional[threading.Thread] = None
+_client: Optional[httpx.Client] = None
+
+
+def _coalesce(first: _Item) -> Tuple[_Item, int, Optional[_Item]]:
+    """把队列里紧随其后、发往同一会话且 parse_mode 相同的消息并成一条（不超过单条上限）。
+
+    返回 (合并后的消息, 合并的条数, 取出但无法合并、需下一轮发送的消息)。
+    """
+    url, prefix, text, parse_mode, timeout = first
+    parts = [text]
+    size = len(text)
+    n = 1
+    while True:
+        try:
+            nxt = _send_q.get_nowait()
+        except queue.Empty:
+            return (url, prefix, _COALESCE_SEP.join(parts), parse_mode, timeout), n, None
+        if (nxt[0], nxt[1], nxt[3]) != (url, prefix, parse_mode) or size + len(_COALESCE_SEP) + len(nxt[2]) > _MAX_MESSAGE_LEN:
+            return (url, prefix, _COALESCE_SEP.join(parts), parse_mode, timeout), n, nxt
+        parts.append(nxt[2])
+        size += len(_COALESCE_SEP) + len(nxt[2])
+        n += 1
+
+
+def _worker_loop() -> None:
+    global _client
+    held: Optional[_Item] = None
+    while True:
+        item = held if held is not None else _send_q.get()
+        # 突发告警：积压的同类消息合并发送，一次往返摊给多条
+        (url, prefix, text, parse_mode, timeout), n, held = _coalesce(item)
+        try:
+            if _client is None:
+                # keep-alive 连接池 + 建连失败自动重试（不重试已发出的请求，避免重复消息）
+                _client = httpx.Client(transport=httpx.HTTPTransport(retries=2))
+            body = prefix + b"&text=" + quote_plus(text).encode("utf-8")
+            if parse_mode:
+                body += b"&parse_mode=" + quote_plus(parse_mode).encode("utf-8")
+            _client.post(
+                url,
+                content=body,
+                headers={"Content-Type": "application/x-www-form-urlencoded"},
+                timeout=timeout,
+            )
+        except Exception as e:
+            # 告警尽力而为：任何异常都只丢弃本次（可能是合并后的多条），worker 不退出，
+            # 已取出待发的 held 下一轮照常发送，task_done 计数不丢（flush 不会空等到超时）
+            logger.warning("telegram send failed, %d message(s) dropped: %s", n, e)
+        finally:
+            for _ in range(n):
+                _send_q.task_done()
+
+
+def _ensure_worker() -> None:
+    global _worker
+    if _worker is not None and _worker.is_alive():
+        return
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(target=_worker_loop, name="telegram-sender", daemon=True)
+            _worker.start()
+
+
+def flush(timeout: float = _FLUSH_ON_EXIT_SECONDS) -> bool:
+    """等待队列中的消息发送完成（最多 timeout 秒）。返回是否已清空。"""
+    deadline = time.monotonic() + max(0.0, float(timeout))
+    while _send_q.unfinished_tasks:
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(0.05)
+    return True
+
+
+# 短生命周期进程（admin_cli）退出前尽量把已入队的告警发完
+atexit.register(flush)
+
+_JSON_HEAD = "<b>JSON 摘要</b>\n<pre>"
+_PRE_HEAD = "<pre>"
+_PRE_TAIL = "</pre>"
+
+# send_alert_zh 摘要行的优先顺序（其余 key 按字母序排在后面）
+_PREFERRED_KEYS = (
+    "ts_hk", "ts_utc",
+    "level", "service", "event", "action",
+    "trace_id",
+    "exchange", "symbol", "side",
+    "qty", "price", "leverage", "ai_score",
+    "stop_price", "stop_dist_pct",
+    "reason_code", "reason",
+    "client_order_id", "exchange_order_id",
+    "stop_client_order_id", "stop_exchange_order_id",
+    "status", "error",
+)
+_PREFERRED_RANK: Dict[str, int] = {k: i for i, k in enumerate(_PREFERRED_KEYS)}
 
 
 class Telegram:
@@ -15,9 +133,21 @@ class Telegram:
         self.bot_token = (bot_token or "").strip()
         self.chat_id = (chat_id or "").strip()
         self.timeout_seconds = int(timeout_seconds)
+        # token/chat_id 构造后不变：启用状态只算一次
+        self._enabled = bool(self.bot_token and self.chat_id)
 
         # 是否发送 JSON 摘要（默认开启）
         self.send_json = self._get_bool_env("TELEGRAM_SEND_JSON", default=True)
+        # 紧凑 JSON（不缩进、不排序）：走 json 的 C 编码器，适合机器消费/超大 payload（默认关闭）
+        self.compact_json = self._get_bool_env("TELEGRAM_COMPACT_JSON", default=False)
+
+        # sendMessage 的固定部分只构造一次；每条消息只需 urlencode text
+        self._send_url = f"https://api.telegram.org/bot{self.bot_token}/sendMessage"
+        self._form_prefix = urlencode({"chat_id": self.chat_id, "disable_web_page_preview": "true"}).encode("utf-8")
+
+        # json.dumps 带非默认参数时每次都会新建 JSONEncoder；这里缓存 send_alert 默认 indent=2 的编码器
+        self._json_encoder = self._make_json_encoder(2)
+        self._compact_encoder = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"), default=self._json_default)
 
     @staticmethod
     def _get_bool_env(name: str, default: bool = True) -> bool:
@@ -32,51 +162,41 @@ class Telegram:
         return default
 
     def enabled(self) -> bool:
-        return bool(self.bot_token and self.chat_id)
+        return self._enabled
 
     # ✅ 兼容旧接口：策略引擎用 telegram.send(...)
     def send(self, text: str) -> None:
+        if not self._enabled:
+            return
         self.send_text(text)
 
     def send_text(self, text: str) -> None:
+        if not self._enabled:
+            return
         # 纯文本发送（不使用 parse_mode，避免 '_' 等触发 Markdown 解析失败）
         self._send_message(text, parse_mode=None)
 
-    def _post_form(self, url: str, data: Dict[str, Any]) -> bool:
+    def _enqueue(self, text: str, parse_mode: Optional[str]) -> bool:
+        """入队后立即返回；队列满时丢弃该条（告警不应反压交易主循环）。"""
+        _ensure_worker()
         try:
-            body = urlencode({k: "" if v is None else str(v) for k, v in data.items()}).encode("utf-8")
-            req = Request(url, data=body, method="POST")
-            req.add_header("Content-Type", "application/x-www-form-urlencoded")
-            with urlopen(req, timeout=self.timeout_seconds) as resp:
-                _ = resp.read()
+            _send_q.put_nowait((self._send_url, self._form_prefix, text, parse_mode, float(self.timeout_seconds)))
             return True
-        except Exception:
+        except queue.Full:
+            logger.warning("telegram send queue full (%d), message dropped", _QUEUE_MAXSIZE)
             return False
 
     def _send_message(self, text: str, parse_mode: Optional[str] = None) -> None:
-        if not self.enabled():
+        if not self._enabled:
             return
 
         s = text or ""
-        max_len = 3500
-        parts: List[str] = []
-        while len(s) > max_len:
-            parts.append(s[:max_len])
-            s = s[max_len:]
-        if s:
-            parts.append(s)
-
-        url = f"https://api.telegram.org/bot{self.bot_token}/sendMessage"
+        max_len = _MAX_MESSAGE_LEN
+        # 按下标切片：每段只拷贝一次，避免反复 s = s[max_len:] 复制剩余尾部
+        parts: List[str] = [s[i:i + max_len] for i in range(0, len(s), max_len)]
 
         for part in parts:
-            payload: Dict[str, Any] = {
-                "chat_id": self.chat_id,
-                "text": part,
-                "disable_web_page_preview": "true",
-            }
-            if parse_mode:
-                payload["parse_mode"] = parse_mode
-            self._post_form(url, payload)
+            self._enqueue(part, parse_mode)
 
     @staticmethod
     def _json_default(o: Any) -> Any:
@@ -89,6 +209,21 @@ class Telegram:
                 return str(o)
         return str(o)
 
+    def _make_json_encoder(self, indent: int) -> json.JSONEncoder:
+        return json.JSONEncoder(ensure_ascii=False, sort_keys=True, indent=indent, default=self._json_default)
+
+    def _dumps_payload(self, payload: Any, indent: int) -> str:
+        if self.compact_json:
+            try:
+                return self._compact_encoder.encode(payload)
+            except Exception as e:
+                return self._compact_encoder.encode({"_error": f"payload json encode failed: {str(e)}", "payload_str": str(payload)})
+        enc = self._json_encoder if indent == 2 else self._make_json_encoder(indent)
+        try:
+            return enc.encode(payload)
+        except Exception as e:
+            return enc.encode({"_error": f"payload json encode failed: {str(e)}", "payload_str": str(payload)})
+
     def send_alert(
         self,
         *,
@@ -97,42 +232,89 @@ class Telegram:
         payload: Dict[str, Any],
         json_indent: int = 2,
     ) -> None:
-        if not self.enabled():
+        if not self._enabled:
             return
 
-        summary_lines = summary_lines or []
-        text_msg = "\n".join([str(title), *[str(x) for x in summary_lines if str(x).strip()]]).strip()
+        lines = [str(title)]
+        for x in summary_lines or []:
+            sx = str(x)
+            if sx.strip():
+                lines.append(sx)
+        self._send_alert_text("\n".join(lines).strip(), payload, json_indent)
 
+    def _send_alert_text(
+        self, text_msg: str, payload: Optional[Dict[str, Any]], json_indent: int, payload_json: Optional[str] = None
+    ) -> None:
         # 1) 文本永远发送（纯文本）
         self._send_message(text_msg, parse_mode=None)
 
-        # 2) JSON 摘要可关闭
-        if not self.send_json:
+        # 2) JSON 摘要可关闭；只有未给 payload（None）时才不发，空 dict 仍发 "{}"（调用方用它表示“无详情”）
+        if not self.send_json or (payload is None and payload_json is None):
             return
 
-        try:
-            payload_json = json.dumps(
-                payload,
-                ensure_ascii=False,
-                sort_keys=True,
-                indent=json_indent,
-                default=self._json_default,
-            )
-        except Exception as e:
-            payload_json = json.dumps(
-                {"_error": f"payload json encode failed: {str(e)}", "payload_str": str(payload)},
-                ensure_ascii=False,
-                sort_keys=True,
-                indent=json_indent,
-                default=self._json_default,
-            )
+        # 调用方已序列化过同一份 payload（如 admin_cli 打印的报告）时直接复用，不再编码第二遍
+        if payload_json is None:
+            payload_json = self._dumps_payload(payload, json_indent)
 
-        payload_json_html = html_escape(payload_json)
-        html_msg = f"<b>JSON 摘要</b>\n<pre>{payload_json_html}</pre>"
-        self._send_message(html_msg, parse_mode="HTML")
+        # <pre> 文本里只需转义 & < >（Telegram HTML 模式不要求转义引号），少两次全串扫描
+        payload_json_html = html_escape(payload_json, quote=False)
+        # 先按长度判断，常见情况只拼一次整条消息
+        if len(_JSON_HEAD) + len(payload_json_html) + len(_PRE_TAIL) <= _MAX_MESSAGE_LEN:
+            self._send_message(_JSON_HEAD + payload_json_html + _PRE_TAIL, parse_mode="HTML")
+            return
 
-    def send_alert_zh(self, *, title: str, summary_kv: Dict[str, Any], payload: Dict[str, Any]) -> None:
-        if not self.enabled():
+        # 超长：按行切分原始 JSON，每段单独转义并包成完整的 <pre>，避免切断标签/实体导致 HTML 解析失败
+        budget = _MAX_MESSAGE_LEN - len(_JSON_HEAD) - len(_PRE_TAIL)
+        head = _JSON_HEAD
+        for chunk in self._escaped_chunks(payload_json, budget):
+            self._send_message(head + chunk + _PRE_TAIL, parse_mode="HTML")
+            head = _PRE_HEAD
+
+    @staticmethod
+    def _escaped_chunks(text: str, budget: int) -> List[str]:
+        """把 text 按行分组，每组 html 转义后长度 <= budget；超长单行按字符再切。"""
+        out: List[str] = []
+        buf: List[str] = []
+        size = 0
+        for line in text.splitlines(keepends=True):
+            e = html_escape(line, quote=False)
+            if len(e) > budget:
+                # 每个原始字符转义后最多 5 个字符（&amp;），按此切片保证不超限
+                step = max(1, budget // 5)
+                pieces = [html_escape(line[i:i + step], quote=False) for i in range(0, len(line), step)]
+            else:
+                pieces = [e]
+            for piece in pieces:
+                if size + len(piece) > budget and buf:
+                    out.append("".join(buf))
+                    buf = []
+                    size = 0
+                buf.append(piece)
+                size += len(piece)
+        if buf:
+            out.append("".join(buf))
+        return out
+
+    @staticmethod
+    def _fmt_value(v: Any) -> Any:
+        if isinstance(v, (datetime.datetime, datetime.date)):
+            return v.isoformat()
+        if isinstance(v, Decimal):
+            try:
+                return float(v)
+            except Exception:
+                return str(v)
+        return v
+
+    def send_alert_zh(
+        self,
+        *,
+        title: str,
+        summary_kv: Dict[str, Any],
+        payload: Dict[str, Any],
+        payload_json: Optional[str] = None,
+    ) -> None:
+        if not self._enabled:
             return
 
         # 需求：每条告警必须包含 HK + UTC 时间戳（便于追溯）
@@ -146,40 +328,12 @@ class Telegram:
         if "ts_utc" not in kv:
             kv["ts_utc"] = datetime.datetime.utcnow().replace(tzinfo=datetime.timezone.utc).isoformat()
 
-        preferred = [
-            "ts_hk","ts_utc",
-            "level","service","event","action",
-            "trace_id",
-            "exchange","symbol","side",
-            "qty","price","leverage","ai_score",
-            "stop_price","stop_dist_pct",
-            "reason_code","reason",
-            "client_order_id","exchange_order_id",
-            "stop_client_order_id","stop_exchange_order_id",
-            "status","error",
-        ]
-
-        lines: List[str] = []
-        used = set()
-        def _fmt(v: Any) -> Any:
-            if isinstance(v, (datetime.datetime, datetime.date)):
-                return v.isoformat()
-            if isinstance(v, Decimal):
-                try:
-                    return float(v)
-                except Exception:
-                    return str(v)
-            return v
-
-        for k in preferred:
-            if k in kv:
-                lines.append(f"- {k}: {_fmt(kv.get(k))}")
-                used.add(k)
-
-        for k in sorted(kv.keys()):
-            if k in used:
-                continue
-            lines.append(f"- {k}: {_fmt(kv.get(k))}")
-
-
-        self.send_alert(title=title, summary_lines=lines, payload=payload, json_indent=2)
+        # 单次遍历：优先字段按固定顺序在前，其余按 key 字母序；摘要行直接拼好交给发送，不再经 send_alert 二次 str/strip
+        rank = _PREFERRED_RANK
+        n_pref = len(rank)
+        fmt = self._fmt_value
+        parts: List[str] = [str(title)]
+        for k in sorted(kv, key=lambda k: (rank.get(k, n_pref), k)):
+            parts.append(f"- {k}: {fmt(kv[k])}")
+
+        self._send_alert_text("\n".join(parts).strip(), payload, 2, payload_json)
@@ -91,4 +91,6 @@ def send_trade_alert(
     payload: Optional[Dict[str, Any]] = None,
 ) -> None:
     """统一 trade 告警发送入口，避免各处字段缺失/不一致。"""
+    if not telegram.enabled():
+        return
     telegram.send_alert_zh(title=title, summary_kv=summary_kv, payload=payload or {})
@@ -0,0 +1,34 @@
+"""admin_cli 告警载荷：_report_envelope 与直接序列化 {"report": ...} 的结果逐字相同。"""
+
+from __future__ import annotations
+
+import datetime
+import json
+from decimal import Decimal
+
+import pytest
+
+from tools.admin_cli.__main__ import _dump, _report_envelope
+
+REPORT = {
+    "trace_id": "smoke-1",
+    "checks": {
+        "db_ping": True,
+        "note": "line1\nline2 中文 \"quoted\"",
+        "price": Decimal("1.25"),
+        "ts": datetime.datetime(2026, 1, 9, 12, 0, 0),
+        "market_cache_last": {"open_time_ms": 1, "age_seconds": 3, "nested": [1, {"x": None}, [], {}]},
+    },
+}
+
+
+@pytest.mark.parametrize("report", [REPORT, {}, {"a": []}], ids=["full", "empty", "empty-list"])
+def test_envelope_matches_direct_dump(report):
+    assert _report_envelope(_dump(report)) == _dump({"report": report})
+
+
+def test_envelope_with_extra_fields():
+    extra = {"error": "boom\n\"x\"", "detail": {"k": [1, 2]}}
+    env = _report_envelope(_dump(REPORT), **extra)
+    assert env == _dump({"report": REPORT, **extra})
+    assert json.loads(env)["error"] == extra["error"]
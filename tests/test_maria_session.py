@@ -0,0 +1,150 @@
+"""MariaDB.session() 连接固定语义（不需要真实数据库：connect() 换成假连接）。"""
+
+from __future__ import annotations
+
+import threading
+
+import pymysql
+import pytest
+
+from shared.db import MariaDB
+
+
+class _Cursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=()):
+        self.conn.executed.append(sql)
+        if self.conn.fail_with is not None:
+            err, self.conn.fail_with = self.conn.fail_with, None
+            raise err
+        return 1
+
+    def fetchone(self):
+        return {"ok": 1}
+
+    def fetchall(self):
+        return [{"ok": 1}]
+
+
+class _Conn:
+    def __init__(self, n):
+        self.n = n
+        self.executed = []
+        self.commits = 0
+        self.rollbacks = 0
+        self.closed = False
+        self.fail_with = None
+
+    def cursor(self, cursorclass=None):
+        return _Cursor(self)
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def db(monkeypatch):
+    d = MariaDB("h", 3306, "u", "p", "db")
+    d.opened = []
+
+    def connect():
+        c = _Conn(len(d.opened))
+        d.opened.append(c)
+        return c
+
+    monkeypatch.setattr(d, "connect", connect)
+    return d
+
+
+def test_without_session_each_call_opens_and_closes(db):
+    assert db.ping()
+    db.fetch_one("SELECT 1")
+    assert len(db.opened) == 2
+    assert all(c.closed for c in db.opened)
+
+
+def test_session_pins_one_connection_and_ping_reuses_it(db):
+    with db.session():
+        assert db.ping()
+        db.fetch_one("SELECT 1")
+        db.execute("UPDATE t SET x=1")
+        assert db.ping()
+        assert len(db.opened) == 1
+        pinned = db.opened[0]
+        assert not pinned.closed
+        # 每次调用仍是独立事务
+        assert pinned.commits == 4
+    assert pinned.closed
+
+
+def test_tx_nested_inside_session_uses_a_separate_connection(db):
+    with db.session():
+        with db.tx() as outer:
+            outer.execute("SELECT outer")
+            # 外层 tx 尚未结束：内层调用另开连接、独立提交并关闭
+            assert db.ping()
+            inner = db.opened[1]
+            assert inner is not outer.conn
+            assert inner.closed and inner.commits == 1
+            assert not outer.conn.closed and outer.conn.commits == 0
+        assert outer.conn.commits == 1
+        # 外层结束后回到固定连接
+        db.fetch_one("SELECT again")
+        assert len(db.opened) == 2
+        assert db.opened[0].executed[-1] == "SELECT again"
+
+
+def test_nested_session_is_a_no_op(db):
+    with db.session():
+        db.ping()
+        with db.session():
+            db.ping()
+        assert not db.opened[0].closed
+        db.ping()
+    assert len(db.opened) == 1 and db.opened[0].closed
+
+
+def test_dropped_pinned_connection_is_replaced(db):
+    with db.session():
+        db.ping()
+        db.opened[0].fail_with = pymysql.err.OperationalError(2006, "gone away")
+        assert db.ping() is False
+        assert db.opened[0].closed
+        assert db.ping()
+        assert len(db.opened) == 2 and not db.opened[1].closed
+
+
+def test_sql_error_keeps_the_pinned_connection(db):
+    with db.session():
+        db.ping()
+        db.opened[0].fail_with = pymysql.err.ProgrammingError(1064, "syntax")
+        with pytest.raises(pymysql.err.ProgrammingError):
+            db.fetch_one("SELEC 1")
+        assert db.opened[0].rollbacks == 1 and not db.opened[0].closed
+        db.ping()
+        assert len(db.opened) == 1
+
+
+def test_pin_is_per_thread(db):
+    with db.session():
+        db.ping()
+        t = threading.Thread(target=db.ping)
+        t.start()
+        t.join()
+        # 其它线程不共享固定连接：自己开一条并关闭
+        assert len(db.opened) == 2
+        assert db.opened[1].closed and not db.opened[0].closed
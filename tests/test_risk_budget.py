@@ -0,0 +1,104 @@
+"""enforce_risk_budget 闭式杠杆计算与原逐级递减实现的一致性测试（结果 + 说明文本逐字相同）。"""
+
+from __future__ import annotations
+
+import itertools
+import random
+from types import SimpleNamespace
+
+import pytest
+
+from services.strategy_engine.main import enforce_risk_budget
+
+
+def _reference(*, equity_usdt, base_margin_usdt, leverage, stop_dist_pct, settings):
+    """原实现：逐级把杠杆降到 1。"""
+    budget = float(equity_usdt) * float(getattr(settings, "risk_budget_pct", 0.03))
+    lev = int(leverage)
+    stop_pct = max(0.0, float(stop_dist_pct))
+    if budget <= 0:
+        return True, lev, "no_budget_configured"
+
+    def risk_amt(lv: int) -> float:
+        return float(base_margin_usdt) * float(lv) * float(stop_pct)
+
+    if risk_amt(lev) <= budget:
+        return True, lev, f"risk_ok risk={risk_amt(lev):.2f}<=budget={budget:.2f}"
+    while lev > 1 and risk_amt(lev) > budget:
+        lev -= 1
+    if risk_amt(lev) <= budget:
+        return True, lev, f"risk_adjusted risk={risk_amt(lev):.2f}<=budget={budget:.2f}"
+    return False, lev, f"risk_reject risk={risk_amt(lev):.2f}>budget={budget:.2f}"
+
+
+def _both(equity, margin, lev, stop, risk_pct):
+    kw = dict(
+        equity_usdt=equity,
+        base_margin_usdt=margin,
+        leverage=lev,
+        stop_dist_pct=stop,
+        settings=SimpleNamespace(risk_budget_pct=risk_pct),
+    )
+    return enforce_risk_budget(**kw), _reference(**kw)
+
+
+@pytest.mark.parametrize(
+    "equity,margin,lev,stop,risk_pct",
+    list(
+        itertools.product(
+            [0.0, 50.0, 100.0, 1000.0, 12345.67],
+            [1.0, 10.0, 33.3, 100.0, 1000.0],
+            [1, 2, 3, 5, 10, 20, 50, 125],
+            [0.0, 0.001, 0.005, 0.01, 0.0123, 0.05, 0.1, 0.3],
+            [0.0, 0.01, 0.02, 0.03, 0.1],
+        )
+    ),
+)
+def test_matches_reference_grid(equity, margin, lev, stop, risk_pct):
+    got, want = _both(equity, margin, lev, stop, risk_pct)
+    assert got == want
+
+
+@pytest.mark.parametrize("k", [1, 2, 3, 7, 10, 49, 50, 124, 125])
+@pytest.mark.parametrize("stop", [0.01, 0.03, 0.07, 0.1])
+def test_exact_budget_boundaries(k, stop):
+    # 预算恰好等于 k 倍杠杆的风险（以及两侧相邻浮点值）：边界处向下取整/比较口径必须一致
+    margin, risk_pct = 100.0, 0.03
+    equity = margin * k * stop / risk_pct
+    for eq in (equity, equity * (1 - 1e-15), equity * (1 + 1e-15), equity - 0.01, equity + 0.01):
+        for lev in (1, k, k + 1, 125):
+            got, want = _both(eq, margin, lev, stop, risk_pct)
+            assert got == want
+
+
+def test_clamp_edges():
+    # 预算连 1 倍都不够：降到 1 后拒绝
+    ok, lev, note = enforce_risk_budget(
+        equity_usdt=10.0, base_margin_usdt=1000.0, leverage=20, stop_dist_pct=0.05,
+        settings=SimpleNamespace(risk_budget_pct=0.03),
+    )
+    assert (ok, lev) == (False, 1) and note.startswith("risk_reject")
+    # 预算足够：杠杆不会被抬高到输入之上
+    ok, lev, note = enforce_risk_budget(
+        equity_usdt=1e9, base_margin_usdt=100.0, leverage=5, stop_dist_pct=0.05,
+        settings=SimpleNamespace(risk_budget_pct=0.03),
+    )
+    assert (ok, lev) == (True, 5) and note.startswith("risk_ok")
+    # 无预算 / 止损距离为 0 / 非正杠杆：与原实现一致
+    for args in ((0.0, 100.0, 10, 0.05, 0.03), (1000.0, 100.0, 10, 0.0, 0.03), (1000.0, 100.0, 0, 0.05, 0.03),
+                 (1000.0, 100.0, -3, 0.05, 0.03), (1000.0, 100.0, 10, -0.05, 0.03)):
+        got, want = _both(*args)
+        assert got == want
+
+
+def test_matches_reference_random():
+    rng = random.Random(20261016)
+    for _ in range(20000):
+        got, want = _both(
+            rng.choice([rng.uniform(0, 1e5), round(rng.uniform(0, 1e4), 2)]),
+            rng.choice([rng.uniform(0.1, 5000), round(rng.uniform(1, 1000))]),
+            rng.randint(1, 125),
+            rng.choice([rng.uniform(0, 0.2), round(rng.uniform(0, 0.1), 4)]),
+            rng.choice([0.01, 0.02, 0.03, rng.uniform(0.001, 0.1)]),
+        )
+        assert got == want
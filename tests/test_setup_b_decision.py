@@ -0,0 +1,73 @@
+"""setup_b_decision(explain=False) 与 explain=True 的判定一致性测试。
+
+explain=False 在首个不满足的条件处即返回：(should_buy, reason_code) 必须与完整解释时相同，
+reason 为完整原因列表的第一条；满足时 reason 完全相同。
+"""
+
+from __future__ import annotations
+
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from services.strategy_engine.main import setup_b_decision
+
+SETTINGS = SimpleNamespace(setup_b_adx_min=20, setup_b_vol_ratio_min=1.5, setup_b_ai_score_min=55)
+
+GOOD = {"adx14": 25.0, "plus_di14": 30.0, "minus_di14": 15.0, "vol_ratio": 2.0, "mom10": 0.5, "squeeze_status": 0}
+GOOD_PREV = {"mom10": -0.2, "squeeze_status": 1}
+
+
+def _case(latest=None, prev=GOOD_PREV, ai=70.0, **overrides):
+    f = dict(GOOD if latest is None else latest)
+    f.update(overrides)
+    return f, prev, ai
+
+
+CASES = {
+    "all_pass": _case(),
+    "missing_adx": _case(adx14=None),
+    "missing_di": _case(minus_di14=None),
+    "adx_low": _case(adx14=10.0),
+    "di_inverted": _case(plus_di14=10.0),
+    "adx_low_and_di_inverted": _case(adx14=10.0, plus_di14=10.0),
+    "trend_fail_and_rest_fail": _case(adx14=10.0, vol_ratio=0.5, mom10=-1.0, squeeze_status=1, ai=10.0),
+    "no_prev": _case(prev=None),
+    "no_squeeze_release": _case(prev={"mom10": -0.2, "squeeze_status": 0}),
+    "still_squeezed": _case(squeeze_status=1),
+    "no_mom_flip": _case(prev={"mom10": 0.1, "squeeze_status": 1}),
+    "mom_not_positive": _case(mom10=0.0),
+    "missing_mom": _case(mom10=None),
+    "vol_low": _case(vol_ratio=1.0),
+    "vol_missing": _case(vol_ratio=None),
+    "ai_low": _case(ai=40.0),
+    "everything_after_trend_fails": _case(prev=None, vol_ratio=0.1, ai=0.0),
+    "non_numeric_feature": _case(adx14="n/a"),
+    "empty_features": ({}, None, 70.0),
+}
+
+
+@pytest.mark.parametrize("as_json", [False, True], ids=["dict", "json"])
+@pytest.mark.parametrize("name", list(CASES))
+def test_explain_flag_does_not_change_decision(name, as_json):
+    features, prev_features, ai = CASES[name]
+    enc = json.dumps if as_json else (lambda d: d)
+    latest = {"features_json": enc(features)}
+    prev = {"features_json": enc(prev_features)} if prev_features is not None else None
+
+    full = setup_b_decision(latest, prev, ai_score=ai, settings=SETTINGS, explain=True)
+    fast = setup_b_decision(latest, prev, ai_score=ai, settings=SETTINGS, explain=False)
+
+    assert fast[:2] == full[:2]
+    if full[0]:
+        assert fast[2] == full[2]
+    else:
+        first = full[2].split(": ", 1)[1].split(", ")[0]
+        assert fast[2] == "SetupB未满足: " + first
+
+
+def test_all_pass_buys():
+    features, prev_features, ai = CASES["all_pass"]
+    ok, _, _ = setup_b_decision({"features_json": features}, {"features_json": prev_features}, ai_score=ai, settings=SETTINGS, explain=False)
+    assert ok
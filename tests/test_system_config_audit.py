@@ -0,0 +1,86 @@
+"""system_config 写入 + config_audit 旧值捕获的集成测试（需要真实 MariaDB，已执行 migrations）。
+
+write_system_config 通过 UPSERT 中的会话变量 @cfg_old 捕获被覆盖的旧值，
+这依赖 MariaDB 对 VALUES / ON DUPLICATE KEY UPDATE 中赋值表达式的求值顺序，这里用真实库锁定该行为。
+
+设置 TEST_DB_HOST（以及 DB_PORT/DB_USER/DB_PASS/DB_NAME，与服务同名）后运行：
+    TEST_DB_HOST=127.0.0.1 python -m pytest -q tests/test_system_config_audit.py
+"""
+
+from __future__ import annotations
+
+import os
+import uuid
+
+import pytest
+
+pytest.importorskip("pymysql")
+
+if not os.getenv("TEST_DB_HOST"):
+    pytest.skip("TEST_DB_HOST not set (needs a migrated MariaDB)", allow_module_level=True)
+
+from shared.db import MariaDB  # noqa: E402
+from shared.domain.system_config import get_system_config, write_system_config  # noqa: E402
+
+
+@pytest.fixture(params=[False, True], ids=["per-statement", "multi-statements"])
+def db(request):
+    return MariaDB(
+        os.environ["TEST_DB_HOST"],
+        int(os.getenv("DB_PORT", "3306")),
+        os.getenv("DB_USER", "alpha"),
+        os.getenv("DB_PASS", "alpha_pass"),
+        os.getenv("DB_NAME", "alpha_sniper"),
+        multi_statements=request.param,
+    )
+
+
+@pytest.fixture
+def cfg_key(db):
+    key = f"TEST_CFG_{uuid.uuid4().hex[:12]}"
+    yield key
+    db.execute("DELETE FROM system_config WHERE `key`=%s", (key,))
+    db.execute("DELETE FROM config_audit WHERE cfg_key=%s", (key,))
+
+
+def _write(db: MariaDB, key: str, value: str) -> None:
+    write_system_config(
+        db,
+        actor="pytest",
+        key=key,
+        value=value,
+        trace_id=f"test-{uuid.uuid4().hex[:12]}",
+        reason_code="TEST",
+        reason="system_config audit integration test",
+    )
+
+
+def _audit_rows(db: MariaDB, key: str):
+    return db.fetch_all(
+        "SELECT old_value, new_value FROM config_audit WHERE cfg_key=%s ORDER BY id ASC",
+        (key,),
+    )
+
+
+def test_insert_then_update_records_old_value(db, cfg_key):
+    _write(db, cfg_key, "a")
+    _write(db, cfg_key, "b")
+    _write(db, cfg_key, "c")
+
+    assert get_system_config(db, cfg_key) == "c"
+    rows = _audit_rows(db, cfg_key)
+    assert [(r["old_value"], r["new_value"]) for r in rows] == [(None, "a"), ("a", "b"), ("b", "c")]
+
+
+def test_stale_cfg_old_does_not_leak_into_insert(db, cfg_key):
+    # 同一会话里先覆盖别的 key（@cfg_old 非 NULL），再插入新 key：新插入的 old_value 必须是 NULL
+    other = f"{cfg_key}_X"
+    try:
+        with db.session():
+            _write(db, other, "x1")
+            _write(db, other, "x2")
+            _write(db, cfg_key, "new")
+        assert [(r["old_value"], r["new_value"]) for r in _audit_rows(db, cfg_key)] == [(None, "new")]
+    finally:
+        db.execute("DELETE FROM system_config WHERE `key`=%s", (other,))
+        db.execute("DELETE FROM config_audit WHERE cfg_key=%s", (other,))
@@ -0,0 +1,88 @@
+"""Telegram JSON 摘要的超长切分：每段转义后不超限、不切断 HTML 实体、超长单行硬切。"""
+
+from __future__ import annotations
+
+import html
+import json
+import re
+
+import pytest
+
+from shared.telemetry import telegram as tg
+
+_ENTITY = re.compile(r"&(?:amp|lt|gt);")
+
+
+def _assert_well_formed(chunks, text, budget):
+    assert chunks
+    for c in chunks:
+        assert len(c) <= budget
+        # 去掉完整实体后不应再有 & < >：否则说明某个实体被切断或有未转义字符
+        assert not re.search(r"[&<>]", _ENTITY.sub("", c))
+        # 每段可单独还原（实体没有跨段）
+        assert html.escape(html.unescape(c), quote=False) == c
+    assert "".join(html.unescape(c) for c in chunks) == text
+
+
+@pytest.mark.parametrize("budget", [5, 6, 7, 10, 64, 3400])
+def test_oversize_single_line_is_hard_split(budget):
+    text = "&<>" * 3000 + "tail"
+    chunks = tg.Telegram._escaped_chunks(text, budget)
+    assert len(chunks) > 1
+    _assert_well_formed(chunks, text, budget)
+
+
+@pytest.mark.parametrize("offset", range(0, 6))
+def test_entity_never_split_at_boundary(offset):
+    # 让 & 落在每个可能的切分位置附近
+    budget = 50
+    line = "x" * (budget - offset) + "&" * 40 + "y" * 30
+    text = "\n".join([line, "a&b", line]) + "\n"
+    chunks = tg.Telegram._escaped_chunks(text, budget)
+    _assert_well_formed(chunks, text, budget)
+
+
+def test_lines_are_kept_whole_when_they_fit():
+    text = "".join(f'  "k{i}": "v&{i}",\n' for i in range(200))
+    budget = 120
+    chunks = tg.Telegram._escaped_chunks(text, budget)
+    _assert_well_formed(chunks, text, budget)
+    for c in chunks:
+        assert c.endswith("\n")
+
+
+class _Capture(tg.Telegram):
+    def __init__(self):
+        super().__init__("T", "A")
+        self.sent = []
+
+    def _enqueue(self, text, parse_mode):
+        self.sent.append((text, parse_mode))
+        return True
+
+
+@pytest.mark.parametrize(
+    "payload",
+    [
+        {"blob": "&" * 20000},
+        {"blob": "<tag>" * 5000, "n": list(range(500))},
+        {f"k{i}": "a&b<c>" * 20 for i in range(300)},
+    ],
+    ids=["one-long-line-of-entities", "long-line-plus-many-lines", "many-lines"],
+)
+def test_send_alert_json_messages_are_valid(payload):
+    bot = _Capture()
+    bot._send_alert_text("title", payload, 2)
+    text_msgs = [t for t, pm in bot.sent if pm is None]
+    html_msgs = [t for t, pm in bot.sent if pm == "HTML"]
+    assert text_msgs == ["title"]
+    assert len(html_msgs) > 1
+    body = []
+    for i, m in enumerate(html_msgs):
+        assert len(m) <= tg._MAX_MESSAGE_LEN
+        head = tg._JSON_HEAD if i == 0 else tg._PRE_HEAD
+        assert m.startswith(head) and m.endswith(tg._PRE_TAIL)
+        inner = m[len(head):-len(tg._PRE_TAIL)]
+        assert not re.search(r"[&<>]", _ENTITY.sub("", inner))
+        body.append(html.unescape(inner))
+    assert json.loads("".join(body)) == payload
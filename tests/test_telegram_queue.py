@@ -0,0 +1,152 @@
+"""Telegram 发送队列：_coalesce 合并规则与 flush() 行为（不访问网络，httpx.Client 用假对象替换）。"""
+
+from __future__ import annotations
+
+import queue
+import threading
+import time
+from urllib.parse import parse_qs
+
+import pytest
+
+from shared.telemetry import telegram as tg
+
+URL = "https://api.telegram.org/botT/sendMessage"
+CHAT_A = b"chat_id=A&disable_web_page_preview=true"
+CHAT_B = b"chat_id=B&disable_web_page_preview=true"
+
+
+def _item(text, parse_mode=None, prefix=CHAT_A):
+    return (URL, prefix, text, parse_mode, 5.0)
+
+
+@pytest.fixture
+def q(monkeypatch):
+    fresh = queue.Queue()
+    monkeypatch.setattr(tg, "_send_q", fresh)
+    return fresh
+
+
+def test_merges_same_target_and_parse_mode(q):
+    q.put(_item("b"))
+    q.put(_item("c"))
+    merged, n, held = tg._coalesce(_item("a"))
+    assert merged == _item("a" + tg._COALESCE_SEP + "b" + tg._COALESCE_SEP + "c")
+    assert (n, held) == (3, None)
+    assert q.empty()
+
+
+def test_different_parse_mode_is_held_not_merged(q):
+    html = _item("<pre>{}</pre>", "HTML")
+    q.put(html)
+    q.put(_item("later"))
+    merged, n, held = tg._coalesce(_item("plain"))
+    assert (merged, n, held) == (_item("plain"), 1, html)
+    # 之后的消息留在队列里，不跨过 held 合并（保持顺序）
+    assert q.get_nowait() == _item("later")
+
+
+def test_html_and_plain_never_join(q):
+    q.put(_item("plain"))
+    merged, n, held = tg._coalesce(_item("<b>JSON 摘要</b>\n<pre>{}</pre>", "HTML"))
+    assert merged[3] == "HTML" and "plain" not in merged[2]
+    assert held == _item("plain")
+
+
+def test_html_parts_merge_into_balanced_pre_blocks(q):
+    q.put(_item("<pre>2</pre>", "HTML"))
+    merged, n, _ = tg._coalesce(_item("<b>JSON 摘要</b>\n<pre>1</pre>", "HTML"))
+    assert n == 2
+    assert merged[2].count("<pre>") == merged[2].count("</pre>") == 2
+
+
+def test_different_chat_is_held(q):
+    other = _item("x", prefix=CHAT_B)
+    q.put(other)
+    merged, n, held = tg._coalesce(_item("y"))
+    assert (n, held) == (1, other)
+
+
+def test_size_limit(q):
+    sep = len(tg._COALESCE_SEP)
+    first = "a" * 2000
+    fits = "b" * (tg._MAX_MESSAGE_LEN - len(first) - sep)
+    q.put(_item(fits))
+    q.put(_item("c"))
+    merged, n, held = tg._coalesce(_item(first))
+    assert len(merged[2]) == tg._MAX_MESSAGE_LEN < 4096
+    assert (n, held) == (2, _item("c"))
+
+
+def test_held_item_starts_the_next_batch(q):
+    q.put(_item("h", "HTML"))
+    q.put(_item("h2", "HTML"))
+    _, n1, held = tg._coalesce(_item("p"))
+    merged, n2, held2 = tg._coalesce(held)
+    assert (n1, n2, held2) == (1, 2, None)
+    assert merged == _item("h" + tg._COALESCE_SEP + "h2", "HTML")
+
+
+class _FakeClient:
+    def __init__(self, fail_first=0):
+        self.posts = []
+        self.fail_first = fail_first
+        self.lock = threading.Lock()
+
+    def post(self, url, *, content, headers, timeout):
+        with self.lock:
+            if self.fail_first > 0:
+                self.fail_first -= 1
+                raise RuntimeError("boom")
+            form = parse_qs(content.decode("utf-8"))
+            self.posts.append((form["text"][0], form.get("parse_mode", [None])[0]))
+
+
+@pytest.fixture
+def worker(q, monkeypatch):
+    """每个测试一个新队列 + 新 worker；client 换成假对象。"""
+
+    def start(client):
+        monkeypatch.setattr(tg, "_client", client)
+        monkeypatch.setattr(tg, "_worker", None)
+        tg._ensure_worker()
+
+    return start
+
+
+def test_flush_waits_until_sent(q, worker):
+    client = _FakeClient()
+    bot = tg.Telegram("T", "A")
+    worker(client)
+    for i in range(5):
+        bot.send_text(f"m{i}")
+    assert tg.flush(2.0)
+    texts = tg._COALESCE_SEP.join(t for t, _ in client.posts)
+    assert [f"m{i}" for i in range(5)] == texts.split(tg._COALESCE_SEP)
+    assert q.unfinished_tasks == 0
+
+
+def test_send_error_keeps_worker_and_held_item(q, worker):
+    client = _FakeClient(fail_first=1)
+    # worker 启动前先入队：第一批（纯文本）发送失败，已取出的 HTML 消息必须照常发出
+    q.put(_item("plain"))
+    q.put(_item("<pre>1</pre>", "HTML"))
+    t0 = time.monotonic()
+    worker(client)
+    assert tg.flush(2.0)
+    assert time.monotonic() - t0 < 1.0
+    assert client.posts == [("<pre>1</pre>", "HTML")]
+    assert tg._worker.is_alive()
+    q.put(_item("after"))
+    assert tg.flush(2.0)
+    assert client.posts[-1] == ("after", None)
+
+
+def test_flush_times_out_without_worker(q):
+    q.put(_item("stuck"))
+    t0 = time.monotonic()
+    assert tg.flush(0.1) is False
+    assert time.monotonic() - t0 < 0.5
+    q.get_nowait()
+    q.task_done()
+    assert tg.flush(0.1) is True
@@ -8,34 +8,88 @@ alpha-admin（管理小工具）
 - e2e-test：实盘闭环（BUY->SELL）并校验 SELL 的 pnl_usdt（交易所结算口径）
 
 修复：
-1) market_data_cache 表结构不一致：
-   - 不强依赖 close_time_ms
-   - SQL 用 SELECT * 避免 Unknown column
-   - age_seconds 优先 close_time_ms；否则 open_time_ms + interval 推算
+1) market_data_cache 新鲜度：
+   - close_time_ms 为生成列（migrations/0014，open_time_ms + interval）
+   - age_seconds 由 DB 按 NOW(3) 计算
 
 2) config_audit 字段名按现有表：
    - INSERT config_audit(actor, action, cfg_key, old_value, new_value, trace_id, reason_code, reason)
 
 3) JSON 序列化：
    - report/payload 里可能有 Decimal / datetime
-   - 所有 json.dumps 都带 default=_json_default
+   - 所有 JSON 输出统一走 _dump（default=_json_default）
 """
 
 import argparse
 import datetime
+import functools
 import json
+import os
 import sys
 import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from decimal import Decimal
-from typing import Any, Dict, List, Optional, Tuple
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, NamedTuple, Optional, Tuple
 
 from shared.config import Settings, load_settings
-from shared.db import MariaDB
-from shared.exchange import make_exchange
-from shared.logging import new_trace_id
-from shared.redis import redis_client
-from shared.telemetry import Telegram, build_system_summary, send_system_alert, log_action
-from shared.domain.control_commands import write_control_command
+from shared.domain.system_config import get_system_config, get_system_configs, write_system_config
+from shared.logging import get_logger, new_trace_id
+
+# DB / Redis / 交易所 / Telegram 等较重的依赖按子命令延迟导入：--help、参数错误不会加载它们
+if TYPE_CHECKING:
+    import redis
+
+    from shared.db import MariaDB
+    from shared.exchange import OrderResult
+    from shared.telemetry import Telegram
+
+logger = get_logger("admin-cli", os.getenv("LOG_LEVEL", "INFO"))
+
+
+@functools.lru_cache(maxsize=1)
+def _get_settings() -> Settings:
+    """load_settings 会读 .env 并解析全部环境变量；同一进程内只做一次。"""
+    return load_settings()
+
+
+@functools.lru_cache(maxsize=None)
+def _get_db(settings: Settings) -> "MariaDB":
+    from shared.db import MariaDB
+
+    return MariaDB(
+        host=settings.db_host,
+        port=settings.db_port,
+        user=settings.db_user,
+        password=settings.db_pass,
+        db=settings.db_name,
+        # write_system_config 的 UPSERT + 审计合并为一次发送
+        multi_statements=True,
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def _get_telegram(settings: Settings) -> "Telegram":
+    from shared.telemetry import Telegram
+
+    return Telegram(settings.telegram_bot_token, settings.telegram_chat_id)
+
+
+@functools.lru_cache(maxsize=None)
+def _get_redis(settings: Settings) -> "redis.Redis":
+    """redis.Redis 自带连接池：同一进程（smoke / e2e 前置检查 / status）共用一个客户端。"""
+    from shared.redis import redis_client
+
+    return redis_client(settings.redis_url)
+
+
+@dataclass(frozen=True, slots=True)
+class AdminCtx:
+    """一次 CLI 调用的审计上下文：actor / trace_id / reason 写入审计、告警与日志。"""
+    actor: str
+    trace_id: str
+    reason_code: str = ""
+    reason: str = ""
 
 
 # -----------------------------
@@ -52,50 +106,19 @@ def _json_default(o: Any) -> Any:
     return str(o)
 
 
-# -----------------------------
-# DB 工具：system_config 写入（带审计）
-# -----------------------------
-
-def write_system_config(
-        db: MariaDB,
-        *,
-        actor: str,
-        key: str,
-        value: str,
-        trace_id: str,
-        reason_code: str,
-        reason: str,
-) -> None:
-    """写 system_config，并记录 config_audit（用于审计/回溯）。"""
-    old = db.fetch_one("SELECT `value` FROM system_config WHERE `key`=%s", (key,))
-    old_val = old["value"] if old else None
-
-    db.execute(
-        """
-        INSERT INTO system_config(`key`, `value`)
-        VALUES (%s, %s) ON DUPLICATE KEY
-        UPDATE `value`=
-        VALUES (`value`)
-        """,
-        (key, value),
-    )
+def _dump(obj: Any) -> str:
+    """报告/载荷统一序列化（2 空格缩进，不转义非 ASCII）。"""
+    return json.dumps(obj, ensure_ascii=False, indent=2, default=_json_default)
 
-    # ✅ 匹配现有表结构
-    db.execute(
-        """
-        INSERT INTO config_audit(actor, action, cfg_key, old_value, new_value, trace_id, reason_code, reason)
-        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-        """,
-        (actor, "SET", key, old_val, value, trace_id, reason_code, reason),
-    )
 
+def _report_envelope(report_json: str, **extra: Any) -> str:
+    """Telegram 告警载荷 {"report": report, **extra}，直接嵌入已序列化的 report_json（report 不再编码第二遍）。
 
-def read_system_config(db: MariaDB, key: str, default: str = "") -> str:
-    row = db.fetch_one("SELECT `value` FROM system_config WHERE `key`=%s", (key,))
-    if not row:
-        return default
-    v = row.get("value")
-    return str(v) if v is not None else default
+    _dump 的输出里字符串值不含裸换行（json 转义为 \\n），整体多缩进两格即可嵌入。
+    """
+    parts = ['{\n  "report": ' + report_json.replace("\n", "\n  ")]
+    parts.extend(f"  {_dump(k)}: " + _dump(v).replace("\n", "\n  ") for k, v in extra.items())
+    return ",\n".join(parts) + "\n}"
 
 
 # -----------------------------
@@ -107,13 +130,6 @@ def expected_reason_code(got: str, expected: str) -> None:
         raise SystemExit(f"ERROR: --reason-code must be '{expected}' (got '{got}')")
 
 
-def _dict_row(row: Any) -> Dict[str, Any]:
-    try:
-        return dict(row)
-    except Exception:
-        return {}
-
-
 def require_confirm_cli(settings: Settings, confirm_code: str | None) -> None:
     if not getattr(settings, "admin_confirm_required", False):
         return
@@ -123,29 +139,18 @@ def require_confirm_cli(settings: Settings, confirm_code: str | None) -> None:
         raise SystemExit("confirm_code required (ADMIN_CONFIRM_REQUIRED=true)")
 
 
-def _calc_cache_age_seconds(row: Dict[str, Any], interval_minutes: int) -> Optional[int]:
+# 取最新 1 行的 open_time_ms / close_time_ms 及 age_seconds（close_time_ms 为生成列，需要 migrations/0014）。
+# 不加索引提示：有 migrations/0013 的 idx_mdc_sym_iv_fv_ot 时优化器会自行选用（等值前缀 + ORDER BY ... LIMIT 1），没有该索引时也照常可用。
+# age_seconds 由服务端按 NOW(3) 计算（不受客户端与 DB 时钟偏差影响）
+_MARKET_CACHE_SELECT_SQL = """
+    SELECT open_time_ms, close_time_ms,
+           CAST(FLOOR((UNIX_TIMESTAMP(NOW(3)) * 1000 - close_time_ms) / 1000) AS SIGNED) AS age_seconds
+    FROM market_data_cache
+    WHERE symbol = %s
+      AND interval_minutes = %s
+      AND feature_version = %s
+    ORDER BY open_time_ms DESC LIMIT 1
     """
-    计算 cache 最新记录的“年龄（秒）”
-    - 优先 close_time_ms
-    - 否则用 open_time_ms + interval 推算 close_time_ms
-    """
-    now_ms = int(time.time() * 1000)
-
-    close_ms = row.get("close_time_ms")
-    if close_ms is not None:
-        try:
-            return int((now_ms - int(close_ms)) / 1000)
-        except Exception:
-            pass
-
-    open_ms = row.get("open_time_ms")
-    if open_ms is None:
-        return None
-    try:
-        close_ms2 = int(open_ms) + int(interval_minutes) * 60 * 1000
-        return int((now_ms - close_ms2) / 1000)
-    except Exception:
-        return None
 
 
 def _wait_for_market_cache(
@@ -156,47 +161,86 @@ def _wait_for_market_cache(
         feature_version: int,
         wait_seconds: int,
         max_age_seconds: int,
+        r: Optional["redis.Redis"] = None,
 ) -> Tuple[bool, Dict[str, Any]]:
     """
     等待 market_data_cache 有最新数据。
 
-    兼容不同表结构：
-    - SELECT * 避免字段差异导致 1054
-    - age_seconds 不强依赖 close_time_ms
+    age_seconds 由服务端计算，见 _MARKET_CACHE_SELECT_SQL（需要 migrations/0014）。
+
+    不新鲜时：有 Redis 则订阅等待 data-syncer 的写入通知（只读列表头不消费，多个等待方都会被唤醒）；
+    否则/Redis 出错时退回指数退避轮询（0.1s 起，×1.5，最长 1s）。
+    截止时间用 monotonic 计算，不受系统时钟调整影响。
     """
-    deadline = time.time() + wait_seconds
+    deadline = time.monotonic() + wait_seconds
     last_row: Optional[Dict[str, Any]] = None
+    last_pushed: Optional[int] = None
+    backoff = 0.1
+    params = (symbol, interval_minutes, int(feature_version))
 
-    while time.time() < deadline:
-        row = db.fetch_one(
-            """
-            SELECT *
-            FROM market_data_cache
-            WHERE symbol = %s
-              AND interval_minutes = %s
-              AND feature_version = %s
-            ORDER BY open_time_ms DESC LIMIT 1
-            """,
-            (symbol, interval_minutes, int(feature_version)),
-        )
+    while True:
+        row = db.fetch_one(_MARKET_CACHE_SELECT_SQL, params)
 
         if row:
-            last_row = _dict_row(row)
-            age_sec = _calc_cache_age_seconds(last_row, interval_minutes)
-            last_row["age_seconds"] = age_sec
-
+            last_row = row
+            age_sec = row.get("age_seconds")
             if age_sec is not None and age_sec <= max_age_seconds:
                 return True, last_row
 
-        time.sleep(1.0)
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+
+        if r is not None:
+            from shared.redis import wait_cache_fresh
+
+            # 只读通知列表头、不消费（其它等待方同样被唤醒）：不比已见过的 open_time_ms 新的推送不再为它查库
+            last_ot = int(last_row["open_time_ms"]) if last_row and last_row.get("open_time_ms") is not None else None
+            seen = [v for v in (last_ot, last_pushed) if v is not None]
+            try:
+                pushed = wait_cache_fresh(
+                    r,
+                    symbol=symbol,
+                    interval_minutes=interval_minutes,
+                    feature_version=int(feature_version),
+                    timeout_seconds=remaining,
+                    after=max(seen) if seen else None,
+                )
+                if pushed is not None:
+                    last_pushed = pushed
+                continue
+            except Exception:
+                r = None
+
+        time.sleep(min(backoff, remaining))
+        backoff = min(backoff * 1.5, 1.0)
 
     return False, (last_row or {})
 
 
-def run_smoke_test(settings: Settings, *, wait_seconds: int, max_age_seconds: int) -> int:
-    """执行链路自检。返回进程退出码：0=通过，2=失败。"""
-    trace_id = new_trace_id("smoke")
-    telegram = Telegram(settings.telegram_bot_token, settings.telegram_chat_id)
+def run_smoke_test(
+        settings: Settings,
+        ctx: AdminCtx,
+        *,
+        wait_seconds: int,
+        max_age_seconds: int,
+        telegram: Optional["Telegram"] = None,
+        db: Optional[MariaDB] = None,
+        r: Optional["redis.Redis"] = None,
+        notify: bool = True,
+        flags_out: Optional[Dict[str, str]] = None,
+) -> int:
+    """执行链路自检。返回进程退出码：0=通过，2=失败。
+
+    telegram/db/r 可由调用方（e2e-test）传入复用，未传则取进程内缓存实例。
+    notify=False（作为前置检查）时通过不发 Telegram，只在失败时告警。
+    flags_out：传入 dict 时填入本次读到的 HALT_TRADING / EMERGENCY_EXIT，调用方无需再查一次。
+    """
+    from shared.telemetry import build_system_summary, log_action, send_system_alert
+
+    trace_id = ctx.trace_id
+    if telegram is None:
+        telegram = _get_telegram(settings)
 
     report: Dict[str, Any] = {
         "trace_id": trace_id,
@@ -207,30 +251,43 @@ def run_smoke_test(settings: Settings, *, wait_seconds: int, max_age_seconds: in
         "checks": {},
     }
 
-    db = MariaDB(
-        host=settings.db_host,
-        port=settings.db_port,
-        user=settings.db_user,
-        password=settings.db_pass,
-        db=settings.db_name,
-    )
+    if db is None:
+        db = _get_db(settings)
 
-    # 1) DB
-    try:
-        report["checks"]["db_ping"] = bool(db.ping())
-    except Exception as e:
-        report["checks"]["db_ping"] = False
-        report["checks"]["db_error"] = str(e)
+    checks = report["checks"]
+    redis_error: Optional[str] = None
+    if r is None:
+        try:
+            r = _get_redis(settings)
+        except Exception as e:
+            redis_error = str(e)
 
-    # 2) Redis
-    try:
-        r = redis_client(settings.redis_url)
-        report["checks"]["redis_ping"] = bool(r.ping())
-    except Exception as e:
-        report["checks"]["redis_ping"] = False
-        report["checks"]["redis_error"] = str(e)
+    # 2) Redis ping 在后台线程里跑；1) DB ping 与 4) 开关读取走当前线程的 session 连接（同 status）
+    flags: Optional[Dict[str, str]] = None
+    flags_error: Optional[str] = None
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        f_redis = pool.submit(r.ping) if r is not None else None
+        try:
+            checks["db_ping"] = bool(db.ping())
+        except Exception as e:
+            checks["db_ping"] = False
+            checks["db_error"] = str(e)
+        try:
+            flags = get_system_configs(db, {"HALT_TRADING": "false", "EMERGENCY_EXIT": "false"})
+        except Exception as e:
+            flags_error = str(e)
 
-    # 3) 行情缓存
+        if f_redis is not None:
+            try:
+                checks["redis_ping"] = bool(f_redis.result())
+            except Exception as e:
+                redis_error = str(e)
+        if redis_error is not None:
+            r = None
+            checks["redis_ping"] = False
+            checks["redis_error"] = redis_error
+
+    # 3) 行情缓存（依赖 Redis 结果决定订阅通知或轮询，放在 ping 之后）
     try:
         ok, last = _wait_for_market_cache(
             db,
@@ -239,19 +296,24 @@ def run_smoke_test(settings: Settings, *, wait_seconds: int, max_age_seconds: in
             feature_version=int(getattr(settings, 'feature_version', 1)),
             wait_seconds=wait_seconds,
             max_age_seconds=max_age_seconds,
+            r=r,
         )
-        report["checks"]["market_cache_ok"] = ok
-        report["checks"]["market_cache_last"] = last
+        checks["market_cache_ok"] = ok
+        checks["market_cache_last"] = last
+        # 服务端按 NOW(3) 算出的缓存年龄（见 _MARKET_CACHE_SELECT_SQL）
+        checks["market_cache_age_seconds"] = last.get("age_seconds")
     except Exception as e:
-        report["checks"]["market_cache_ok"] = False
-        report["checks"]["market_cache_error"] = str(e)
+        checks["market_cache_ok"] = False
+        checks["market_cache_error"] = str(e)
 
     # 4) 管理开关（只读）
-    try:
-        report["checks"]["halt_trading"] = read_system_config(db, "HALT_TRADING", "false")
-        report["checks"]["emergency_exit"] = read_system_config(db, "EMERGENCY_EXIT", "false")
-    except Exception as e:
-        report["checks"]["flags_error"] = str(e)
+    if flags is not None:
+        checks["halt_trading"] = flags["HALT_TRADING"]
+        checks["emergency_exit"] = flags["EMERGENCY_EXIT"]
+        if flags_out is not None:
+            flags_out.update(flags)
+    else:
+        checks["flags_error"] = flags_error
 
     passed = (
             report["checks"].get("db_ping") is True
@@ -259,14 +321,19 @@ def run_smoke_test(settings: Settings, *, wait_seconds: int, max_age_seconds: in
             and report["checks"].get("market_cache_ok") is True
     )
 
+    # ✅ 修复：print 的 JSON 也要支持 Decimal/datetime
+    # 先输出报告；Telegram 只入队由后台线程发送（进程退出前最多等 telegram.flush 的超时）
+    report_json = _dump(report)
+    print(report_json, flush=True)
+
     # Telegram：中文文本 + JSON 摘要（send_alert_zh 内部已兜底 datetime/Decimal）
-    if telegram.enabled():
+    if telegram.enabled() and (notify or not passed):
         last = report["checks"].get("market_cache_last") or {}
         summary_kv = build_system_summary(
             event="SMOKE_TEST",
             trace_id=trace_id,
             level="INFO" if passed else "ERROR",
-            actor=args.by,
+            actor=ctx.actor,
             exchange=settings.exchange,
             extra={
                 "symbol": settings.symbol,
@@ -282,6 +349,7 @@ def run_smoke_test(settings: Settings, *, wait_seconds: int, max_age_seconds: in
             title="✅ Smoke Test 通过" if passed else "❌ Smoke Test 失败",
             summary_kv=summary_kv,
             payload={"report": report},
+            payload_json=_report_envelope(report_json),
         )
         log_action(
             logger,
@@ -292,9 +360,6 @@ def run_smoke_test(settings: Settings, *, wait_seconds: int, max_age_seconds: in
             client_order_id=None,
             extra={"checks": report.get("checks")},
         )
-
-    # ✅ 修复：print 的 json.dumps 也要支持 Decimal/datetime
-    print(json.dumps(report, ensure_ascii=False, indent=2, default=_json_default))
     return 0 if passed else 2
 
 
@@ -302,8 +367,22 @@ def run_smoke_test(settings: Settings, *, wait_seconds: int, max_age_seconds: in
 # E2E Trade Test：实盘闭环（真实下单）
 # -----------------------------
 
+def _order_report(client_order_id: str, res: OrderResult) -> Dict[str, Any]:
+    """报告里的订单摘要（不含 raw：交易所原始响应体积大，且已落 order_events）。"""
+    return {
+        "client_order_id": client_order_id,
+        "exchange_order_id": res.exchange_order_id,
+        "status": res.status,
+        "filled_qty": res.filled_qty,
+        "avg_price": res.avg_price,
+        "fee_usdt": res.fee_usdt,
+        "pnl_usdt": res.pnl_usdt,
+    }
+
+
 def run_e2e_trade_test(
         settings: Settings,
+        ctx: AdminCtx,
         *,
         yes: bool,
         qty: Optional[float],
@@ -313,9 +392,11 @@ def run_e2e_trade_test(
         sleep_after_entry: float,
         restore_halt: bool,
 ) -> int:
-    """实盘闭环测试：BUY -> SELL -> 校验 SELL 的 pnl_usdt（交易所结算口径，含手续费影响）。"""
-    trace_id = new_trace_id("e2e")
-    telegram = Telegram(settings.telegram_bot_token, settings.telegram_chat_id)
+    """实盘闭环测试：BUY -> SELL -> 校验 SELL 的 pnl_usdt（交易所结算口径，含手续费影响）。
+
+    ctx 提供审计 actor / trace_id / reason；前置 smoke 与本次下单共用同一 trace_id。
+    """
+    trace_id = ctx.trace_id
 
     ex = settings.exchange.lower()
     if ex not in ("binance", "bybit", "paper"):
@@ -336,31 +417,42 @@ def run_e2e_trade_test(
         print("[E2E] qty 无效，请通过 --qty 指定一个满足交易所最小下单量的值。", file=sys.stderr)
         return 2
 
+    # Telegram / DB 只构造一次，smoke 与后续下单共用
+    telegram = _get_telegram(settings)
+    db = _get_db(settings)
+
     # 1) 先跑 smoke：保证 DB/Redis/行情缓存 OK
-    smoke_rc = run_smoke_test(settings, wait_seconds=wait_seconds, max_age_seconds=max_age_seconds)
+    smoke_flags: Dict[str, str] = {}
+    smoke_rc = run_smoke_test(
+        settings,
+        ctx,
+        wait_seconds=wait_seconds,
+        max_age_seconds=max_age_seconds,
+        telegram=telegram,
+        db=db,
+        notify=False,
+        flags_out=smoke_flags,
+    )
     if smoke_rc != 0:
         print("[E2E] smoke-test 未通过，终止 e2e-test。", file=sys.stderr)
         return 2
 
-    db = MariaDB(
-        host=settings.db_host,
-        port=settings.db_port,
-        user=settings.db_user,
-        password=settings.db_pass,
-        db=settings.db_name,
-    )
+    # 参数校验通过后才加载交易所相关模块
+    from shared.exchange import make_exchange
+    from shared.telemetry import build_system_summary, log_action, send_system_alert
 
     # 2) 暂停策略引擎，避免策略同时下单影响测试
-    old_halt = read_system_config(db, "HALT_TRADING", "false")
+    # smoke 刚读过开关，直接复用（读取失败时再单独查）
+    old_halt = smoke_flags.get("HALT_TRADING") or get_system_config(db, "HALT_TRADING", "false")
     if ex != "paper":
         write_system_config(
             db,
-            actor=args.by,
+            actor=ctx.actor,
             key="HALT_TRADING",
             value="true",
             trace_id=trace_id,
-            reason_code="E2E_TEST",
-            reason="e2e-test: pause strategy engine during test",
+            reason_code=ctx.reason_code,
+            reason=ctx.reason,
         )
 
     report: Dict[str, Any] = {
@@ -378,31 +470,17 @@ def run_e2e_trade_test(
 
     try:
         buy = ex_client.place_market_order(symbol=sym, side="BUY", qty=q, client_order_id=client_buy)
-        report["results"]["buy"] = {
-            "client_order_id": client_buy,
-            "exchange_order_id": buy.exchange_order_id,
-            "status": buy.status,
-            "filled_qty": buy.filled_qty,
-            "avg_price": buy.avg_price,
-            "fee_usdt": buy.fee_usdt,
-            "pnl_usdt": buy.pnl_usdt,
-        }
+        report["results"]["buy"] = _order_report(client_buy, buy)
 
         time.sleep(max(0.0, float(sleep_after_entry)))
 
         sell = ex_client.place_market_order(symbol=sym, side="SELL", qty=q, client_order_id=client_sell)
-        report["results"]["sell"] = {
-            "client_order_id": client_sell,
-            "exchange_order_id": sell.exchange_order_id,
-            "status": sell.status,
-            "filled_qty": sell.filled_qty,
-            "avg_price": sell.avg_price,
-            "fee_usdt": sell.fee_usdt,
-            "pnl_usdt": sell.pnl_usdt,
-        }
+        report["results"]["sell"] = _order_report(client_sell, sell)
 
         pnl = sell.pnl_usdt
         ok = pnl is not None
+        # 报告只序列化一次：控制台输出与 Telegram JSON 摘要共用
+        report_json = _dump(report)
 
         if telegram.enabled():
             pnl_txt = "未知" if pnl is None else f"{pnl:.2f}"
@@ -411,7 +489,7 @@ def run_e2e_trade_test(
                 event="E2E_TRADE_TEST",
                 trace_id=trace_id,
                 level="INFO" if ok else "ERROR",
-                actor=args.by,
+                actor=ctx.actor,
                 exchange=settings.exchange,
                 extra={"symbol": sym, "qty": q, "pnl_usdt": pnl_txt, "fee_usdt": fee_txt, "ok": bool(ok)},
             )
@@ -420,21 +498,24 @@ def run_e2e_trade_test(
                 title="✅ E2E 实盘闭环测试通过" if ok else "❌ E2E 实盘闭环测试失败",
                 summary_kv=summary_kv,
                 payload={"report": report},
+                payload_json=_report_envelope(report_json),
             )
             log_action(logger, action="E2E_TRADE_TEST", trace_id=trace_id, reason_code="PASS" if ok else "FAIL",
                        reason="e2e ok" if ok else "e2e failed", client_order_id=None, extra={"symbol": sym})
 
-        print(json.dumps(report, ensure_ascii=False, indent=2, default=_json_default))
+        print(report_json)
         return 0 if ok else 2
 
     except Exception as e:
         report["error"] = str(e)
+        # report 已带 error：控制台与 Telegram 共用一次序列化结果
+        report_json = _dump(report)
         if telegram.enabled():
             summary_kv = build_system_summary(
                 event="E2E_TRADE_TEST_EXCEPTION",
                 trace_id=trace_id,
                 level="ERROR",
-                actor=args.by,
+                actor=ctx.actor,
                 exchange=settings.exchange,
                 reason=str(e),
             )
@@ -443,10 +524,11 @@ def run_e2e_trade_test(
                 title="❌ E2E 测试异常",
                 summary_kv=summary_kv,
                 payload={"report": report, "error": str(e)},
+                payload_json=_report_envelope(report_json, error=str(e)),
             )
             log_action(logger, action="E2E_TRADE_TEST_EXCEPTION", trace_id=trace_id, reason_code="ERROR",
                        reason=str(e)[:200], client_order_id=None)
-        print(json.dumps(report, ensure_ascii=False, indent=2, default=_json_default), file=sys.stderr)
+        print(report_json, file=sys.stderr)
         return 2
 
     finally:
@@ -454,11 +536,11 @@ def run_e2e_trade_test(
             try:
                 write_system_config(
                     db,
-                    actor=args.by,
+                    actor=ctx.actor,
                     key="HALT_TRADING",
                     value=str(old_halt),
                     trace_id=trace_id,
-                    reason_code="E2E_TEST",
+                    reason_code=ctx.reason_code,
                     reason="e2e-test: restore HALT_TRADING",
                 )
             except Exception:
@@ -469,297 +551,353 @@ def run_e2e_trade_test(
 # CLI
 # -----------------------------
 
-def main() -> None:
-    settings = load_settings()
+# 写操作子命令要求的 --reason-code（解析后、连库前统一校验）
+_REQUIRED_REASON_CODES: Dict[str, str] = {
+    "halt": "ADMIN_HALT",
+    "resume": "ADMIN_RESUME",
+    "emergency-exit": "EMERGENCY_EXIT",
+    "set": "ADMIN_UPDATE_CONFIG",
+}
+
+
+def _require_reason_code(args: argparse.Namespace) -> None:
+    expected = _REQUIRED_REASON_CODES.get(args.cmd)
+    if expected is not None:
+        expected_reason_code(args.reason_code, expected)
+
+
+def _add_actor_args(p: argparse.ArgumentParser, cmd: str) -> None:
+    p.add_argument("--by", required=True, help="操作者/来源（写入审计 actor）")
+    p.add_argument("--reason-code", dest="reason_code", required=True,
+                   help=f"原因代码（必须为 {_REQUIRED_REASON_CODES[cmd]}）")
+    p.add_argument("--reason", required=True, help="原因说明")
+
+
+def _build_status_parser(p: argparse.ArgumentParser) -> None:
+    p.add_argument("--max-age-seconds", type=int, default=120)
+    p.add_argument("--wait-seconds", type=int, default=30)
+
+
+def _build_halt_parser(p: argparse.ArgumentParser) -> None:
+    _add_actor_args(p, "halt")
+
+
+def _build_resume_parser(p: argparse.ArgumentParser) -> None:
+    _add_actor_args(p, "resume")
+
+
+def _build_exit_parser(p: argparse.ArgumentParser) -> None:
+    _add_actor_args(p, "emergency-exit")
+    p.add_argument("--confirm-code", dest="confirm_code", required=False,
+                   help="二次确认码（若启用 ADMIN_CONFIRM_REQUIRED）")
+
+
+def _build_set_parser(p: argparse.ArgumentParser) -> None:
+    p.add_argument("key", type=str, help="配置键")
+    p.add_argument("value", type=str, help="配置值")
+    _add_actor_args(p, "set")
+
+
+def _build_get_parser(p: argparse.ArgumentParser) -> None:
+    p.add_argument("key", type=str, help="配置键")
+
+
+def _build_list_parser(p: argparse.ArgumentParser) -> None:
+    p.add_argument("--prefix", type=str, default="", help="key 前缀过滤")
+    p.add_argument("--limit", type=int, default=200, help="最多返回条数")
+
+
+def _build_smoke_parser(p: argparse.ArgumentParser) -> None:
+    p.add_argument("--by", default="admin-cli", help="操作者/来源（写入告警 actor）")
+    p.add_argument("--wait-seconds", type=int, default=120)
+    p.add_argument("--max-age-seconds", type=int, default=120)
+
+
+def _build_e2e_parser(p: argparse.ArgumentParser) -> None:
+    p.add_argument("--yes", action="store_true")
+    p.add_argument("--by", default="admin-cli", help="操作者/来源（写入审计 actor）")
+    p.add_argument("--reason-code", dest="reason_code", default="E2E_TEST", help="原因代码（写入 HALT_TRADING 审计）")
+    p.add_argument("--reason", default="e2e-test: pause strategy engine during test", help="原因说明")
+    p.add_argument("--qty", type=float, default=None)
+    p.add_argument("--symbol", type=str, default=None)
+    p.add_argument("--wait-seconds", type=int, default=120)
+    p.add_argument("--max-age-seconds", type=int, default=120)
+    p.add_argument("--sleep-after-entry", type=float, default=0.5)
+    p.add_argument("--no-restore-halt", action="store_true")
+
+
+def _write_config_and_command(
+        db: MariaDB,
+        *,
+        actor: str,
+        key: str,
+        value: str,
+        trace_id: str,
+        reason_code: str,
+        reason: str,
+        command: str,
+        payload: Dict[str, Any],
+) -> None:
+    """配置 UPSERT + 审计 + 控制命令：同一事务、一次 multi-statement 发送（原先两个事务、三次往返）。"""
+    from shared.domain.control_commands import control_command_stmt
+    from shared.domain.system_config import system_config_write_stmts
+
+    stmts = system_config_write_stmts(
+        actor=actor, key=key, value=value, trace_id=trace_id, reason_code=reason_code, reason=reason
+    )
+    stmts.append(control_command_stmt(command=command, payload=payload))
+    db.execute_many_sql(stmts)
 
-    parser = argparse.ArgumentParser(prog="alpha-admin")
-    sub = parser.add_subparsers(dest="cmd", required=True)
 
-    p_status = sub.add_parser("status", help="查看系统状态（DB/Redis/缓存/开关）")
-    p_status.add_argument("--max-age-seconds", type=int, default=120)
-    p_status.add_argument("--wait-seconds", type=int, default=30)
-
-    p_halt = sub.add_parser("halt", help="暂停交易（写入 HALT_TRADING=true）")
-    p_halt.add_argument("--by", required=True, help="操作者/来源（写入审计 actor）")
-    p_halt.add_argument("--reason-code", dest="reason_code", required=True, help="原因代码（建议 ADMIN_HALT）")
-    p_halt.add_argument("--reason", required=True, help="原因说明")
-
-    p_resume = sub.add_parser("resume", help="恢复交易（写入 HALT_TRADING=false）")
-    p_resume.add_argument("--by", required=True, help="操作者/来源（写入审计 actor）")
-    p_resume.add_argument("--reason-code", dest="reason_code", required=True, help="原因代码（建议 ADMIN_RESUME）")
-    p_resume.add_argument("--reason", required=True, help="原因说明")
-
-    p_exit = sub.add_parser("emergency-exit", help="紧急退出（写入 EMERGENCY_EXIT=true）")
-    p_exit.add_argument("--by", required=True, help="操作者/来源（写入审计 actor）")
-    p_exit.add_argument("--reason-code", dest="reason_code", required=True, help="原因代码（建议 EMERGENCY_EXIT）")
-    p_exit.add_argument("--reason", required=True, help="原因说明")
-    p_exit.add_argument("--confirm-code", dest="confirm_code", required=False,
-                        help="二次确认码（若启用 ADMIN_CONFIRM_REQUIRED）")
-
-    p_set = sub.add_parser("set", help="写入 system_config（等价于 /admin/update_config）")
-    p_set.add_argument("key", type=str, help="配置键")
-    p_set.add_argument("value", type=str, help="配置值")
-    p_set.add_argument("--by", required=True, help="操作者/来源（写入审计 actor）")
-    p_set.add_argument("--reason-code", dest="reason_code", required=True, help="原因代码（建议 ADMIN_UPDATE_CONFIG）")
-    p_set.add_argument("--reason", required=True, help="原因说明")
-
-    p_get = sub.add_parser("get", help="读取 system_config 的值")
-    p_get.add_argument("key", type=str, help="配置键")
-
-    p_list = sub.add_parser("list", help="列出 system_config（可选 prefix 过滤）")
-    p_list.add_argument("--prefix", type=str, default="", help="key 前缀过滤")
-    p_list.add_argument("--limit", type=int, default=200, help="最多返回条数")
-
-    p_smoke = sub.add_parser("smoke-test", help="一键链路自检（不下单）：DB/Redis/行情缓存")
-    p_smoke.add_argument("--wait-seconds", type=int, default=120)
-    p_smoke.add_argument("--max-age-seconds", type=int, default=120)
-
-    p_e2e = sub.add_parser("e2e-test", help="一键实盘闭环：BUY->SELL->校验真实 pnl_usdt（需 --yes）")
-    p_e2e.add_argument("--yes", action="store_true")
-    p_e2e.add_argument("--qty", type=float, default=None)
-    p_e2e.add_argument("--symbol", type=str, default=None)
-    p_e2e.add_argument("--wait-seconds", type=int, default=120)
-    p_e2e.add_argument("--max-age-seconds", type=int, default=120)
-    p_e2e.add_argument("--sleep-after-entry", type=float, default=0.5)
-    p_e2e.add_argument("--no-restore-halt", action="store_true")
-
-    args = parser.parse_args()
-
-    if args.cmd == "set":
-        expected_reason_code(args.reason_code, "ADMIN_UPDATE_CONFIG")
+class _FlagCommand(NamedTuple):
+    key: str
+    value: str
+    command: str
+    level: str
+    title: str
+    confirm: bool = False
+
+
+# halt / resume / emergency-exit：写开关 + 控制命令 + 告警，流程相同，只差下列参数
+_FLAG_COMMANDS: Dict[str, _FlagCommand] = {
+    "halt": _FlagCommand("HALT_TRADING", "true", "HALT", "WARN", "⏸️ 已暂停交易"),
+    "resume": _FlagCommand("HALT_TRADING", "false", "RESUME", "INFO", "▶️ 已恢复交易"),
+    "emergency-exit": _FlagCommand(
+        "EMERGENCY_EXIT", "true", "EMERGENCY_EXIT", "WARN", "🧯 已触发紧急退出", confirm=True
+    ),
+}
+
+
+def _run_flag_command(spec: _FlagCommand, args: argparse.Namespace, settings: Settings, trace_id: str) -> None:
+    from shared.telemetry import build_system_summary, log_action, send_system_alert
+
+    db = _get_db(settings)
+    telegram = _get_telegram(settings)
+    if spec.confirm:
         require_confirm_cli(settings, getattr(args, "confirm_code", None))
-        write_system_config(
-            db,
-            actor=args.by,
-            key=args.key,
-            value=args.value,
+    _write_config_and_command(
+        db,
+        actor=args.by,
+        key=spec.key,
+        value=spec.value,
+        trace_id=trace_id,
+        reason_code=args.reason_code,
+        reason=args.reason,
+        command=spec.command,
+        payload={"actor": args.by, "reason_code": args.reason_code, "reason": args.reason, "trace_id": trace_id},
+    )
+    if telegram.enabled():
+        summary_kv = build_system_summary(
+            event=spec.command,
             trace_id=trace_id,
+            level=spec.level,
+            actor=args.by,
             reason_code=args.reason_code,
             reason=args.reason,
         )
-        write_control_command(
-            db,
-            command="UPDATE_CONFIG",
-            payload={"key": args.key, "value": args.value, "actor": args.by, "reason_code": args.reason_code,
-                     "reason": args.reason, "trace_id": trace_id},
+        send_system_alert(
+            telegram,
+            title=spec.title,
+            summary_kv=summary_kv,
+            payload={"key": spec.key, "value": spec.value, "reason_code": args.reason_code, "reason": args.reason},
         )
-        if telegram.enabled():
-            summary_kv = build_system_summary(
-                event="UPDATE_CONFIG",
-                trace_id=trace_id,
-                level="INFO",
-                actor=args.by,
-                reason_code=args.reason_code,
-                reason=args.reason,
-                extra={"key": args.key, "value": args.value},
-            )
-            send_system_alert(
-                telegram,
-                title="⚙️ 已修改配置",
-                summary_kv=summary_kv,
-                payload={"key": args.key, "value": args.value, "reason_code": args.reason_code, "reason": args.reason},
-            )
-            log_action(logger, action="UPDATE_CONFIG", trace_id=trace_id, reason_code=args.reason_code,
-                       reason=args.reason, client_order_id=None, extra={"key": args.key})
-        print(f"OK trace_id={trace_id}")
-        return
+        log_action(logger, action=spec.command, trace_id=trace_id, reason_code=args.reason_code, reason=args.reason,
+                   client_order_id=None)
+    print(f"OK trace_id={trace_id}")
 
-    if args.cmd == "get":
-        row = db.fetch_one("SELECT `value` FROM system_config WHERE `key`=%s", (args.key,))
-        if not row:
-            print("")
-            return
-        print(str(row["value"]))
-        return
 
-    if args.cmd == "list":
-        prefix = (args.prefix or "").strip()
-        limit = int(args.limit or 200)
-        if prefix:
-            rows = db.fetch_all(
-                "SELECT `key`,`value`,updated_at FROM system_config WHERE `key` LIKE %s ORDER BY `key` ASC LIMIT %s",
-                (prefix + "%", limit),
-            )
-        else:
-            rows = db.fetch_all(
-                "SELECT `key`,`value`,updated_at FROM system_config ORDER BY `key` ASC LIMIT %s",
-                (limit,),
-            )
-        for r in rows or []:
-            print(f"{r['key']}={r['value']}  (updated_at={r['updated_at']})")
-        return
-    if args.cmd == "smoke-test":
-        raise SystemExit(
-            run_smoke_test(settings, wait_seconds=int(args.wait_seconds), max_age_seconds=int(args.max_age_seconds)))
-
-    if args.cmd == "e2e-test":
-        raise SystemExit(
-            run_e2e_trade_test(
-                settings,
-                yes=bool(args.yes),
-                qty=args.qty,
-                symbol=args.symbol,
-                wait_seconds=int(args.wait_seconds),
-                max_age_seconds=int(args.max_age_seconds),
-                sleep_after_entry=float(args.sleep_after_entry),
-                restore_halt=(not bool(args.no_restore_halt)),
-            )
-        )
+def _cmd_status(args: argparse.Namespace, settings: Settings, trace_id: str) -> None:
+    db = _get_db(settings)
+    r = None
+    redis_error: Optional[str] = None
+    try:
+        r = _get_redis(settings)
+    except Exception as e:
+        redis_error = str(e)
 
-    # 下面是原有简单命令
-    db = MariaDB(
-        host=settings.db_host,
-        port=settings.db_port,
-        user=settings.db_user,
-        password=settings.db_pass,
-        db=settings.db_name,
-    )
-    telegram = Telegram(settings.telegram_bot_token, settings.telegram_chat_id)
-    trace_id = new_trace_id("admin")
+    # Redis ping 在后台线程里跑；DB ping 与开关读取（一次 IN 查询）走当前线程的 session 连接（不额外握手）
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        f_redis = pool.submit(r.ping) if r is not None else None
+        db_ok = bool(db.ping())
+        flags = get_system_configs(db, {"HALT_TRADING": "false", "EMERGENCY_EXIT": "false"})
 
-    if args.cmd == "status":
         report: Dict[str, Any] = {
             "env": getattr(settings, "env", getattr(settings, "app_env", "")),
             "exchange": settings.exchange,
             "symbol": settings.symbol,
             "interval_minutes": settings.interval_minutes,
-            "db_ping": bool(db.ping()),
+            "db_ping": db_ok,
         }
-        try:
-            r = redis_client(settings.redis_url)
-            report["redis_ping"] = bool(r.ping())
-        except Exception as e:
+        if f_redis is not None:
+            try:
+                report["redis_ping"] = bool(f_redis.result())
+            except Exception as e:
+                redis_error = str(e)
+        if redis_error is not None:
+            r = None
             report["redis_ping"] = False
-            report["redis_error"] = str(e)
-
-        report["halt_trading"] = read_system_config(db, "HALT_TRADING", "false")
-        report["emergency_exit"] = read_system_config(db, "EMERGENCY_EXIT", "false")
-
-        ok, last = _wait_for_market_cache(
-            db,
-            symbol=settings.symbol,
-            interval_minutes=settings.interval_minutes,
-            feature_version=int(getattr(settings, 'feature_version', 1)),
-            wait_seconds=int(args.wait_seconds),
-            max_age_seconds=int(args.max_age_seconds),
-        )
-        report["market_cache_ok"] = ok
-        report["market_cache_last"] = last
-
-        print(json.dumps(report, ensure_ascii=False, indent=2, default=_json_default))
-        return
-
-    if args.cmd == "halt":
-        expected_reason_code(args.reason_code, "ADMIN_HALT")
-        write_system_config(
-            db,
-            actor=args.by,
-            key="HALT_TRADING",
-            value="true",
+            report["redis_error"] = redis_error
+
+    report["halt_trading"] = flags["HALT_TRADING"]
+    report["emergency_exit"] = flags["EMERGENCY_EXIT"]
+
+    ok, last = _wait_for_market_cache(
+        db,
+        symbol=settings.symbol,
+        interval_minutes=settings.interval_minutes,
+        feature_version=int(getattr(settings, 'feature_version', 1)),
+        wait_seconds=int(args.wait_seconds),
+        max_age_seconds=int(args.max_age_seconds),
+        r=r,
+    )
+    report["market_cache_ok"] = ok
+    report["market_cache_last"] = last
+
+    print(_dump(report))
+
+
+def _cmd_set(args: argparse.Namespace, settings: Settings, trace_id: str) -> None:
+    from shared.telemetry import build_system_summary, log_action, send_system_alert
+
+    db = _get_db(settings)
+    telegram = _get_telegram(settings)
+    require_confirm_cli(settings, getattr(args, "confirm_code", None))
+    _write_config_and_command(
+        db,
+        actor=args.by,
+        key=args.key,
+        value=args.value,
+        trace_id=trace_id,
+        reason_code=args.reason_code,
+        reason=args.reason,
+        command="UPDATE_CONFIG",
+        payload={"key": args.key, "value": args.value, "actor": args.by, "reason_code": args.reason_code,
+                 "reason": args.reason, "trace_id": trace_id},
+    )
+    if telegram.enabled():
+        summary_kv = build_system_summary(
+            event="UPDATE_CONFIG",
             trace_id=trace_id,
+            level="INFO",
+            actor=args.by,
             reason_code=args.reason_code,
             reason=args.reason,
+            extra={"key": args.key, "value": args.value},
         )
-        write_control_command(
-            db,
-            command="HALT",
-            payload={"actor": args.by, "reason_code": args.reason_code, "reason": args.reason, "trace_id": trace_id},
+        send_system_alert(
+            telegram,
+            title="⚙️ 已修改配置",
+            summary_kv=summary_kv,
+            payload={"key": args.key, "value": args.value, "reason_code": args.reason_code, "reason": args.reason},
         )
-        if telegram.enabled():
-            summary_kv = build_system_summary(
-                event="HALT",
-                trace_id=trace_id,
-                level="WARN",
-                actor=args.by,
-                reason_code=args.reason_code,
-                reason=args.reason,
-            )
-            send_system_alert(
-                telegram,
-                title="⏸️ 已暂停交易",
-                summary_kv=summary_kv,
-                payload={"key": "HALT_TRADING", "value": "true", "reason_code": args.reason_code,
-                         "reason": args.reason},
-            )
-            log_action(logger, action="HALT", trace_id=trace_id, reason_code=args.reason_code, reason=args.reason,
-                       client_order_id=None)
-        print(f"OK trace_id={trace_id}")
-        return
+        log_action(logger, action="UPDATE_CONFIG", trace_id=trace_id, reason_code=args.reason_code,
+                   reason=args.reason, client_order_id=None, extra={"key": args.key})
+    print(f"OK trace_id={trace_id}")
 
-    if args.cmd == "resume":
-        expected_reason_code(args.reason_code, "ADMIN_RESUME")
-        write_system_config(
-            db,
-            actor=args.by,
-            key="HALT_TRADING",
-            value="false",
-            trace_id=trace_id,
-            reason_code=args.reason_code,
-            reason=args.reason,
+
+def _cmd_get(args: argparse.Namespace, settings: Settings, trace_id: str) -> None:
+    db = _get_db(settings)
+    row = db.fetch_one("SELECT `value` FROM system_config WHERE `key`=%s", (args.key,))
+    if not row:
+        print("")
+        return
+    print(str(row["value"]))
+
+
+def _cmd_list(args: argparse.Namespace, settings: Settings, trace_id: str) -> None:
+    prefix = (args.prefix or "").strip()
+    limit = int(args.limit or 200)
+    db = _get_db(settings)
+    # 服务端游标逐行输出：不在内存里攒整张表，首行查到即开始打印
+    if prefix:
+        rows = db.fetch_iter(
+            "SELECT `key`,`value`,updated_at FROM system_config WHERE `key` LIKE %s ORDER BY `key` ASC LIMIT %s",
+            (prefix + "%", limit),
         )
-        write_control_command(
-            db,
-            command="RESUME",
-            payload={"actor": args.by, "reason_code": args.reason_code, "reason": args.reason, "trace_id": trace_id},
+    else:
+        rows = db.fetch_iter(
+            "SELECT `key`,`value`,updated_at FROM system_config ORDER BY `key` ASC LIMIT %s",
+            (limit,),
         )
-        if telegram.enabled():
-            summary_kv = build_system_summary(
-                event="RESUME",
-                trace_id=trace_id,
-                level="INFO",
-                actor=args.by,
-                reason_code=args.reason_code,
-                reason=args.reason,
-            )
-            send_system_alert(
-                telegram,
-                title="▶️ 已恢复交易",
-                summary_kv=summary_kv,
-                payload={"key": "HALT_TRADING", "value": "false", "reason_code": args.reason_code,
-                         "reason": args.reason},
-            )
-            log_action(logger, action="RESUME", trace_id=trace_id, reason_code=args.reason_code, reason=args.reason,
-                       client_order_id=None)
-        print(f"OK trace_id={trace_id}")
-        return
+    write = sys.stdout.write
+    for r in rows:
+        write(f"{r['key']}={r['value']}  (updated_at={r['updated_at']})\n")
 
-    if args.cmd == "emergency-exit":
-        expected_reason_code(args.reason_code, "EMERGENCY_EXIT")
-        require_confirm_cli(settings, getattr(args, "confirm_code", None))
-        write_system_config(
-            db,
-            actor=args.by,
-            key="EMERGENCY_EXIT",
-            value="true",
-            trace_id=trace_id,
-            reason_code=args.reason_code,
-            reason=args.reason,
+
+def _cmd_smoke(args: argparse.Namespace, settings: Settings, trace_id: str) -> None:
+    raise SystemExit(
+        run_smoke_test(
+            settings,
+            AdminCtx(actor=args.by, trace_id=new_trace_id("smoke")),
+            wait_seconds=int(args.wait_seconds),
+            max_age_seconds=int(args.max_age_seconds),
         )
-        write_control_command(
-            db,
-            command="EMERGENCY_EXIT",
-            payload={"actor": args.by, "reason_code": args.reason_code, "reason": args.reason, "trace_id": trace_id},
+    )
+
+
+def _cmd_e2e(args: argparse.Namespace, settings: Settings, trace_id: str) -> None:
+    raise SystemExit(
+        run_e2e_trade_test(
+            settings,
+            AdminCtx(actor=args.by, trace_id=new_trace_id("e2e"), reason_code=args.reason_code, reason=args.reason),
+            yes=bool(args.yes),
+            qty=args.qty,
+            symbol=args.symbol,
+            wait_seconds=int(args.wait_seconds),
+            max_age_seconds=int(args.max_age_seconds),
+            sleep_after_entry=float(args.sleep_after_entry),
+            restore_halt=(not bool(args.no_restore_halt)),
         )
-        if telegram.enabled():
-            summary_kv = build_system_summary(
-                event="EMERGENCY_EXIT",
-                trace_id=trace_id,
-                level="WARN",
-                actor=args.by,
-                reason_code=args.reason_code,
-                reason=args.reason,
-            )
-            send_system_alert(
-                telegram,
-                title="🧯 已触发紧急退出",
-                summary_kv=summary_kv,
-                payload={"key": "EMERGENCY_EXIT", "value": "true", "reason_code": args.reason_code,
-                         "reason": args.reason},
-            )
-            log_action(logger, action="EMERGENCY_EXIT", trace_id=trace_id, reason_code=args.reason_code,
-                       reason=args.reason, client_order_id=None)
-        print(f"OK trace_id={trace_id}")
-        return
+    )
+
+
+_Handler = Callable[[argparse.Namespace, Settings, str], None]
+
+# 子命令 -> (help, 参数构造函数, 处理函数)；按 argv 只构造命中的那一个，处理函数经 set_defaults(func=...) 挂到 args 上
+_SUBCOMMANDS: Dict[str, Tuple[str, Callable[[argparse.ArgumentParser], None], _Handler]] = {
+    "status": ("查看系统状态（DB/Redis/缓存/开关）", _build_status_parser, _cmd_status),
+    "halt": ("暂停交易（写入 HALT_TRADING=true）", _build_halt_parser,
+             functools.partial(_run_flag_command, _FLAG_COMMANDS["halt"])),
+    "resume": ("恢复交易（写入 HALT_TRADING=false）", _build_resume_parser,
+               functools.partial(_run_flag_command, _FLAG_COMMANDS["resume"])),
+    "emergency-exit": ("紧急退出（写入 EMERGENCY_EXIT=true）", _build_exit_parser,
+                       functools.partial(_run_flag_command, _FLAG_COMMANDS["emergency-exit"])),
+    "set": ("写入 system_config（等价于 /admin/update_config）", _build_set_parser, _cmd_set),
+    "get": ("读取 system_config 的值", _build_get_parser, _cmd_get),
+    "list": ("列出 system_config（可选 prefix 过滤）", _build_list_parser, _cmd_list),
+    "smoke-test": ("一键链路自检（不下单）：DB/Redis/行情缓存", _build_smoke_parser, _cmd_smoke),
+    "e2e-test": ("一键实盘闭环：BUY->SELL->校验真实 pnl_usdt（需 --yes）", _build_e2e_parser, _cmd_e2e),
+}
+
+
+def _build_parser(argv: List[str]) -> argparse.ArgumentParser:
+    """已知子命令只构造对应的子解析器；--help/未知/缺省时构造完整解析器（帮助与报错信息不变）。"""
+    cmd = argv[0] if argv else None
+    names = [cmd] if cmd in _SUBCOMMANDS else list(_SUBCOMMANDS)
+
+    parser = argparse.ArgumentParser(prog="alpha-admin")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    for name in names:
+        help_text, build, handler = _SUBCOMMANDS[name]
+        sp = sub.add_parser(name, help=help_text)
+        build(sp)
+        sp.set_defaults(func=handler)
+    return parser
+
+
+def main() -> None:
+    argv = sys.argv[1:]
+    parser = _build_parser(argv)
+    args = parser.parse_args(argv)
+    _require_reason_code(args)
+
+    settings = _get_settings()
+    trace_id = new_trace_id("admin")
+
+    # 整个命令复用同一条 DB 连接（按需建立，未用到 DB 的路径不会连接）；
+    # status/smoke-test 的轮询不再每秒重新握手
+    with _get_db(settings).session():
+        args.func(args, settings, trace_id)
 
 
 if __name__ == "__main__":
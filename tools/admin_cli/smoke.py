@@ -32,18 +32,18 @@ Output
 
 import json
 import time
-from dataclasses import dataclass, asdict
-from typing import Any, Dict, List, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, NamedTuple, Optional
 
 from shared.config import Settings
 from shared.db import MariaDB
 from shared.redis.client import redis_client
+from shared.redis.cache_events import emergency_exit_key, wait_cache_fresh, wait_emergency_exit
 from shared.logging.trace import new_trace_id
 from shared.domain.enums import OrderEventType, ReasonCode, Side
-from shared.domain.events import append_order_event
+from shared.domain.events import append_order_events
 
-@dataclass
-class StepResult:
+class StepResult(NamedTuple):
     name: str
     ok: bool
     details: Dict[str, Any]
@@ -53,20 +53,47 @@ def _sql_now_utc() -> str:
     # We don't rely on it for correctness, only for heartbeat freshness.
     return "CURRENT_TIMESTAMP"
 
-def _fetch_scalar(db: MariaDB, sql: str, params: tuple = ()) -> Optional[Any]:
+# 管理开关写入统一用这一条参数化 UPSERT（key/value 都走参数）
+_SET_FLAG_SQL = "INSERT INTO system_config(`key`,`value`) VALUES (%s,%s) ON DUPLICATE KEY UPDATE `value`=VALUES(`value`)"
+
+def _fetch_count(db: MariaDB, sql: str, params: tuple = ()) -> int:
+    """COUNT(*) 类查询：取第一列转 int 一次，无结果为 0。"""
     row = db.fetch_one(sql, params)
     if not row:
-        return None
-    return next(iter(row.values()))
+        return 0
+    return int(next(iter(row.values())) or 0)
 
-def _wait_until(fn, timeout_s: int, poll_s: float = 2.0) -> bool:
-    deadline = time.time() + timeout_s
-    while time.time() < deadline:
+def _wait_until(fn, timeout_s: float, poll_s: float = 2.0) -> bool:
+    deadline = time.monotonic() + timeout_s
+    while time.monotonic() < deadline:
         if fn():
             return True
         time.sleep(poll_s)
     return False
 
+def _wait_notified(fn, wait_event, timeout_s: float, poll_s: float = 2.0) -> bool:
+    """Block on a Redis notification, then confirm with fn (DB check).
+
+    wait_event(remaining_s, last_seen) returns the newest notification value that
+    differs from last_seen (None on timeout); it never consumes the notification,
+    so other waiters on the same key still wake. Falls back to _wait_until
+    polling if Redis errors.
+    """
+    deadline = time.monotonic() + timeout_s
+    last_seen = None
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False
+        try:
+            value = wait_event(remaining, last_seen)
+        except Exception:
+            return _wait_until(fn, timeout_s=remaining, poll_s=poll_s)
+        if value is not None:
+            last_seen = value
+        if fn():
+            return True
+
 def run_smoke_test(
     *,
     wait_data_seconds: int = 60,
@@ -77,182 +104,248 @@ def run_smoke_test(
     trace_id = new_trace_id("smoke")
     steps: List[StepResult] = []
 
-    db = MariaDB(settings.db_host, settings.db_port, settings.db_user, settings.db_pass, settings.db_name)
+    db = MariaDB(settings.db_host, settings.db_port, settings.db_user, settings.db_pass, settings.db_name,
+                 multi_statements=True)
     r = redis_client(settings.redis_url)
 
-    # 1) DB connectivity
-    try:
-        ok = db.ping()
-        steps.append(StepResult("db_ping", ok, {"db_host": settings.db_host, "db_name": settings.db_name}))
-    except Exception as e:
-        steps.append(StepResult("db_ping", False, {"error": str(e)}))
-
-    # 2) Redis connectivity
-    try:
-        pong = r.ping()
-        steps.append(StepResult("redis_ping", bool(pong), {"redis_url": settings.redis_url}))
-    except Exception as e:
-        steps.append(StepResult("redis_ping", False, {"error": str(e)}))
-
-    # 3) Tables existence (migrations)
-    try:
-        cnt = _fetch_scalar(db, "SELECT COUNT(*) AS c FROM information_schema.tables WHERE table_schema=%s AND table_name='order_events'", (settings.db_name,))
-        ok = bool(cnt and int(cnt) == 1)
-        steps.append(StepResult("tables_exist", ok, {"order_events_table": bool(ok)}))
-    except Exception as e:
-        steps.append(StepResult("tables_exist", False, {"error": str(e)}))
-
-    # 4) Wait for market_data to exist (data-syncer pipeline)
-    def has_market_data() -> bool:
-        c = _fetch_scalar(
-            db,
-            "SELECT COUNT(*) AS c FROM market_data WHERE symbol=%s AND interval_minutes=%s",
-            # market_data 表不带 feature_version 维度（feature_version 仅用于 market_data_cache）
-            (settings.symbol, settings.interval_minutes),
-        )
-        return bool(c and int(c) > 0)
-
-    try:
-        ok = has_market_data() or _wait_until(has_market_data, timeout_s=wait_data_seconds, poll_s=2.0)
-        details = {"symbol": settings.symbol, "interval_minutes": settings.interval_minutes, "wait_seconds": wait_data_seconds}
-        if ok:
-            last = db.fetch_one(
-                "SELECT open_time_ms, close_time_ms, close_price FROM market_data WHERE symbol=%s AND interval_minutes=%s ORDER BY open_time_ms DESC LIMIT 1",
-                (settings.symbol, settings.interval_minutes),
+    # 所有步骤复用同一条 DB 连接（session 内每次调用仍是独立事务），不再每条语句重新握手/认证
+    with db.session():
+        # 3)/4)/5) 表存在 + market_data / market_data_cache 就绪：三个探测合成一条查询，每次（含轮询）只 1 个往返
+        feature_version = int(getattr(settings, 'feature_version', 1))
+        probe: Dict[str, Any] = {}
+
+        def has_market_data() -> bool:
+            nonlocal probe
+            probe = db.fetch_one(
+                """
+                SELECT
+                  (SELECT COUNT(*) FROM information_schema.tables
+                    WHERE table_schema=%s AND table_name='order_events') AS order_events_table,
+                  EXISTS(SELECT 1 FROM market_data WHERE symbol=%s AND interval_minutes=%s) AS market_data,
+                  (SELECT COUNT(*) FROM market_data_cache
+                    WHERE symbol=%s AND interval_minutes=%s AND feature_version=%s) AS market_data_cache
+                """,
+                # market_data 表不带 feature_version 维度（feature_version 仅用于 market_data_cache）
+                (settings.db_name, settings.symbol, settings.interval_minutes,
+                 settings.symbol, settings.interval_minutes, feature_version),
+            ) or {}
+            return bool(probe.get("market_data"))
+
+        # 2) Redis ping 在后台线程里跑；1) DB ping 与 3)-5) 首次探测走当前线程的 session 连接（不另开连接）
+        first_ok = False
+        first_error: Optional[Exception] = None
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            f_redis = pool.submit(r.ping)
+
+            # 1) DB connectivity
+            try:
+                ok = db.ping()
+                steps.append(StepResult("db_ping", ok, {"db_host": settings.db_host, "db_name": settings.db_name}))
+            except Exception as e:
+                steps.append(StepResult("db_ping", False, {"error": str(e)}))
+
+            try:
+                first_ok = has_market_data()
+            except Exception as e:
+                first_error = e
+
+            # 2) Redis connectivity
+            try:
+                pong = f_redis.result()
+                steps.append(StepResult("redis_ping", bool(pong), {"redis_url": settings.redis_url}))
+            except Exception as e:
+                steps.append(StepResult("redis_ping", False, {"error": str(e)}))
+
+        try:
+            if first_error is not None:
+                raise first_error
+            # data-syncer 写完 market_data_cache 后推送通知（此时对应 market_data 已落库）
+            ok = first_ok or _wait_notified(
+                has_market_data,
+                lambda t, last: wait_cache_fresh(
+                    r, symbol=settings.symbol, interval_minutes=settings.interval_minutes,
+                    feature_version=feature_version, timeout_seconds=t, after=last,
+                ),
+                timeout_s=wait_data_seconds,
+            )
+        except Exception as e:
+            for name in ("tables_exist", "market_data_ready", "market_data_cache_ready"):
+                steps.append(StepResult(name, False, {"error": str(e)}))
+        else:
+            t_ok = int(probe.get("order_events_table") or 0) == 1
+            steps.append(StepResult("tables_exist", t_ok, {"order_events_table": t_ok}))
+
+            details = {"symbol": settings.symbol, "interval_minutes": settings.interval_minutes, "wait_seconds": wait_data_seconds}
+            try:
+                if ok:
+                    last = db.fetch_one(
+                        "SELECT open_time_ms, close_time_ms, close_price FROM market_data WHERE symbol=%s AND interval_minutes=%s ORDER BY open_time_ms DESC LIMIT 1",
+                        (settings.symbol, settings.interval_minutes),
+                    )
+                    details["latest"] = last
+                steps.append(StepResult("market_data_ready", ok, details))
+            except Exception as e:
+                steps.append(StepResult("market_data_ready", False, {"error": str(e)}))
+
+            c = int(probe.get("market_data_cache") or 0)
+            steps.append(StepResult("market_data_cache_ready", c > 0, {"count": c}))
+
+        # 6) Service heartbeat freshness：age/fresh 由服务端按每个服务最新的实例计算
+        #    （重启遗留的旧 instance_id 不影响判断），只回每个服务一行
+        try:
+            stale_default = max(120, 2 * int(getattr(settings, "heartbeat_interval_seconds", 30)))
+            # strategy-engine 每个 tick 才写一次心跳
+            stale_engine = max(stale_default, 2 * int(getattr(settings, "strategy_tick_seconds", 900)))
+            now_sql = _sql_now_utc()
+            rows = db.fetch_all(
+                f"""
+                SELECT service_name, COUNT(*) AS instances, MAX(last_heartbeat) AS last_heartbeat,
+                       TIMESTAMPDIFF(SECOND, MAX(last_heartbeat), {now_sql}) AS age_s,
+                       TIMESTAMPDIFF(SECOND, MAX(last_heartbeat), {now_sql})
+                         <= IF(service_name='strategy-engine', %s, %s) AS fresh
+                FROM service_status
+                WHERE service_name IN ('data-syncer','strategy-engine')
+                GROUP BY service_name
+                """,
+                (stale_engine, stale_default),
             )
-            details["latest"] = last
-        steps.append(StepResult("market_data_ready", ok, details))
-    except Exception as e:
-        steps.append(StepResult("market_data_ready", False, {"error": str(e)}))
-
-    # 5) market_data_cache existence
-    try:
-        c = _fetch_scalar(
-            db,
-            "SELECT COUNT(*) AS c FROM market_data_cache WHERE symbol=%s AND interval_minutes=%s AND feature_version=%s",
-            (settings.symbol, settings.interval_minutes, int(getattr(settings,'feature_version',1))),
-        )
-        ok = bool(c and int(c) > 0)
-        steps.append(StepResult("market_data_cache_ready", ok, {"count": int(c or 0)}))
-    except Exception as e:
-        steps.append(StepResult("market_data_cache_ready", False, {"error": str(e)}))
-
-    # 6) Service heartbeat freshness (optional but very helpful)
-    try:
-        rows = db.fetch_all(
-            """
-            SELECT service_name, instance_id, last_heartbeat
-            FROM service_status
-            WHERE service_name IN ('data-syncer','strategy-engine')
-            ORDER BY last_heartbeat DESC
-            """
-        )
-        steps.append(StepResult("service_heartbeats", True, {"rows": rows}))
-    except Exception as e:
-        steps.append(StepResult("service_heartbeats", False, {"error": str(e)}))
-
-    # 7) order_events idempotency by unique key (exchange,symbol,client_order_id)
-    try:
-        client_order_id = f"smoke_{trace_id}"
-        for _ in range(2):
-            append_order_event(
+            # 两个服务都必须有心跳行，缺任一个即失败
+            missing = sorted({"data-syncer", "strategy-engine"} - {row["service_name"] for row in rows})
+            ok = not missing and all(row["fresh"] for row in rows)
+            steps.append(StepResult("service_heartbeats", ok, {"rows": rows, "missing": missing}))
+        except Exception as e:
+            steps.append(StepResult("service_heartbeats", False, {"error": str(e)}))
+
+        # 7) order_events idempotency by unique key (exchange,symbol,client_order_id)
+        try:
+            client_order_id = f"smoke_{trace_id}"
+            # 同一 client_order_id 的两条事件在一个事务里提交（一次 COMMIT）；第二条应被唯一键拒绝
+            inserted = append_order_events(
                 db,
-                trace_id=trace_id,
-                service="admin-cli",
-                exchange=settings.exchange,
-                symbol=settings.symbol,
-                client_order_id=client_order_id,
-                exchange_order_id=None,
-                event_type=OrderEventType.CREATED,
-                side=Side.BUY.value,
-                qty=0.001,
-                price=None,
-                status="CREATED",
-                reason_code=ReasonCode.SYSTEM,
-                reason="smoke idempotency test",
-                payload={"i": _},
+                [
+                    dict(
+                        trace_id=trace_id,
+                        service="admin-cli",
+                        exchange=settings.exchange,
+                        symbol=settings.symbol,
+                        client_order_id=client_order_id,
+                        exchange_order_id=None,
+                        event_type=OrderEventType.CREATED,
+                        side=Side.BUY.value,
+                        qty=0.001,
+                        price=None,
+                        status="CREATED",
+                        reason_code=ReasonCode.SYSTEM,
+                        reason="smoke idempotency test",
+                        payload={"i": i},
+                    )
+                    for i in range(2)
+                ],
             )
-        c = _fetch_scalar(
-            db,
-            "SELECT COUNT(*) AS c FROM order_events WHERE exchange=%s AND symbol=%s AND client_order_id=%s",
-            (settings.exchange, settings.symbol, client_order_id),
-        )
-        steps.append(StepResult("order_event_idempotent", bool(c and int(c) == 1), {"count": int(c or 0), "client_order_id": client_order_id}))
-    except Exception as e:
-        steps.append(StepResult("order_event_idempotent", False, {"error": str(e)}))
-
-    # 8) Admin flags write/read sanity (HALT_TRADING)
-    try:
-        # Direct DB write: same behavior as /admin/update_config path, but faster and deterministic for regression.
-        db.execute("INSERT INTO system_config(`key`,`value`) VALUES ('HALT_TRADING','true') ON DUPLICATE KEY UPDATE `value`=VALUES(`value`)")
-        v1 = _fetch_scalar(db, "SELECT `value` FROM system_config WHERE `key`='HALT_TRADING'")
-        db.execute("INSERT INTO system_config(`key`,`value`) VALUES ('HALT_TRADING','false') ON DUPLICATE KEY UPDATE `value`=VALUES(`value`)")
-        v2 = _fetch_scalar(db, "SELECT `value` FROM system_config WHERE `key`='HALT_TRADING'")
-        steps.append(StepResult("admin_flag_halt_rw", (str(v1).lower()=="true" and str(v2).lower()=="false"), {"v1": v1, "v2": v2}))
-    except Exception as e:
-        steps.append(StepResult("admin_flag_halt_rw", False, {"error": str(e)}))
-
-    # 9) Optional end-to-end emergency exit (requires running strategy-engine)
-    # We create a fake position snapshot >0, set EMERGENCY_EXIT=true, then wait for strategy-engine to process and flatten.
-    try:
-        # Write a position (paper-safe). Strategy-engine will read latest position snapshot.
-        db.execute(
-            """
-            INSERT INTO position_snapshots(symbol, base_qty, avg_entry_price, meta_json)
-            VALUES (%s,%s,%s,%s)
-            """,
-            (settings.symbol, 0.002, 100000.0, json.dumps({"trace_id": trace_id, "note": "smoke position"}, ensure_ascii=False)),
-        )
-        db.execute("INSERT INTO system_config(`key`,`value`) VALUES ('EMERGENCY_EXIT','true') ON DUPLICATE KEY UPDATE `value`=VALUES(`value`)")
-        start_id = _fetch_scalar(db, "SELECT IFNULL(MAX(id),0) AS mx FROM order_events")
-        start_id = int(start_id or 0)
-
-        def emergency_exit_done() -> bool:
-            row = db.fetch_one(
-                """
-                SELECT id FROM order_events
-                WHERE id > %s AND symbol=%s AND reason_code=%s
-                ORDER BY id DESC LIMIT 1
-                """,
-                (start_id, settings.symbol, ReasonCode.EMERGENCY_EXIT.value),
+            c = _fetch_count(
+                db,
+                "SELECT COUNT(*) AS c FROM order_events WHERE exchange=%s AND symbol=%s AND client_order_id=%s",
+                (settings.exchange, settings.symbol, client_order_id),
             )
-            if not row:
-                return False
-            # also check position flattened
-            pos = db.fetch_one(
-                "SELECT base_qty FROM position_snapshots WHERE symbol=%s ORDER BY id DESC LIMIT 1",
-                (settings.symbol,),
+            ok = c == 1 and inserted == [True, False]
+            steps.append(StepResult("order_event_idempotent", ok, {"count": c, "inserted": inserted, "client_order_id": client_order_id}))
+        except Exception as e:
+            steps.append(StepResult("order_event_idempotent", False, {"error": str(e)}))
+
+        # 8) Admin flags write/read sanity (HALT_TRADING)
+        try:
+            # Direct DB write: same behavior as /admin/update_config path, but faster and deterministic for regression.
+            # 写-读-写-读 四条语句一个事务、一次 multi-statement 往返（结果集按语句顺序返回）
+            read = "SELECT `value` FROM system_config WHERE `key`='HALT_TRADING'"
+            res = db.execute_many_sql([
+                (_SET_FLAG_SQL, ("HALT_TRADING", "true")), (read, ()),
+                (_SET_FLAG_SQL, ("HALT_TRADING", "false")), (read, ()),
+            ])
+            v1 = res[1][0]["value"] if res[1] else None
+            v2 = res[3][0]["value"] if res[3] else None
+            steps.append(StepResult("admin_flag_halt_rw", (str(v1).lower()=="true" and str(v2).lower()=="false"), {"v1": v1, "v2": v2}))
+        except Exception as e:
+            steps.append(StepResult("admin_flag_halt_rw", False, {"error": str(e)}))
+
+        # 9) Optional end-to-end emergency exit (requires running strategy-engine)
+        # We create a fake position snapshot >0, set EMERGENCY_EXIT=true, then wait for strategy-engine to process and flatten.
+        flag_set = False
+        try:
+            # 先清掉旧通知再置位：之后收到的通知只可能来自本次退出
+            try:
+                r.delete(emergency_exit_key(settings.symbol))
+            except Exception:
+                pass
+            # 写仓位（paper-safe，strategy-engine 读最新快照）+ 置 EMERGENCY_EXIT + 取 start_id：
+            # 一个事务、一次往返提交；start_id 在置位提交之前读取，engine 的退出事件必然在其之后
+            res = db.execute_many_sql([
+                (
+                    """
+                    INSERT INTO position_snapshots(symbol, base_qty, avg_entry_price, meta_json)
+                    VALUES (%s,%s,%s,%s)
+                    """,
+                    (settings.symbol, 0.002, 100000.0, json.dumps({"trace_id": trace_id, "note": "smoke position"}, ensure_ascii=False)),
+                ),
+                (_SET_FLAG_SQL, ("EMERGENCY_EXIT", "true")),
+                ("SELECT IFNULL(MAX(id),0) AS mx FROM order_events", ()),
+            ])
+            flag_set = True
+            start_id = int(res[2][0]["mx"] or 0) if res[2] else 0
+
+            def emergency_exit_done() -> bool:
+                # 退出事件 + 最新仓位已清零，一条查询一个往返
+                row = db.fetch_one(
+                    """
+                    SELECT
+                      EXISTS(SELECT 1 FROM order_events
+                             WHERE id > %s AND symbol=%s AND reason_code=%s) AS exited,
+                      (SELECT base_qty FROM position_snapshots
+                        WHERE symbol=%s ORDER BY id DESC LIMIT 1) AS base_qty
+                    """,
+                    (start_id, settings.symbol, ReasonCode.EMERGENCY_EXIT.value, settings.symbol),
+                )
+                if not row or not row["exited"] or row["base_qty"] is None:
+                    return False
+                return float(row["base_qty"]) == 0.0
+
+            # strategy-engine 平仓后推送通知；唤醒后查一次库确认
+            ok = _wait_notified(
+                emergency_exit_done,
+                lambda t, last: wait_emergency_exit(r, symbol=settings.symbol, timeout_seconds=t, last_seen=last),
+                timeout_s=wait_engine_seconds + engine_grace_seconds,
             )
-            if not pos:
-                return False
-            return float(pos["base_qty"]) == 0.0
-
-        ok = _wait_until(emergency_exit_done, timeout_s=wait_engine_seconds + engine_grace_seconds, poll_s=2.0)
-        steps.append(StepResult(
-            "emergency_exit_e2e",
-            ok,
-            {
-                "requires": "strategy-engine running",
-                "wait_seconds": wait_engine_seconds,
-                "hint": "If this fails, make sure strategy-engine is running and STRATEGY_TICK_SECONDS is small for testing.",
-            },
-        ))
-        # Always reset flag to prevent accidental continuous exits.
-        db.execute("INSERT INTO system_config(`key`,`value`) VALUES ('EMERGENCY_EXIT','false') ON DUPLICATE KEY UPDATE `value`=VALUES(`value`)")
-    except Exception as e:
-        steps.append(StepResult("emergency_exit_e2e", False, {"error": str(e), "requires": "strategy-engine running"}))
-
-    passed = all(s.ok for s in steps if s.name not in ("emergency_exit_e2e",)) and              any(s.ok for s in steps if s.name == "db_ping")
-
-    return {
-        "trace_id": trace_id,
-        "exchange": settings.exchange,
-        "symbol": settings.symbol,
-        "interval_minutes": settings.interval_minutes,
-        "passed": bool(passed),
-        "steps": [asdict(s) for s in steps],
-        "notes": [
-            "For a safe full E2E smoke test, set EXCHANGE=paper and STRATEGY_TICK_SECONDS=10 in .env.",
-            "If you use external DB/Redis, ensure network ACL/firewall allows the containers to connect.",
-        ],
-    }
+            steps.append(StepResult(
+                "emergency_exit_e2e",
+                ok,
+                {
+                    "requires": "strategy-engine running",
+                    "wait_seconds": wait_engine_seconds,
+                    "hint": "If this fails, make sure strategy-engine is running and STRATEGY_TICK_SECONDS is small for testing.",
+                },
+            ))
+        except Exception as e:
+            steps.append(StepResult("emergency_exit_e2e", False, {"error": str(e), "requires": "strategy-engine running"}))
+        finally:
+            # Always reset flag to prevent accidental continuous exits（等待中途出错也要复位）；
+            # 只在仍为 true 时写（strategy-engine 处理完通常已自行清掉）
+            if flag_set:
+                try:
+                    db.execute("UPDATE system_config SET `value`='false' WHERE `key`='EMERGENCY_EXIT' AND `value`='true'")
+                except Exception:
+                    pass
+
+        passed = all(s.ok for s in steps if s.name not in ("emergency_exit_e2e",)) and              any(s.ok for s in steps if s.name == "db_ping")
+
+        return {
+            "trace_id": trace_id,
+            "exchange": settings.exchange,
+            "symbol": settings.symbol,
+            "interval_minutes": settings.interval_minutes,
+            "passed": bool(passed),
+            # NamedTuple._asdict 浅拷贝字段（dataclasses.asdict 会对 details 递归 deepcopy）
+            "steps": [s._asdict() for s in steps],
+            "notes": [
+                "For a safe full E2E smoke test, set EXCHANGE=paper and STRATEGY_TICK_SECONDS=10 in .env.",
+                "If you use external DB/Redis, ensure network ACL/firewall allows the containers to connect.",
+            ],
+        }